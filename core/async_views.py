@@ -0,0 +1,47 @@
+"""Async API views for ASGI workers."""
+
+import inspect
+
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """An APIView whose handlers are coroutines, so waiting on I/O holds no worker thread.
+
+    DRF runs handlers synchronously; this view awaits them instead. Authentication,
+    permission and throttling checks touch the database and run in a thread, as
+    ``sync_to_async`` does for any ORM call from a handler. Under WSGI, Django runs the view
+    in an event loop per request, so it works there too, without the benefit.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        """Like ``APIView.dispatch``, awaiting the handler."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def options(self, request, *args, **kwargs):
+        """Answer OPTIONS like APIView; Django needs every handler of an async view to be async."""
+        return super().options(request, *args, **kwargs)
+
+    async def request_data(self):
+        """Return ``request.data``, parsed in a thread since multipart bodies may be spooled to disk."""
+        return await sync_to_async(lambda: self.request.data)()
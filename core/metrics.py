@@ -0,0 +1,30 @@
+"""In-process metrics registry exposed through the metrics API."""
+
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+
+def increment(name, value=1):
+    """Add ``value`` to the counter called ``name``."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def register_gauge(name, callback):
+    """Register a zero-argument callable whose value is read on every snapshot."""
+    with _lock:
+        _gauges[name] = callback
+
+
+def snapshot():
+    """Return current counter and gauge values for this worker process."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    return {
+        'counters': counters,
+        'gauges': {name: callback() for name, callback in gauges.items()},
+    }
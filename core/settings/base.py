@@ -17,9 +17,42 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 
 # open ai keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Defaults to the public API when unset
+OPENAI_POLL_INTERVAL = float(os.getenv("OPENAI_POLL_INTERVAL", 1.0))  # Seconds between vector store batch polls
+# Budgets shared by all worker processes through REDIS_URL; 0 disables a limit
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 500))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", 30000))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 6))  # For 429s, 5xx responses and connection errors
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", 0.5))  # Seconds, doubled on every retry
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", 30))
+CHAT_CACHE_TTL = int(os.getenv("CHAT_CACHE_TTL", 86400))  # Seconds identical chat requests reuse a reply; 0 disables
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", 10000))  # Least recently used replies evicted beyond
+# Identical chat and embedding calls in flight at once share one call; across processes through REDIS_URL
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", 120))  # Seconds other processes wait at most
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", 0.05))  # Seconds between result checks
+LQA_MODEL = os.getenv("LQA_MODEL", "gpt-4o-2024-08-06")  # Needs structured outputs (json_schema)
+LQA_BATCH_TOKEN_BUDGET = int(os.getenv("LQA_BATCH_TOKEN_BUDGET", 8000))  # Prompt and result tokens per request
+LQA_BATCH_MAX_SEGMENTS = int(os.getenv("LQA_BATCH_MAX_SEGMENTS", 50))  # Segments reviewed by one request at most
+LQA_MAX_CONCURRENCY = int(os.getenv("LQA_MAX_CONCURRENCY", 4))  # LQA requests in flight per review
+LQA_MAX_ATTEMPTS = int(os.getenv("LQA_MAX_ATTEMPTS", 2))  # Requests for a lone segment before it is reported failed
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")  # 1536 dimensions
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 200000))  # API limit is 300k per request
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", 2048))  # API limit per request
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", 4))  # Batch calls in flight per process
+# Width of every backend's vectors, requested from the API too; must match the vector columns
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 1536))
+# Dotted path of the embedding backend: OpenAIBackend, HashingBackend or LocalModelBackend in
+# openai_app.services.embedding_backends, or a class of your own
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai_app.services.embedding_backends.OpenAIBackend")
+EMBEDDING_LOCAL_MODEL_PATH = os.getenv("EMBEDDING_LOCAL_MODEL_PATH", "")  # Directory with vocab.txt and embeddings.npy
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true")  # Database cache
+EMBEDDING_CACHE_LRU_SIZE = int(os.getenv("EMBEDDING_CACHE_LRU_SIZE", 10000))  # Vectors kept per process; 0 disables
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
+# The toolbar's middleware is sync only, which makes Django run every request, async views
+# included, on one thread; disable it to serve concurrent requests from an ASGI worker
+DEBUG_TOOLBAR_ENABLED = DEBUG and os.getenv("DEBUG_TOOLBAR_ENABLED", "true").lower() in ("1", "true")
 
 ALLOWED_HOSTS = []
 
@@ -34,7 +67,6 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     # Third party modules
-    'debug_toolbar',
     'dj_rest_auth',
     'allauth',
     'allauth.account',
@@ -76,7 +108,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -168,6 +199,9 @@ CONTACT_FORM_EMAIL = FROM_EMAIL_ADDRESS
 # Django debug toolbar settings
 if DEBUG:
     INTERNAL_IPS = ['127.0.0.1', ]
+if DEBUG_TOOLBAR_ENABLED:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
 
 # SSO configurations
 
@@ -225,6 +259,17 @@ FRONTEND_PAYMENT_FAILURE_URL = ''
 
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
 
+# Redis shared by all worker processes; caches fall back to per-process memory without it
+REDIS_URL = os.getenv('REDIS_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 # User activation settings
 SKIP_ACTIVATION = False
 ACTIVATION_EMAIL_RESEND_TIME = 900
@@ -251,6 +296,49 @@ EMAIL_HOST_USER = ''  # No username needed
 EMAIL_HOST_PASSWORD = ''  # No password needed
 DEFAULT_FROM_EMAIL = 'webmaster@localhost'
 
+# Uploads up to this size stay in memory; larger ones are spooled once by Django to a unique temp file
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv("FILE_UPLOAD_MAX_MEMORY_SIZE", 10 * 1024 * 1024))
+# Same as Django's defaults, but each file gets a SHA-256 content_hash computed as it streams in
+FILE_UPLOAD_HANDLERS = [
+    'project.upload_handlers.ContentHashMemoryFileUploadHandler',
+    'project.upload_handlers.ContentHashTemporaryFileUploadHandler',
+]
+
+# Process-wide OpenAI upload scheduler
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", 8))  # Uploads in flight per worker process
+UPLOAD_MAX_QUEUE_DEPTH = int(os.getenv("UPLOAD_MAX_QUEUE_DEPTH", 64))  # Waiting uploads before answering 503
+UPLOAD_PER_USER_MAX_IN_FLIGHT = int(os.getenv("UPLOAD_PER_USER_MAX_IN_FLIGHT", 4))
+
+# Process pool parsing uploaded files in web processes; Celery workers parse one file per task instead
+PARSE_MAX_WORKERS = int(os.getenv("PARSE_MAX_WORKERS", os.cpu_count() or 1))  # One per core; 0 parses in-thread
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join(BASE_DIR, "parse_cache"))  # Local disk, per host
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", 2 * 1024 ** 3))  # Least recently used evicted past this
+
+# Per-project OpenAI vector stores
+VECTOR_STORE_CACHE_TIMEOUT = int(os.getenv("VECTOR_STORE_CACHE_TIMEOUT", 24 * 3600))  # Seconds, shared cache
+VECTOR_STORE_LOCAL_CACHE_TIMEOUT = int(os.getenv("VECTOR_STORE_LOCAL_CACHE_TIMEOUT", 60))  # Seconds, per process
+VECTOR_STORE_MAX_FILES = int(os.getenv("VECTOR_STORE_MAX_FILES", 2000))  # Rotate to a new store past these sizes
+VECTOR_STORE_MAX_BYTES = int(os.getenv("VECTOR_STORE_MAX_BYTES", 1024 ** 3))
+VECTOR_STORE_EXPIRES_AFTER_DAYS = int(os.getenv("VECTOR_STORE_EXPIRES_AFTER_DAYS", 30))  # Idle rotated stores; 0 keeps
+
+# pgvector indexes on TranslationEmbedding; applied by migrations and `rebuild_vector_indexes`
+VECTOR_INDEX_HNSW_M = int(os.getenv("VECTOR_INDEX_HNSW_M", 16))  # Links per node; more is better recall, bigger index
+VECTOR_INDEX_HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_INDEX_HNSW_EF_CONSTRUCTION", 64))  # Build-time candidate list
+VECTOR_INDEX_IVFFLAT_LISTS = int(os.getenv("VECTOR_INDEX_IVFFLAT_LISTS", 0))  # 0 skips IVFFlat; about rows / 1000
+VECTOR_SEARCH_EF_SEARCH = int(os.getenv("VECTOR_SEARCH_EF_SEARCH", 40))  # Default query-time HNSW candidate list
+# Quantized HNSW indexes to build: "halfvec", "binary" or both, comma separated
+VECTOR_INDEX_QUANTIZATION = [mode for mode in os.getenv("VECTOR_INDEX_QUANTIZATION", "").split(",") if mode]
+VECTOR_SEARCH_IVFFLAT_PROBES = int(os.getenv("VECTOR_SEARCH_IVFFLAT_PROBES", 10))  # Default IVFFlat lists scanned
+VECTOR_SEARCH_MODE = os.getenv("VECTOR_SEARCH_MODE", "full")  # Index for candidates: "full", "halfvec" or "binary"
+VECTOR_SEARCH_RERANK_FACTOR = int(os.getenv("VECTOR_SEARCH_RERANK_FACTOR", 10))  # Quantized candidates per result
+TM_VECTOR_WEIGHT = float(os.getenv("TM_VECTOR_WEIGHT", 0.6))  # Share of vector similarity in TM match scores
+TM_CANDIDATES = int(os.getenv("TM_CANDIDATES", 40))  # Nearest neighbours re-scored by fuzzy match per segment
+TM_MAX_SEGMENTS = int(os.getenv("TM_MAX_SEGMENTS", 100))  # Per TM lookup request
+HYBRID_SEARCH_LEXICAL_WEIGHT = float(os.getenv("HYBRID_SEARCH_LEXICAL_WEIGHT", 1.0))  # Default RRF weights
+HYBRID_SEARCH_VECTOR_WEIGHT = float(os.getenv("HYBRID_SEARCH_VECTOR_WEIGHT", 1.0))
+HYBRID_SEARCH_RRF_K = int(os.getenv("HYBRID_SEARCH_RRF_K", 60))  # Damps the lead of top ranks in fused scores
+HYBRID_SEARCH_CANDIDATES = int(os.getenv("HYBRID_SEARCH_CANDIDATES", 50))  # Rows taken from each ranking
+
 MEDIA_URL = "/media/"
 STATIC_URL = "/static/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
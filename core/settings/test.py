@@ -1,6 +1,8 @@
 """Settings module for core tests."""
 
 import logging
+import os
+import tempfile
 
 from core.settings.base import *
 
@@ -16,4 +18,16 @@ IS_EMAIL_SENDING_ENABLED = False
 
 INITIAL_AGREEMENT_TYPE_NAMES = []
 
-ACTIVATION_EMAIL_TOKEN_EXPIRY_TIME = 3600
\ No newline at end of file
+ACTIVATION_EMAIL_TOKEN_EXPIRY_TIME = 3600
+OPENAI_POLL_INTERVAL = 0
+OPENAI_REQUESTS_PER_MINUTE = 0
+OPENAI_TOKENS_PER_MINUTE = 0
+OPENAI_RETRY_BASE_DELAY = 0.01
+CELERY_TASK_ALWAYS_EAGER = True
+PARSE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "parse_cache_tests")
+CHAT_CACHE_TTL = 0  # A reply cached in process would outlive the test's stub; cache tests use their own
+EMBEDDING_CACHE_LRU_SIZE = 0  # The cache table is rolled back after each test; an LRU would outlive it
+# The toolbar's sync-only middleware would run the async views under test one at a time
+DEBUG_TOOLBAR_ENABLED = False
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != "debug_toolbar"]
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if not middleware.startswith("debug_toolbar.")]
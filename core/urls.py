@@ -5,18 +5,21 @@ from django.contrib import admin
 from django.urls import include, path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from core.views import MetricsView
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('users.api.urls')),
     path('openai/', include('openai_app.api.urls')),
     path('project/', include('project.api.urls')),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
     path('', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
 ]
 
-if settings.DEBUG:
+if settings.DEBUG_TOOLBAR_ENABLED:
     urlpatterns.append(
         path('__debug__/', include('debug_toolbar.urls'))
     )
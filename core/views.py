@@ -0,0 +1,17 @@
+"""Views for core app."""
+
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import metrics
+
+
+class MetricsView(APIView):
+    """Expose this worker's in-process metrics to staff users."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        """Return a snapshot of counters and gauges."""
+        return Response(metrics.snapshot(), status=status.HTTP_200_OK)
@@ -0,0 +1,26 @@
+"""Renderers for the OpenAI APIs."""
+
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+def sse_event(data, event=None):
+    """Return one server-sent event carrying ``data`` as JSON."""
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets views answer ``Accept: text/event-stream``; anything not already streamed is sent as one event."""
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render an ordinary response, usually an error, as a single ``error`` or ``message`` event."""
+        response = (renderer_context or {}).get("response")
+        event = "error" if response is not None and response.status_code >= 400 else "message"
+        return sse_event(data, event).encode(self.charset)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 class OpenAIRequestSerializer(serializers.Serializer):
@@ -6,3 +7,18 @@ class OpenAIRequestSerializer(serializers.Serializer):
         child=serializers.DictField(),
         required=True
     )
+    stream = serializers.BooleanField(default=False)  # Relay the reply as server-sent events
+    cache = serializers.BooleanField(default=True)  # False fetches a fresh reply, like Cache-Control: no-cache
+
+
+class TMLookupSerializer(serializers.Serializer):
+    """Validates a translation-memory lookup."""
+
+    segments = serializers.ListField(
+        child=serializers.CharField(trim_whitespace=False),
+        allow_empty=False,
+        max_length=settings.TM_MAX_SEGMENTS,
+    )
+    k = serializers.IntegerField(min_value=1, max_value=50, default=5)
+    vector_weight = serializers.FloatField(min_value=0, max_value=1, required=False)
+    ef_search = serializers.IntegerField(min_value=1, max_value=1000, required=False)
@@ -1,8 +1,649 @@
-from django.test import TestCase
-from openai.services.services import OpenAIService
+"""Tests for the openai_app app."""
 
-class OpenAIServiceTest(TestCase):
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+from unittest.mock import patch
+
+import numpy as np
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import metrics
+from openai_app.checks import check_embedding_dimensions
+from openai_app.models import EmbeddingCache as EmbeddingCacheEntry
+from openai_app.models import TranslationEmbedding
+from openai_app.services.client import OpenAIClient
+from openai_app.services.embedding_backends import HashingBackend, LocalModelBackend, OpenAIBackend, split_vectors
+from openai_app.services.embedding_cache import EmbeddingCache
+from openai_app.services.embeddings import EmbeddingService
+from openai_app.services.lqa import LQABatchEngine, LQASegment, LQAUnavailable
+from openai_app.services.rate_limit import TokenBucketLimiter
+from openai_app.services.response_cache import ResponseCache, request_key
+from openai_app.services.services import AsyncOpenAIService, OpenAIService
+from openai_app.services.single_flight import SingleFlight
+from openai_app.services.translation_memory import lookup_vectors, trigram_similarity
+from openai_app.services.vector_search import nearest_translations
+from openai_app.utils.stub_server import stub_embedding
+from openai_app.utils.testing import StubOpenAIMixin
+from project.models import Project, ProjectFile
+from project.services.embeddings import embed_project_file
+from project.services.segments import ingest_segments
+
+User = get_user_model()
+
+
+class StubOpenAITestCase(StubOpenAIMixin, SimpleTestCase):
+    """Point the shared OpenAI client at a local stub server, without a database."""
+
+
+class OpenAIServiceTest(StubOpenAITestCase):
     def test_generate_response(self):
         ai_service = OpenAIService()
         response = ai_service.generate_response([{"role": "user", "content": "Hello"}])
         self.assertIsInstance(response, str)
+
+
+class StreamingUploadTest(StubOpenAITestCase):
+    """Test that uploads stream from the request file without a temporary copy."""
+
+    def test_upload_streams_file_object(self):
+        """Test the upload is sent from the open file handle."""
+        file = SimpleUploadedFile('segments.sdlxliff', b'<xliff/>' * 1000)
+        file.read(10)  # A partially consumed handle must still be sent from the start
+
+        service = OpenAIService()
+        file_object = service.create_file(file)
+        vector_store_files = service.attach_files('vs_project', [file_object.id])
+
+        self.assertFalse(os.path.exists('/tmp/segments.sdlxliff'))
+        self.assertEqual(vector_store_files[file_object.id].status, 'completed')
+        uploaded = self.stub.files[file_object.id]
+        self.assertEqual(uploaded['filename'], 'segments.sdlxliff')
+        self.assertGreater(uploaded['bytes'], 8000)
+
+
+class FileBatchAttachTest(StubOpenAITestCase):
+    """Test vector store attachment through file batches."""
+
+    def test_attach_files_with_one_batch(self):
+        """Test many files are attached by one batch call and a single polling loop."""
+        self.stub.batch_polls = 3
+        service = OpenAIService()
+        file_ids = [service.create_file(SimpleUploadedFile(f'{index}.xliff', b'x')).id for index in range(5)]
+
+        vector_store_files = service.attach_files('vs_project', file_ids + ['file-missing'])
+
+        batch_requests = [path for _, path, _ in self.stub.requests if '/file_batches' in path]
+        self.assertEqual(len(batch_requests), 1 + 3 + 1)  # Create, three polls, list files
+        self.assertFalse(any(path.endswith('/vs_project/files') for _, path, _ in self.stub.requests))
+        self.assertEqual({file_id: vector_store_files[file_id].status for file_id in file_ids},
+                         dict.fromkeys(file_ids, 'completed'))
+        self.assertEqual(vector_store_files['file-missing'].status, 'failed')
+
+
+class RateLimitTest(StubOpenAITestCase):
+    """Test pacing and retrying OpenAI calls under a rate limit."""
+
+    def test_rate_limited_calls_are_retried(self):
+        """Test 429s are retried after Retry-After instead of failing the call."""
+        self.stub.requests_per_second = self.stub._allowance = 5
+        service = OpenAIService()
+
+        replies = [service.generate_response([{'role': 'user', 'content': f'Segment {index}'}]) for index in range(8)]
+
+        self.assertEqual(replies, [f'Segment {index}' for index in range(8)])
+        self.assertGreater(self.stub.rate_limited, 0)
+
+    def test_retried_upload_resends_whole_file(self):
+        """Test a file upload retried after a 429 is sent again from its start."""
+        self.stub.requests_per_second = self.stub._allowance = 1
+        service = OpenAIService()
+
+        sizes = [self.stub.files[service.create_file(SimpleUploadedFile(f'{index}.xliff', b'x' * 5000)).id]['bytes']
+                 for index in range(2)]
+
+        self.assertEqual(self.stub.rate_limited, 1)
+        self.assertEqual(sizes[0], sizes[1])
+
+    def test_token_bucket_paces_requests_and_tokens(self):
+        """Test calls wait once either per-minute budget is spent."""
+        limiter = TokenBucketLimiter(requests_per_minute=600, tokens_per_minute=6000, burst_seconds=1)
+
+        self.assertEqual(limiter.acquire(tokens=100), 0)
+        self.assertGreater(limiter.acquire(tokens=1), 0)  # Token budget for this second is spent
+        limiter.pause(0.2)
+        started = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+
+class EmbeddingTest(StubOpenAIMixin, TestCase):
+    """Test batched segment embedding."""
+
+    def setUp(self):
+        """Point the OpenAI client at a stub and create a file with segments."""
+        super().setUp()
+        user = User.objects.create_user(email='embeddings@example.com', password='testpassword')
+        project = Project.objects.create(name='Embeddings', client_name='Hooli', created_by=user)
+        self.project_file = ProjectFile.objects.create(
+            project=project, openai_file_id='file-1', file_name='a.xliff', file_type='xliff'
+        )
+
+    def test_texts_packed_into_bounded_batches(self):
+        """Test batches stay in order and within the token and input limits."""
+        service = EmbeddingService(max_batch_tokens=4, max_batch_inputs=3)
+
+        batches = list(service.batches(['a', 'b', 'c', 'd', 'x' * 9, 'y' * 12, 'e', 'é' * 6]))
+
+        self.assertEqual(batches, [['a', 'b', 'c'], ['d', 'x' * 9], ['y' * 12], ['e'], ['é' * 6]])
+
+    def test_segments_embedded_with_few_calls_in_order(self):
+        """Test many segments take one call per batch and each vector lands on its own segment."""
+        segments = [(str(index), f'Segment {index}', None, None) for index in range(49)]
+        ingest_segments(self.project_file, segments + [('e', '', None, None)])
+        service = EmbeddingService(max_batch_inputs=20, max_concurrency=2)
+
+        count = embed_project_file(self.project_file, service)
+
+        self.assertEqual(count, 49)
+        self.assertEqual([path for _, path, _ in self.stub.requests], ['/v1/embeddings'] * 3)
+        for segment in self.project_file.segments.exclude(source=''):
+            self.assertEqual(list(segment.embedding), stub_embedding(segment.source, 1536))
+        self.assertIsNone(self.project_file.segments.get(segment_id='e').embedding)
+        self.assertEqual(embed_project_file(self.project_file, service), 0)
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_repeated_texts_embedded_once_and_cached(self):
+        """Test repeats are embedded once, then served from the table and the in-process LRU without API calls."""
+        service = EmbeddingService()
+        save, cancel = (list(array('f', stub_embedding(text, 1536))) for text in ('Save', 'Cancel'))
+
+        first = list(service.embed(['Save', ' Save\n', 'Cancel', 'Save']))
+
+        self.assertEqual([list(vector) for vector in first], [save, save, cancel, save])
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(EmbeddingCacheEntry.objects.count(), 2)
+        before = metrics.snapshot()['counters']
+        service.cache = EmbeddingCache(service.model, service.dimensions, lru_size=10)
+        with self.assertNumQueries(1):
+            list(service.embed(['Cancel', 'Save']))
+        with self.assertNumQueries(0):
+            second = list(service.embed(['Cancel', 'Save']))
+        counters = metrics.snapshot()['counters']
+        self.assertEqual([list(vector) for vector in second], [cancel, save])
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(counters['embedding_cache.hits'] - before['embedding_cache.hits'], 4)
+        self.assertEqual(counters['embedding_cache.lru_hits'] - before['embedding_cache.lru_hits'], 2)
+        self.assertEqual(counters['embedding_cache.api_calls_saved'] - before['embedding_cache.api_calls_saved'], 2)
+        self.assertEqual(service.cache.hit_rate(), 1.0)
+
+    @override_settings(EMBEDDING_DIMENSIONS=256)
+    def test_dimensions_requested_and_checked(self):
+        """Test vectors are requested as wide as EMBEDDING_DIMENSIONS, and a width the columns do not have fails."""
+        vectors = OpenAIBackend().embed_batch(['Save', 'Cancel'])
+
+        self.assertEqual([len(vector) for vector in vectors], [256, 256])
+        self.assertEqual(split_vectors(b'', 0), [])
+        self.assertEqual([error.id for error in check_embedding_dimensions(None)], ['openai_app.E001'] * 2)
+        with override_settings(EMBEDDING_DIMENSIONS=1536):
+            self.assertEqual(check_embedding_dimensions(None), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'pgvector needs PostgreSQL')
+class VectorSearchTest(TestCase):
+    """Test nearest-neighbour search over TranslationEmbedding."""
+
+    def test_nearest_first_with_per_query_ef_search(self):
+        """Test results are ordered by cosine distance and ef_search only applies inside the query."""
+        for index, text in enumerate(['Save', 'Cancel', 'Close']):
+            TranslationEmbedding.objects.create(
+                source_text=text, target_text=text, embedding=[1.0 if i == index else 0.1 for i in range(1536)]
+            )
+        query = [1.0 if i == 1 else 0.1 for i in range(1536)]
+
+        results = nearest_translations(query, k=2, ef_search=200)
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0].source_text, 'Cancel')
+        self.assertLess(results[0].distance, results[1].distance)
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW hnsw.ef_search')
+            self.assertEqual(cursor.fetchone()[0], '40')
+
+    def test_quantized_modes_rerank_on_full_vectors(self):
+        """Test halfvec and binary candidate passes return the exact nearest rows with full-precision distances."""
+        for index, text in enumerate(['Save', 'Cancel', 'Close']):
+            TranslationEmbedding.objects.create(
+                source_text=text, target_text=text, embedding=[1.0 if i == index else -0.1 for i in range(1536)]
+            )
+        query = [1.0 if i == 1 else -0.1 for i in range(1536)]
+        expected = nearest_translations(query, k=2, mode='full')
+
+        for mode in ('halfvec', 'binary'):
+            with self.subTest(mode=mode):
+                results = nearest_translations(query, k=2, mode=mode, rerank_factor=2)
+                self.assertEqual([row.pk for row in results], [row.pk for row in expected])
+                self.assertAlmostEqual(results[0].distance, expected[0].distance)
+
+
+class TranslationMemoryTest(StubOpenAIMixin, APITestCase):
+    """Test the translation-memory lookup API."""
+
+    def setUp(self):
+        """Authenticate, point the OpenAI client at a stub and store a few translations."""
+        super().setUp()
+        user = User.objects.create_user(email='tm@example.com', password='testpassword')
+        self.client.force_authenticate(user)
+        for source, target in [('Press Save to keep your changes.', 'Klicken Sie auf Speichern.'),
+                               ('Press Cancel to discard your changes.', 'Klicken Sie auf Abbrechen.'),
+                               ('Order number PX-2231 has shipped.', 'Bestellung PX-2231 wurde versandt.')]:
+            TranslationEmbedding.objects.create(
+                source_text=source, target_text=target, embedding=stub_embedding(source, 1536)
+            )
+
+    def test_trigram_similarity_matches_pg_trgm(self):
+        """Test the in-process fuzzy score follows pg_trgm's documented example."""
+        self.assertAlmostEqual(trigram_similarity('word', 'two words'), 4 / 11)
+
+    def test_lookup_returns_top_k_per_segment(self):
+        """Test each segment gets its best matches first, scored by vector and fuzzy similarity."""
+        response = self.client.post(reverse('tm-lookup'), {
+            'segments': ['Press Save to keep your changes.', 'Press Cancel to discard changes.'], 'k': 2,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        exact, fuzzy = response.data['results']
+        self.assertEqual(exact['matches'][0]['target_text'], 'Klicken Sie auf Speichern.')
+        self.assertAlmostEqual(exact['matches'][0]['fuzzy'], 1.0)
+        self.assertAlmostEqual(exact['matches'][0]['similarity'], 1.0, places=5)
+        self.assertEqual(fuzzy['matches'][0]['target_text'], 'Klicken Sie auf Abbrechen.')
+        self.assertEqual(len(fuzzy['matches']), 2)
+        self.assertGreater(fuzzy['matches'][0]['score'], fuzzy['matches'][1]['score'])
+
+    def test_whole_batch_in_one_query(self):
+        """Test the matches of every segment are fetched with a single database round trip."""
+        texts = [f'Segment {index}' for index in range(20)]
+        with self.assertNumQueries(1):
+            results = lookup_vectors(texts, [stub_embedding(text, 1536) for text in texts], 3, 0.6, 10)
+
+        self.assertEqual([len(matches) for matches in results], [3] * 20)
+
+
+class EmbeddingBackendTest(TestCase):
+    """Test the offline embedding backends."""
+
+    def cosine(self, first, second):
+        """Return the cosine similarity of two vectors."""
+        first, second = np.asarray(first), np.asarray(second)
+        return float(first @ second / np.linalg.norm(first) / np.linalg.norm(second))
+
+    def test_hashing_backend_is_deterministic_and_lexical(self):
+        """Test feature hashing returns stable unit vectors that are closer for texts sharing words."""
+        first, again, near, far = HashingBackend().embed_batch(
+            ['Replace filter PX-2231.', 'Replace filter PX-2231.', 'Replace the filter.', 'Press Save to continue.']
+        )
+
+        self.assertEqual(len(first), 1536)
+        self.assertEqual(first, again)
+        self.assertAlmostEqual(float(np.linalg.norm(first)), 1.0, places=5)
+        self.assertGreater(self.cosine(first, near), self.cosine(first, far))
+
+    def test_local_model_backend(self):
+        """Test a model from disk averages known word vectors, pads them, and falls back to hashing."""
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, 'vocab.txt'), 'w', encoding='utf-8') as vocab:
+                vocab.write('save\nchanges\ncancel\n')
+            np.save(os.path.join(path, 'embeddings.npy'), np.array([[1, 0], [0, 1], [-1, 0]], dtype=np.float32))
+            backend = LocalModelBackend(path)
+            saved, cancelled, unknown = backend.embed_batch(['Save changes', 'Cancel', 'Zzyzx'])
+            with self.assertRaises(ImproperlyConfigured):
+                LocalModelBackend(os.path.join(path, 'missing'))
+
+        self.assertEqual(backend.model, f'local:{os.path.basename(path)}')
+        self.assertAlmostEqual(saved[0], saved[1], places=5)
+        self.assertEqual(list(cancelled[:3]), [-1.0, 0.0, 0.0])
+        self.assertEqual(unknown, HashingBackend().embed_batch(['Zzyzx'])[0])
+
+    @override_settings(EMBEDDING_BACKEND='openai_app.services.embedding_backends.HashingBackend')
+    def test_service_embeds_offline_through_the_cache(self):
+        """Test the configured backend is used without any API call and its vectors are cached under its name."""
+        with patch.object(OpenAIClient, 'get_client', side_effect=AssertionError('No network')):
+            vectors = list(EmbeddingService().embed(['Save', 'Cancel', 'Save']))
+
+        self.assertEqual(vectors[0], vectors[2])
+        self.assertEqual(EmbeddingCacheEntry.objects.filter(model='feature-hashing-v1').count(), 2)
+
+
+class ChatStreamTest(StubOpenAIMixin, APITestCase):
+    """Test streaming chat replies over server-sent events from the async chat view."""
+
+    def setUp(self):
+        """Sign a token and point the async OpenAI client at a stub that pauses between tokens."""
+        super().setUp()
+        self.stub.token_delay = 0.02
+        user = User.objects.create_user(email='chat@example.com', password='testpassword')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+    def chat(self, content, **data):
+        """Post a one-message chat request through the async test client."""
+        data['messages'] = [{'role': 'user', 'content': content}]
+        return self.async_client.post(reverse('chat-list'), data, content_type='application/json', headers=self.headers)
+
+    async def events(self, response):
+        """Return the (event, data) pairs of a streamed response."""
+        events = []
+        content = b''.join([part async for part in response.streaming_content])
+        for block in content.decode().split('\n\n')[:-1]:
+            fields = dict(line.split(': ', 1) for line in block.split('\n'))
+            events.append((fields.get('event', 'message'), json.loads(fields['data'])))
+        return events
+
+    async def test_reply_streamed_as_events(self):
+        """Test tokens arrive as message events that add up to the reply, followed by done."""
+        message = 'The term is translated inconsistently in segments 4 and 9.'
+        response = await self.chat(message, stream=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = await self.events(response)
+        self.assertEqual(events[-1], ('done', {}))
+        self.assertGreater(len(events), 5)
+        self.assertEqual(''.join(data['delta'] for event, data in events[:-1]), message)
+
+    async def test_accept_header_selects_streaming(self):
+        """Test clients asking for text/event-stream get a stream without the stream flag."""
+        self.headers['Accept'] = 'text/event-stream'
+        response = await self.chat('Hello')
+
+        self.assertTrue(response.streaming)
+        self.assertEqual((await self.events(response))[-1], ('done', {}))
+
+    async def test_disconnect_stops_generation(self):
+        """Test a client disconnecting mid-stream hangs up on OpenAI instead of reading the rest."""
+        before = metrics.snapshot()['counters'].get('openai.chat_streams.abandoned', 0)
+        response = await self.chat('word ' * 200, stream=True)
+        first_event = asyncio.Event()
+
+        async def read():
+            async for _ in response:
+                first_event.set()
+
+        reader = asyncio.create_task(read())
+        await first_event.wait()
+        reader.cancel()  # What the ASGI handler does when the client goes away
+
+        deadline = time.monotonic() + 5
+        while not self.stub.aborted_streams and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        self.assertEqual(self.stub.aborted_streams, 1)
+        self.assertEqual(metrics.snapshot()['counters']['openai.chat_streams.abandoned'], before + 1)
+
+    async def test_concurrent_requests_share_the_event_loop(self):
+        """Test replies awaited at the same time take about as long as one, with no thread each."""
+        started = time.monotonic()
+        await self.chat('one two three four five six seven eight')
+        single = time.monotonic() - started
+
+        started = time.monotonic()
+        responses = await asyncio.gather(*[
+            self.chat(f'one two three four five six seven {index}') for index in range(50)
+        ])
+
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(responses[7].json(), {'response': 'one two three four five six seven 7'})
+        self.assertLess(time.monotonic() - started, single * 5)
+
+
+class ResponseCacheTest(StubOpenAIMixin, APITestCase):
+    """Test chat replies are served from the reply cache for repeated requests."""
+
+    def setUp(self):
+        """Sign a token, point the async client at a stub and give the services a fresh cache."""
+        super().setUp()
+        user = User.objects.create_user(email='cache@example.com', password='testpassword')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        self.response_cache = ResponseCache(ttl=60, max_entries=100)
+        self.enterContext(patch('openai_app.services.services.get_response_cache', return_value=self.response_cache))
+
+    def chat(self, content, headers=None, **data):
+        """Post a one-message chat request through the async test client."""
+        data['messages'] = [{'role': 'user', 'content': content}]
+        return self.async_client.post(reverse('chat-list'), data, content_type='application/json',
+                                      headers={**self.headers, **(headers or {})})
+
+    def completions(self):
+        """Return how many chat completions reached the stub."""
+        return sum(path.endswith('/chat/completions') for _, path, _ in self.stub.requests)
+
+    async def test_repeated_request_is_a_hit(self):
+        """Test the second identical request is answered from the cache, and says so."""
+        before = metrics.snapshot()['counters'].get('openai.chat_cache.hits', 0)
+        first = await self.chat('Check segment 12 for terminology.')
+        second = await self.chat('Check segment 12 for terminology.')
+        other = await self.chat('Check segment 13 for terminology.')
+
+        self.assertEqual((first['X-Cache'], second['X-Cache'], other['X-Cache']), ('MISS', 'HIT', 'MISS'))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(self.completions(), 2)
+        self.assertEqual(metrics.snapshot()['counters']['openai.chat_cache.hits'], before + 1)
+
+    async def test_bypass_fetches_a_fresh_reply(self):
+        """Test the cache flag and Cache-Control: no-cache skip the lookup but refresh the entry."""
+        await self.chat('Hello')
+        flag = await self.chat('Hello', cache=False)
+        header = await self.chat('Hello', headers={'Cache-Control': 'no-cache'})
+        cached = await self.chat('Hello')
+
+        self.assertEqual((flag['X-Cache'], header['X-Cache'], cached['X-Cache']), ('BYPASS', 'BYPASS', 'HIT'))
+        self.assertEqual(self.completions(), 3)
+
+    def test_key_is_canonical(self):
+        """Test keys ignore dictionary order but not the model, messages or parameters."""
+        messages = [{'role': 'user', 'content': 'Hi'}]
+        key = request_key('gpt-4-turbo', messages, {'temperature': 0, 'max_tokens': 5})
+
+        self.assertEqual(key, request_key('gpt-4-turbo', [{'content': 'Hi', 'role': 'user'}],
+                                          {'max_tokens': 5, 'temperature': 0}))
+        self.assertNotEqual(key, request_key('gpt-4o', messages, {'temperature': 0, 'max_tokens': 5}))
+        self.assertNotEqual(key, request_key('gpt-4-turbo', messages, {'temperature': 1, 'max_tokens': 5}))
+
+    def test_expiry_and_eviction(self):
+        """Test replies expire after the TTL and the least recently used go first past the size bound."""
+        response_cache = ResponseCache(ttl=60, max_entries=2)
+        response_cache.set('a', 'reply a')
+        response_cache.set('b', 'reply b')
+        response_cache.get('a')
+        response_cache.set('c', 'reply c')
+
+        self.assertEqual([response_cache.get(key) for key in 'abc'], ['reply a', None, 'reply c'])
+        with patch('openai_app.services.response_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(response_cache.get('a'))
+
+
+class SingleFlightTest(StubOpenAITestCase):
+    """Test identical OpenAI calls in flight at the same time share one upstream call."""
+
+    def setUp(self):
+        """Make the stub slow enough for calls to overlap."""
+        super().setUp()
+        self.stub.latency = 0.3
+
+    def calls(self, route):
+        """Return how many requests reached a stub route."""
+        return sum(path.endswith(route) for _, path, _ in self.stub.requests)
+
+    def test_concurrent_chat_requests_share_a_call(self):
+        """Test threads asking for the same reply at once get it from a single completion."""
+        messages = [{'role': 'user', 'content': 'Review segment 4.'}]
+        with ThreadPoolExecutor(8) as pool:
+            replies = list(pool.map(lambda _: OpenAIService().generate_response(messages), range(8)))
+
+        self.assertEqual(replies, ['Review segment 4.'] * 8)
+        self.assertEqual(self.calls('/chat/completions'), 1)
+
+    def test_concurrent_embedding_batches_share_a_call(self):
+        """Test identical embedding batches requested at once are embedded once."""
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda _: OpenAIBackend().embed_batch(['Source', 'Target']), range(4)))
+
+        self.assertEqual(self.calls('/embeddings'), 1)
+        self.assertEqual([list(vector) for vector in results[3]], [list(vector) for vector in results[0]])
+
+    async def test_cancelled_caller_leaves_the_call_to_the_others(self):
+        """Test a caller going away, as on a client disconnect, does not fail the callers sharing its call."""
+        messages = [{'role': 'user', 'content': 'Review segment 9.'}]
+        first = asyncio.create_task(AsyncOpenAIService().generate_response(messages))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(AsyncOpenAIService().generate_response(messages))
+        await asyncio.sleep(0.05)
+        first.cancel()
+
+        self.assertEqual(await second, 'Review segment 9.')
+        self.assertEqual(self.calls('/chat/completions'), 1)
+
+    def test_failure_is_shared(self):
+        """Test callers waiting on a call that fails get its exception rather than calling again."""
+        single_flight = SingleFlight()
+        started = threading.Event()
+        calls = []
+
+        def fail():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            raise ValueError('upstream down')
+
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(single_flight.do, 'key', fail)
+            started.wait()
+            follower = pool.submit(single_flight.do, 'key', fail)
+            for future in (leader, follower):
+                with self.assertRaisesMessage(ValueError, 'upstream down'):
+                    future.result()
+        self.assertEqual(len(calls), 1)
+
+    @skipUnless(os.environ.get('REDIS_URL'), 'Coalescing across processes needs Redis.')
+    def test_call_shared_across_processes(self):
+        """Test a coordinator in another process waits for the result instead of calling."""
+        prefix = f'test:single_flight:{time.time_ns()}'
+        processes = [SingleFlight(redis.Redis.from_url(os.environ['REDIS_URL']), key_prefix=prefix) for _ in range(2)]
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            time.sleep(0.3)
+            return 'reply'
+
+        with ThreadPoolExecutor(1) as pool:
+            leader = pool.submit(processes[0].do, 'key', slow)
+            started.wait()
+            follower = processes[1].do('key', lambda: 'called again')
+        self.assertEqual((leader.result(), follower), ('reply', 'reply'))
+
+
+class LQABatchTest(StubOpenAITestCase):
+    """Test LQA segments are packed into few structured-output requests and failed items are re-split."""
+
+    segments = [
+        LQASegment(str(index), f'Press button {index} to continue.', f'Drücken Sie die Taste {index}.')
+        for index in range(10)
+    ] + [
+        LQASegment('empty', 'Save your changes.', ''),
+        LQASegment('number', 'Wait 30 seconds.', 'Warten Sie einige Sekunden.'),
+    ]
+
+    def completions(self):
+        """Return how many chat completions reached the stub."""
+        return sum(path.endswith('/chat/completions') for _, path, _ in self.stub.requests)
+
+    def test_batches_respect_the_budget(self):
+        """Test every batch fits the token budget and segment count, and batches keep input order."""
+        engine = LQABatchEngine(token_budget=1200, max_segments=4)
+        batches = list(engine.batches(self.segments))
+
+        self.assertEqual([segment for batch in batches for segment in batch], self.segments)
+        self.assertTrue(all(len(batch) <= 4 for batch in batches))
+        self.assertLess(len(batches), len(self.segments))
+        self.assertEqual(len(list(LQABatchEngine(token_budget=1, max_segments=4).batches(self.segments))),
+                         len(self.segments))
+
+    def test_review_packs_segments_into_one_request(self):
+        """Test a batch that fits is reviewed with one request and each result is matched to its segment."""
+        engine = LQABatchEngine(token_budget=8000, max_segments=50)
+        results = engine.review(self.segments)
+
+        self.assertEqual(self.completions(), 1)
+        self.assertEqual([result.id for result in results], [segment.id for segment in self.segments])
+        self.assertEqual([result.score for result in results[:10]], [100] * 10)
+        self.assertEqual(results[10].issues[0]['category'], 'omission')
+        self.assertEqual(results[11].issues[0]['category'], 'accuracy')
+        self.assertEqual((engine.stats.requests, engine.stats.resplits), (1, 0))
+        self.assertGreater(engine.stats.prompt_tokens, 0)
+
+    def test_dropped_items_are_resplit(self):
+        """Test segments missing from a reply are sent again in halves until every one is reviewed."""
+        self.stub.lqa_max_items = 3
+        engine = LQABatchEngine(token_budget=8000, max_segments=50, max_concurrency=1)
+        results = engine.review(self.segments)
+
+        self.assertTrue(all(result.error is None for result in results))
+        self.assertEqual([result.id for result in results], [segment.id for segment in self.segments])
+        # 12 -> 3 + split [4 | 5]; 4 -> 3 + retry [1]; 5 -> 3 + split [1 | 1]
+        self.assertEqual((engine.stats.requests, engine.stats.resplits), (6, 2))
+
+    def test_unreviewable_segment_is_reported(self):
+        """Test a segment that never comes back is retried, then reported with an error instead of a score."""
+        self.stub.lqa_max_items = 0
+        engine = LQABatchEngine(max_attempts=2)
+        with self.assertLogs('openai_app.services.lqa', 'ERROR'):
+            results = engine.review(self.segments[:1])
+
+        self.assertIsNone(results[0].score)
+        self.assertIsNotNone(results[0].error)
+        self.assertEqual((self.completions(), engine.stats.failed), (2, 1))
+
+    @override_settings(OPENAI_RETRY_BASE_DELAY=0.01, OPENAI_RETRY_MAX_DELAY=0.01)
+    def test_outage_fails_fast(self):
+        """Test a request that gets an error instead of a reply aborts the run rather than re-splitting."""
+        for status, calls in ((500, 1 + settings.OPENAI_MAX_RETRIES), (401, 1)):  # Only 5xx are retried
+            with self.subTest(status=status):
+                self.stub.error_status = status
+                before = self.completions()
+                engine = LQABatchEngine(max_segments=2, max_concurrency=1)
+                with self.assertRaises(LQAUnavailable):
+                    engine.review(self.segments)
+
+                self.assertEqual(self.completions() - before, calls)  # Not 6 batches, nor their halves and retries
+                self.assertEqual((engine.stats.requests, engine.stats.resplits), (1, 0))
+
+    def test_retries_bypass_the_reply_cache(self):
+        """Test with the reply cache on, retries reach the model and only complete replies are cached."""
+        response_cache = ResponseCache(ttl=60, max_entries=100)
+        self.enterContext(patch('openai_app.services.services.get_response_cache', return_value=response_cache))
+        self.stub.lqa_max_items = 0
+        with self.assertLogs('openai_app.services.lqa', 'ERROR'):
+            LQABatchEngine(max_attempts=2).review(self.segments[:1])
+        self.assertEqual(self.completions(), 2)
+
+        self.stub.lqa_max_items = None
+        first = LQABatchEngine().review(self.segments[:1])
+        second = LQABatchEngine().review(self.segments[:1])
+
+        self.assertEqual(self.completions(), 3)  # The incomplete replies were not cached; the complete one was
+        self.assertEqual(second, first)
+        self.assertEqual(first[0].score, 100)
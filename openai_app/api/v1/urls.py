@@ -2,11 +2,12 @@
 from django.urls import path,include
 from rest_framework.routers import DefaultRouter
 
-from openai_app.api.v1.views import OpenAIChatViewSet
+from openai_app.api.v1.views import OpenAIChatView, TranslationMemoryViewSet
 router = DefaultRouter()
-router.register(r'chat', OpenAIChatViewSet, basename='chat')
+router.register(r'tm', TranslationMemoryViewSet, basename='tm')
 
 urlpatterns = [
+    path('chat/', OpenAIChatView.as_view(), name='chat-list'),
     path('', include(router.urls)),
 ]
 # urlpatterns = [path('chat/', OpenAIChatViewSet, name='api-login'), ] + router.urls
@@ -1,22 +1,93 @@
+import logging
+
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from openai_app.services.services import OpenAIService
-from .serializers import OpenAIRequestSerializer
+from core.async_views import AsyncAPIView
+from openai_app.services import translation_memory
+from openai_app.services.services import AsyncOpenAIService
+from .renderers import EventStreamRenderer, sse_event
+from .serializers import OpenAIRequestSerializer, TMLookupSerializer
+
+logger = logging.getLogger(__name__)
+
+
+async def chat_events(pieces):
+    """Yield a ``message`` event per piece of the reply, then ``done``, or ``error`` if the stream breaks.
 
+    Closing or cancelling this generator, as the server does when the client disconnects,
+    closes ``pieces`` and with it the OpenAI stream.
+    """
+    try:
+        async for piece in pieces:
+            yield sse_event({"delta": piece})
+        yield sse_event({}, "done")
+    except Exception as e:
+        logger.error(f"OpenAI stream error: {e}")
+        yield sse_event({"error": "AI service unavailable"}, "error")
+    finally:
+        await pieces.aclose()
 
-class OpenAIChatViewSet(viewsets.ViewSet):
-    """ViewSet for handling OpenAI API chat requests"""
+
+class OpenAIChatView(AsyncAPIView):
+    """Async view for OpenAI API chat requests: a worker awaits many replies at once"""
 
     permission_classes = [permissions.IsAuthenticated]  # ✅ Secure API
     serializer_class = OpenAIRequestSerializer
-    def create(self, request):
-        """Handles AI chat processing"""
-        serializer = OpenAIRequestSerializer(data=request.data)
+    renderer_classes = [JSONRenderer, BrowsableAPIRenderer, EventStreamRenderer]
+
+    async def post(self, request):
+        """Handles AI chat processing; streams the reply as server-sent events when asked to
+
+        Unstreamed replies come from the reply cache when the same request was answered before;
+        the X-Cache header says HIT, MISS or BYPASS.
+        """
+        serializer = OpenAIRequestSerializer(data=await self.request_data())
         if serializer.is_valid():
-            ai_service = OpenAIService()
-            response_text = ai_service.generate_response(serializer.validated_data["messages"])
+            ai_service = AsyncOpenAIService()
+            if serializer.validated_data["stream"] or request.accepted_renderer.format == "sse":
+                return await self.stream(ai_service, serializer.validated_data["messages"])
+            no_cache = "no-cache" in request.headers.get("Cache-Control", "")
+            use_cache = serializer.validated_data["cache"] and not no_cache
+            response_text = await ai_service.generate_response(serializer.validated_data["messages"], cache=use_cache)
             if response_text:
-                return Response({"response": response_text}, status=status.HTTP_200_OK)
+                headers = {"X-Cache": ai_service.cache_status.upper()} if ai_service.cache_status else None
+                return Response({"response": response_text}, status=status.HTTP_200_OK, headers=headers)
             return Response({"error": "AI service unavailable"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    async def stream(self, ai_service, messages):
+        """Relay the reply's tokens as they arrive, so clients wait for the first token rather than the last"""
+        pieces = await ai_service.stream_response(messages)
+        if pieces is None:
+            return Response({"error": "AI service unavailable"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        response = StreamingHttpResponse(chat_events(pieces), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # Stop nginx buffering the events
+        return response
+
+
+class TranslationMemoryViewSet(viewsets.ViewSet):
+    """ViewSet for translation-memory lookups."""
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = TMLookupSerializer
+
+    @action(detail=False, methods=['post'])
+    def lookup(self, request):
+        """Return the top-k fuzzy matches for each source segment, scored by embedding and character similarity."""
+        serializer = TMLookupSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        matches = translation_memory.lookup(
+            data["segments"], k=data["k"], vector_weight=data.get("vector_weight"), ef_search=data.get("ef_search")
+        )
+        results = [
+            {"segment": segment, "matches": [match.as_dict() for match in segment_matches]}
+            for segment, segment_matches in zip(data["segments"], matches)
+        ]
+        return Response({"results": results}, status=status.HTTP_200_OK)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OpenaiApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'openai_app'
+
+    def ready(self):
+        """Register the app's system checks."""
+        from . import checks  # noqa: F401
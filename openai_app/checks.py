@@ -0,0 +1,25 @@
+"""System checks for the openai_app settings."""
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+
+
+@checks.register(checks.Tags.models)
+def check_embedding_dimensions(app_configs, **kwargs):
+    """Report vector columns whose width is not ``EMBEDDING_DIMENSIONS``, the width every backend returns."""
+    columns = [
+        apps.get_model("openai_app", "TranslationEmbedding")._meta.get_field("embedding"),
+        apps.get_model("project", "TranslationSegment")._meta.get_field("embedding"),
+    ]
+    return [
+        checks.Error(
+            f"EMBEDDING_DIMENSIONS is {settings.EMBEDDING_DIMENSIONS}, but {column.model.__name__}.{column.name} "
+            f"stores {column.dimensions} dimensions.",
+            hint="Set EMBEDDING_DIMENSIONS to the column width, or migrate the vector columns to the new width.",
+            obj=column,
+            id="openai_app.E001",
+        )
+        for column in columns
+        if column.dimensions != settings.EMBEDDING_DIMENSIONS
+    ]
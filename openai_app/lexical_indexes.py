@@ -0,0 +1,40 @@
+"""Lexical search indexes: pg_trgm trigrams and full-text tsvectors over a text column.
+
+Queries must repeat the indexed expression for PostgreSQL to use the index, so both the
+migrations and the search SQL build it with ``tsvector_sql``.
+"""
+
+TEXT_SEARCH_CONFIG = "simple"  # No stemming or stop words, so product codes and terms match whole
+
+
+def tsvector_sql(column):
+    """Return the SQL of the full-text vector indexed for ``column``."""
+    return f"to_tsvector('{TEXT_SEARCH_CONFIG}', {column})"
+
+
+def tsquery_sql(param):
+    """Return the SQL of a full-text query of the words of the text in ``param``."""
+    return f"plainto_tsquery('{TEXT_SEARCH_CONFIG}', {param})"
+
+
+def index_names(prefix):
+    """Return the names of the trigram and full-text indexes with ``prefix``."""
+    return f"{prefix}_trgm", f"{prefix}_tsv"
+
+
+def create_lexical_indexes(schema_editor, table, column, prefix):
+    """Create GIN trigram and full-text indexes on ``table.column``; needs the pg_trgm extension."""
+    quote = schema_editor.quote_name
+    trigram, full_text = index_names(prefix)
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {quote(trigram)} ON {quote(table)} USING gin ({quote(column)} gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {quote(full_text)} ON {quote(table)} USING gin (({tsvector_sql(quote(column))}))"
+    )
+
+
+def drop_lexical_indexes(schema_editor, prefix):
+    """Drop the indexes ``create_lexical_indexes`` made with ``prefix``."""
+    for name in index_names(prefix):
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
@@ -0,0 +1,61 @@
+"""Rebuild the TranslationEmbedding ANN indexes with new parameters."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from openai_app.models import TranslationEmbedding
+from openai_app.vector_indexes import (
+    HNSW_INDEX_NAME,
+    IVFFLAT_INDEX_NAME,
+    QUANTIZED_INDEX_NAMES,
+    hnsw_index,
+    ivfflat_index,
+    quantized_index
+)
+
+
+class Command(BaseCommand):
+    """Build each index concurrently under a temporary name, then swap it in, so searches keep an index throughout."""
+
+    help = 'Rebuild the TranslationEmbedding HNSW, IVFFlat and quantized indexes without blocking writes.'
+
+    def add_arguments(self, parser):
+        """Add index parameters; anything not given comes from the VECTOR_INDEX_* settings."""
+        parser.add_argument('--m', type=int)
+        parser.add_argument('--ef-construction', type=int)
+        parser.add_argument('--lists', type=int, help='IVFFlat lists; 0 drops the IVFFlat index.')
+        parser.add_argument('--quantization', nargs='*', choices=list(QUANTIZED_INDEX_NAMES),
+                            help='Quantized HNSW indexes to build; those not listed are dropped.')
+        parser.add_argument('--maintenance-work-mem', default='1GB',
+                            help='Memory for the build; HNSW builds are much faster when the graph fits.')
+
+    def handle(self, *args, **options):
+        """Rebuild the indexes."""
+        if connection.vendor != 'postgresql':
+            raise CommandError('pgvector indexes need PostgreSQL.')
+        indexes = {HNSW_INDEX_NAME: hnsw_index(options['m'], options['ef_construction'], name=f'{HNSW_INDEX_NAME}_new')}
+        lists = options['lists']
+        if lists != 0:
+            index = ivfflat_index(lists, name=f'{IVFFLAT_INDEX_NAME}_new')
+            if index.lists:
+                indexes[IVFFLAT_INDEX_NAME] = index
+        quantization = options['quantization']
+        for mode in settings.VECTOR_INDEX_QUANTIZATION if quantization is None else quantization:
+            name = QUANTIZED_INDEX_NAMES[mode]
+            indexes[name] = quantized_index(mode, options['m'], options['ef_construction'], name=f'{name}_new')
+
+        with connection.schema_editor(atomic=False) as schema_editor:  # CONCURRENTLY cannot run in a transaction
+            quote = schema_editor.quote_name
+            schema_editor.execute("SELECT set_config('maintenance_work_mem', %s, false)",
+                                  [options['maintenance_work_mem']])
+            for name in (IVFFLAT_INDEX_NAME, *QUANTIZED_INDEX_NAMES.values()):
+                if name not in indexes:
+                    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {quote(name)}')
+            for name, index in indexes.items():
+                schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {quote(index.name)}')  # From a failed run
+                self.stdout.write(f'Building {name} with {", ".join(index.get_with_params())}...')
+                schema_editor.execute(index.create_sql(TranslationEmbedding, schema_editor, concurrently=True))
+                schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {quote(name)}')
+                schema_editor.execute(f'ALTER INDEX {quote(index.name)} RENAME TO {quote(name)}')
+        self.stdout.write(self.style.SUCCESS('Vector indexes rebuilt.'))
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+from openai_app.vector_indexes import HNSW_INDEX_NAME, IVFFLAT_INDEX_NAME, configured_indexes
+
+
+def create_indexes(apps, schema_editor):
+    """Build the ANN indexes the settings ask for; pgvector indexes only exist on PostgreSQL."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    model = apps.get_model("openai_app", "TranslationEmbedding")
+    for index in configured_indexes():
+        schema_editor.add_index(model, index)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in (HNSW_INDEX_NAME, IVFFLAT_INDEX_NAME):
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openai_app', '0002_embedding_cache'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
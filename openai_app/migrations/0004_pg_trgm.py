@@ -0,0 +1,13 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openai_app', '0003_translation_embedding_ann_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),  # similarity() for translation-memory fuzzy scores; skipped off PostgreSQL
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+from openai_app.vector_indexes import QUANTIZED_INDEX_NAMES, configured_quantizations, quantized_index
+
+
+def create_indexes(apps, schema_editor):
+    """Build the quantized HNSW indexes listed in VECTOR_INDEX_QUANTIZATION; PostgreSQL only."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    model = apps.get_model("openai_app", "TranslationEmbedding")
+    for mode in configured_quantizations():
+        schema_editor.add_index(model, quantized_index(mode))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in QUANTIZED_INDEX_NAMES.values():
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openai_app', '0004_pg_trgm'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+from openai_app.lexical_indexes import create_lexical_indexes, drop_lexical_indexes
+
+PREFIX = "translation_embedding_source"
+
+
+def create_indexes(apps, schema_editor):
+    """Index source texts for trigram and full-text search; PostgreSQL only."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    model = apps.get_model("openai_app", "TranslationEmbedding")
+    create_lexical_indexes(schema_editor, model._meta.db_table, "source_text", PREFIX)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    drop_lexical_indexes(schema_editor, PREFIX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openai_app', '0005_translation_embedding_quantized_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -11,4 +11,22 @@ class TranslationEmbedding(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Translation: {self.source_text[:50]}..."
\ No newline at end of file
+        return f"Translation: {self.source_text[:50]}..."
+
+class EmbeddingCache(models.Model):
+    """An embedding vector keyed by the hash of its normalized text, the model and the dimensions."""
+
+    text_hash = models.CharField(max_length=64)  # SHA-256 of the normalized text
+    model = models.CharField(max_length=100)
+    dimensions = models.PositiveIntegerField()
+    embedding = VectorField()  # Any dimensions; rows are only compared within one model and size
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["text_hash", "model", "dimensions"], name="unique_embedding_cache_key"),
+        ]
+
+    def __str__(self):
+        """Return the model, dimensions and text hash."""
+        return f"{self.model}/{self.dimensions}: {self.text_hash}"
@@ -1,18 +1,56 @@
+import asyncio
+import threading
+import weakref
 
 from django.conf import settings
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from .rate_limit import AsyncRateLimitedClient, RateLimitedClient, get_rate_limiter
 
 
 class OpenAIClient:
     """Singleton class to manage OpenAI client"""
 
     _client = None  # Cache instance
+    _async_clients = weakref.WeakKeyDictionary()  # Event loop -> AsyncOpenAI
+    _async_clients_lock = threading.Lock()
 
     @classmethod
     def get_client(cls):
-        """Returns a singleton instance of OpenAI client."""
+        """Returns the singleton OpenAI client, paced and retried by the shared rate limiter."""
         if cls._client is None:
             if not settings.OPENAI_API_KEY:
                 raise ValueError("OpenAI API key is missing. Check environment variables.")
-            cls._client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        return cls._client
+            # RateLimitedClient owns retries so backoff is coordinated with the limiter
+            cls._client = OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0)
+        return RateLimitedClient(
+            cls._client,
+            get_rate_limiter(),
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            base_delay=settings.OPENAI_RETRY_BASE_DELAY,
+            max_delay=settings.OPENAI_RETRY_MAX_DELAY,
+        )
+
+    @classmethod
+    def get_async_client(cls):
+        """Returns the running event loop's AsyncOpenAI client, paced and retried by the shared rate limiter.
+
+        Must be called from a coroutine. Pooled connections belong to the loop that opened them,
+        so there is one client per loop: a single one for the lifetime of an ASGI worker.
+        """
+        loop = asyncio.get_running_loop()
+        with cls._async_clients_lock:
+            if loop not in cls._async_clients:
+                if not settings.OPENAI_API_KEY:
+                    raise ValueError("OpenAI API key is missing. Check environment variables.")
+                cls._async_clients[loop] = AsyncOpenAI(
+                    api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0
+                )
+            client = cls._async_clients[loop]
+        return AsyncRateLimitedClient(
+            client,
+            get_rate_limiter(),
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            base_delay=settings.OPENAI_RETRY_BASE_DELAY,
+            max_delay=settings.OPENAI_RETRY_MAX_DELAY,
+        )
@@ -0,0 +1,181 @@
+"""Embedding backends: where ``EmbeddingService`` gets vectors for a batch of texts.
+
+``EMBEDDING_BACKEND`` is the dotted path of the class to use. Besides the OpenAI API there
+are two offline backends, for CI, load tests and machines without network access: feature
+hashing, which needs nothing but NumPy, and a static word-embedding model read from disk.
+"""
+
+import base64
+import hashlib
+import re
+import threading
+from array import array
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from core import metrics
+
+from .client import OpenAIClient
+from .response_cache import request_key
+from .single_flight import get_single_flight
+
+WORD = re.compile(r"[^\W_]+")
+
+
+class EmbeddingBackend:
+    """Turn batches of texts into float32 vectors of ``dimensions`` values.
+
+    ``model`` names the vectors in the embedding cache, so two backends must only share a
+    name if they return the same vectors.
+    """
+
+    model = None
+
+    def __init__(self):
+        """Produce vectors as wide as ``EMBEDDING_DIMENSIONS``, the width of the vector columns."""
+        self.dimensions = settings.EMBEDDING_DIMENSIONS
+
+    def embed_batch(self, texts):
+        """Return one ``array("f")`` vector per text, in input order."""
+        raise NotImplementedError
+
+
+class OpenAIBackend(EmbeddingBackend):
+    """Embeddings from the OpenAI API through the shared, rate-limited client."""
+
+    def __init__(self, model=None):
+        """Use ``model``, or ``OPENAI_EMBEDDING_MODEL``."""
+        super().__init__()
+        self.model = model or settings.OPENAI_EMBEDDING_MODEL
+
+    def embed_batch(self, texts):
+        """Embed one batch with a single API call, shared by identical batches requested meanwhile.
+
+        Vectors are fetched base64 encoded and kept as float32 arrays, a sixth of the memory
+        of the SDK's lists of floats. They are asked for ``dimensions`` wide, which needs a
+        model that can shorten its embeddings, such as the text-embedding-3 models.
+        """
+        return get_single_flight().do(
+            f"embeddings:{request_key(self.model, texts, {'dimensions': self.dimensions})}",
+            lambda: self._create(texts),
+            dumps=lambda vectors: b"".join(vector.tobytes() for vector in vectors),
+            loads=lambda data: split_vectors(data, len(texts)),
+        )
+
+    def _create(self, texts):
+        """Call the embeddings API for a batch."""
+        response = OpenAIClient.get_client().embeddings.create(
+            model=self.model, input=texts, dimensions=self.dimensions, encoding_format="base64"
+        )
+        metrics.increment("embedding.api_calls")
+        data = sorted(response.data, key=lambda item: item.index)
+        return [array("f", base64.b64decode(item.embedding)) for item in data]
+
+
+def split_vectors(data, count):
+    """Return ``count`` float32 arrays of equal width from their concatenated bytes."""
+    if not count:
+        return []
+    width = len(data) // count
+    return [array("f", data[start:start + width]) for start in range(0, len(data), width)]
+
+
+@lru_cache(maxsize=2 ** 16)
+def feature_bucket(feature, dimensions):
+    """Return the (index, sign) a feature hashes to; stable across processes, unlike ``hash()``."""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+    return digest % dimensions, 1.0 if digest >> 63 else -1.0
+
+
+def text_features(text):
+    """Return the lowercase words of ``text`` and the character trigrams of each, padded like pg_trgm's."""
+    features = []
+    for word in WORD.findall(text.lower()):
+        padded = f"  {word} "
+        features.append(word)
+        features.extend(padded[index:index + 3] for index in range(len(padded) - 2))
+    return features or [text]
+
+
+class HashingBackend(EmbeddingBackend):
+    """Deterministic vectors from hashed word and character-trigram counts.
+
+    Texts sharing words or spellings get similar vectors, so search and ranking behave
+    plausibly, but there is no notion of meaning. Fast and offline; for tests and benchmarks.
+    """
+
+    model = "feature-hashing-v1"
+
+    def embed_batch(self, texts):
+        """Return the L2-normalized hashed feature vector of each text."""
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in text_features(text):
+                index, sign = feature_bucket(feature, self.dimensions)
+                vectors[row, index] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        return [array("f", vector.tobytes()) for vector in vectors]
+
+
+class LocalModelBackend(EmbeddingBackend):
+    """A static word-embedding model on disk, run on the CPU with NumPy.
+
+    The model directory holds ``vocab.txt``, one token per line, and ``embeddings.npy``, a
+    matrix with one row per token. A text's vector is the mean of its known words' rows,
+    zero padded to ``dimensions``; texts with no known word fall back to feature hashing so
+    they still get a usable vector. Give every model its own directory: the directory name
+    identifies its vectors in the embedding cache.
+    """
+
+    def __init__(self, path=None):
+        """Load the model in ``path``, or ``EMBEDDING_LOCAL_MODEL_PATH``."""
+        super().__init__()
+        path = Path(path or settings.EMBEDDING_LOCAL_MODEL_PATH)
+        if not (path / "vocab.txt").is_file() or not (path / "embeddings.npy").is_file():
+            raise ImproperlyConfigured(f"No vocab.txt and embeddings.npy in local embedding model path '{path}'.")
+        self.model = f"local:{path.resolve().name}"
+        self.matrix = np.load(path / "embeddings.npy", mmap_mode="r")
+        if self.matrix.shape[1] > self.dimensions:
+            raise ImproperlyConfigured(
+                f"Local embedding model has {self.matrix.shape[1]} dimensions, more than the {self.dimensions} stored."
+            )
+        with open(path / "vocab.txt", encoding="utf-8") as vocab:
+            self.vocab = {token.rstrip("\n"): row for row, token in enumerate(vocab)}
+        self.fallback = HashingBackend()
+
+    def embed_batch(self, texts):
+        """Return the L2-normalized mean word vector of each text."""
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        width = self.matrix.shape[1]
+        unknown = []
+        for row, text in enumerate(texts):
+            rows = [self.vocab[word] for word in WORD.findall(text.lower()) if word in self.vocab]
+            if rows:
+                vectors[row, :width] = self.matrix[sorted(rows)].mean(axis=0)
+            else:
+                unknown.append(row)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        results = [array("f", vector.tobytes()) for vector in vectors]
+        for row, vector in zip(unknown, self.fallback.embed_batch([texts[row] for row in unknown])):
+            results[row] = vector
+        return results
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_embedding_backend(path=None):
+    """Return this process's instance of the backend class at ``path``, or ``EMBEDDING_BACKEND``."""
+    path = path or settings.EMBEDDING_BACKEND
+    with _backends_lock:
+        if path not in _backends:
+            _backends[path] = import_string(path)()
+        return _backends[path]
@@ -0,0 +1,126 @@
+"""Cache of embedding vectors keyed by normalized text, model and dimensions."""
+
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+
+from core import metrics
+from openai_app.models import EmbeddingCache as EmbeddingCacheEntry
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Return ``text`` in NFC with runs of whitespace collapsed and the ends stripped; blank text is kept as is."""
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip() or text
+
+
+def text_key(text):
+    """Return the cache key of a normalized text: its SHA-256 hex digest."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """Look vectors up in a process-local LRU, then in the ``EmbeddingCache`` table, in bulk.
+
+    One cache exists per (model, dimensions) pair; the table is shared by every process, the
+    LRU of ``lru_size`` vectors only by the threads of one.
+    """
+
+    def __init__(self, model, dimensions, lru_size=0):
+        """Cache vectors of ``model`` with ``dimensions``, keeping up to ``lru_size`` in memory."""
+        self.model = model
+        self.dimensions = dimensions
+        self.lru_size = lru_size
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        """Return {key: vector} for the cached ``keys``, with a single database query for LRU misses."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+        metrics.increment("embedding_cache.lru_hits", len(found))
+        missing = [key for key in keys if key not in found]
+        if missing:
+            stored = self._select(missing)
+            self._remember(stored)
+            found.update(stored)
+        hits = len(found)
+        metrics.increment("embedding_cache.hits", hits)
+        metrics.increment("embedding_cache.misses", len(keys) - hits)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def set_many(self, vectors):
+        """Store {key: vector} in the table and the LRU; keys another process stored first are kept."""
+        if not vectors:
+            return
+        EmbeddingCacheEntry.objects.bulk_create(
+            [
+                EmbeddingCacheEntry(text_hash=key, model=self.model, dimensions=self.dimensions, embedding=vector)
+                for key, vector in vectors.items()
+            ],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+        self._remember(vectors)
+
+    def hit_rate(self):
+        """Return the fraction of lookups answered from the cache so far."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _select(self, keys):
+        """Return {key: vector} for ``keys`` found in the table."""
+        if connection.vendor == "postgresql":
+            entries = EmbeddingCacheEntry.objects.raw(
+                f"SELECT id, text_hash, embedding FROM {EmbeddingCacheEntry._meta.db_table} "
+                "WHERE text_hash = ANY(%s) AND model = %s AND dimensions = %s",
+                [list(keys), self.model, self.dimensions],
+            )
+        else:
+            entries = EmbeddingCacheEntry.objects.filter(
+                text_hash__in=keys, model=self.model, dimensions=self.dimensions
+            ).only("text_hash", "embedding")
+        return {entry.text_hash: entry.embedding for entry in entries}
+
+    def _remember(self, vectors):
+        """Put vectors in the LRU, dropping the least recently used past ``lru_size``."""
+        if not self.lru_size:
+            return
+        with self._lock:
+            for key, vector in vectors.items():
+                self._lru[key] = vector
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model, dimensions):
+    """Return this process's cache for a model and dimensions, or None when ``EMBEDDING_CACHE_ENABLED`` is off."""
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    with _caches_lock:
+        if (model, dimensions) not in _caches:
+            _caches[model, dimensions] = EmbeddingCache(model, dimensions, settings.EMBEDDING_CACHE_LRU_SIZE)
+            metrics.register_gauge(
+                f"embedding_cache.hit_rate.{model}.{dimensions}", _caches[model, dimensions].hit_rate
+            )
+        return _caches[model, dimensions]
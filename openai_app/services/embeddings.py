@@ -0,0 +1,95 @@
+"""Batched, cached text embeddings from the configured embedding backend."""
+
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+
+from core import metrics
+
+from .embedding_backends import get_embedding_backend
+from .embedding_cache import get_embedding_cache, normalize_text, text_key
+
+
+def estimate_text_tokens(text):
+    """Return a conservative token count for ``text``: one per 3 UTF-8 bytes, so one per CJK character."""
+    return max(1, math.ceil(len(text.encode()) / 3))
+
+
+class EmbeddingService:
+    """Embed any number of texts with few, large API calls.
+
+    Texts are normalized and looked up in the embedding cache a window at a time; only the
+    distinct misses are packed in order into batches bounded by an estimated token total and
+    an input count, and up to ``max_concurrency`` batches are requested at once. Results come
+    back in input order, one vector per text.
+    """
+
+    def __init__(self, backend=None, max_batch_tokens=None, max_batch_inputs=None, max_concurrency=None,
+                 cache=True):
+        """Use the embedding settings for anything not given; ``cache=False`` always calls the backend."""
+        self.backend = backend or get_embedding_backend()
+        self.model = self.backend.model
+        self.dimensions = self.backend.dimensions
+        self.max_batch_tokens = max_batch_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+        self.max_batch_inputs = max_batch_inputs or settings.EMBEDDING_BATCH_MAX_INPUTS
+        self.max_concurrency = max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY
+        self.cache = get_embedding_cache(self.model, self.dimensions) if cache else None
+
+    def batches(self, texts):
+        """Yield lists of consecutive texts that fit one request's token and input limits."""
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = estimate_text_tokens(text)
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or len(batch) >= self.max_batch_inputs):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def embed_batch(self, texts):
+        """Embed one batch with a single backend call and return its float32 vectors in input order."""
+        return self.backend.embed_batch(texts)
+
+    def embed_uncached(self, texts):
+        """Yield one vector per text, in order, keeping at most ``max_concurrency`` calls in flight."""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            pending = deque()
+            for batch in self.batches(texts):
+                pending.append(pool.submit(self.embed_batch, batch))
+                if len(pending) >= self.max_concurrency:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def embed(self, texts):
+        """Yield one float32 vector per text of an iterable, in order.
+
+        ``texts`` is read lazily, one window of ``max_batch_inputs * max_concurrency`` texts
+        at a time, so very long inputs such as a database cursor stay out of memory. Each
+        window costs one cache query; its misses are embedded once however often they repeat.
+        """
+        texts = iter(texts)
+        window_size = self.max_batch_inputs * self.max_concurrency
+        while window := [normalize_text(text) for text in islice(texts, window_size)]:
+            if self.cache is None:
+                yield from self.embed_uncached(window)
+                continue
+            keys = [text_key(text) for text in window]
+            vectors = self.cache.get_many(list(dict.fromkeys(keys)))
+            misses = {key: text for key, text in zip(keys, window) if key not in vectors}
+            calls_saved = sum(1 for _ in self.batches(window)) - sum(1 for _ in self.batches(misses.values()))
+            metrics.increment("embedding_cache.api_calls_saved", calls_saved)
+            computed = dict(zip(misses, self.embed_uncached(misses.values())))
+            self.cache.set_many(computed)
+            vectors.update(computed)
+            for key in keys:
+                yield vectors[key]
+
+    def embed_one(self, text):
+        """Return the vector of a single text."""
+        return next(self.embed([text]))
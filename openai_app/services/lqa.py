@@ -0,0 +1,267 @@
+"""Batched LQA: review many translation segments per structured-output chat request."""
+
+import json
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+
+from django.conf import settings
+
+from core import metrics
+
+from .embeddings import estimate_text_tokens
+from .services import OpenAIService
+
+logger = logging.getLogger(__name__)
+
+LQA_SYSTEM_PROMPT = """You are a senior translation quality reviewer performing linguistic quality assurance (LQA).
+You receive a JSON object with a "segments" list; each segment has an "id", a "source" text and its
+translation, "target". Review every segment independently and return exactly one result per segment,
+with the same "id".
+
+For each segment report every issue you find, each with:
+- "category": one of "accuracy" (mistranslation, added or missing meaning, wrong numbers, names or units),
+  "omission" (untranslated or missing text), "terminology" (inconsistent or incorrect terms), "fluency"
+  (grammar, spelling, punctuation, unnatural phrasing), "style" (register, tone, locale conventions) or
+  "markup" (broken or missing placeholders and tags);
+- "severity": "minor" (does not change meaning), "major" (changes or obscures meaning) or "critical"
+  (misleading, offensive, or blocks use of the product);
+- "description": one short sentence naming the problem and the fix.
+
+Give each segment a "score" from 0 to 100: 100 when there are no issues, minus 5 per minor, 25 per major
+and 50 per critical issue, never below 0. Do not report preferential changes. Do not translate or
+rewrite segments; only assess them."""
+
+CATEGORIES = ["accuracy", "omission", "terminology", "fluency", "style", "markup"]
+SEVERITIES = ["minor", "major", "critical"]
+LQA_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "lqa_report",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "score": {"type": "integer"},
+                            "issues": {
+                                "type": "array",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "category": {"type": "string", "enum": CATEGORIES},
+                                        "severity": {"type": "string", "enum": SEVERITIES},
+                                        "description": {"type": "string"},
+                                    },
+                                    "required": ["category", "severity", "description"],
+                                    "additionalProperties": False,
+                                },
+                            },
+                        },
+                        "required": ["id", "score", "issues"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        },
+    },
+}
+RESULT_TOKENS_PER_SEGMENT = 60  # Completion tokens reserved per segment: its id, score and a couple of issues
+
+
+class LQAUnavailable(Exception):
+    """Raised when a review request got no reply at all, as on an outage or a rejected API key."""
+
+
+@dataclass(frozen=True, slots=True)
+class LQASegment:
+    """A segment to review."""
+
+    id: str
+    source: str
+    target: str
+
+    def as_dict(self):
+        """Return the segment as it is sent to the model."""
+        return {"id": self.id, "source": self.source, "target": self.target}
+
+
+@dataclass(slots=True)
+class LQAResult:
+    """The review of one segment; ``error`` is set instead of a score if no valid review came back."""
+
+    id: str
+    score: int | None = None
+    issues: list = field(default_factory=list)
+    error: str | None = None
+
+    def as_dict(self):
+        """Return the result as a dictionary."""
+        return asdict(self)
+
+
+@dataclass(slots=True)
+class LQAStats:
+    """What a review run cost."""
+
+    segments: int = 0
+    requests: int = 0
+    resplits: int = 0
+    failed: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def as_dict(self):
+        """Return the totals as a dictionary."""
+        return asdict(self)
+
+
+def segment_tokens(segment):
+    """Return the estimated prompt tokens of a segment, as serialized, plus those reserved for its result."""
+    return estimate_text_tokens(json.dumps(segment.as_dict(), ensure_ascii=False)) + RESULT_TOKENS_PER_SEGMENT
+
+
+def parse_results(reply, batch):
+    """Return {id: LQAResult} for the valid results of a batch in a model reply; anything malformed is left out."""
+    try:
+        items = json.loads(reply)["results"]
+    except (TypeError, ValueError, KeyError):
+        return {}
+    ids = {segment.id for segment in batch}
+    results = {}
+    for item in items if isinstance(items, list) else ():
+        try:
+            issues = [
+                {"category": issue["category"], "severity": issue["severity"], "description": issue["description"]}
+                for issue in item["issues"]
+                if issue["category"] in CATEGORIES and issue["severity"] in SEVERITIES
+            ]
+            if item["id"] in ids and isinstance(item["score"], int):
+                results[item["id"]] = LQAResult(item["id"], max(0, min(100, item["score"])), issues)
+        except (TypeError, KeyError):
+            continue
+    return results
+
+
+class LQABatchEngine:
+    """Review segments with as few chat requests as the token budget allows.
+
+    Segments are packed in order into batches whose system prompt, serialized segments and
+    reserved result tokens fit ``token_budget``, at most ``max_segments`` to a batch, and up
+    to ``max_concurrency`` batches are requested at once with a strict JSON schema. Segments
+    whose result is missing or malformed are sent again, split in halves, so one bad item
+    does not cost the rest of its batch; a lone segment is retried up to ``max_attempts``
+    times before it is reported with an error. A request that gets no reply at all aborts the
+    run with ``LQAUnavailable`` instead, since splitting cannot help it. ``stats`` totals the
+    last run.
+    """
+
+    def __init__(self, token_budget=None, max_segments=None, max_concurrency=None, max_attempts=None):
+        """Use the LQA settings for anything not given."""
+        self.token_budget = token_budget or settings.LQA_BATCH_TOKEN_BUDGET
+        self.max_segments = max_segments or settings.LQA_BATCH_MAX_SEGMENTS
+        self.max_concurrency = max_concurrency or settings.LQA_MAX_CONCURRENCY
+        self.max_attempts = max_attempts or settings.LQA_MAX_ATTEMPTS
+        self.stats = LQAStats()
+        self._lock = threading.Lock()  # Batches are reviewed on several threads at once
+        self._unavailable = threading.Event()  # Set once a request of the current run got no reply
+
+    def batches(self, segments):
+        """Yield lists of consecutive segments that fit one request's token budget and segment count."""
+        budget = self.token_budget - estimate_text_tokens(LQA_SYSTEM_PROMPT)
+        batch, batch_tokens = [], 0
+        for segment in segments:
+            tokens = segment_tokens(segment)
+            if batch and (batch_tokens + tokens > budget or len(batch) >= self.max_segments):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(segment)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def review_batch(self, batch, cache=True):
+        """Review a batch with one chat request and return {id: LQAResult} for the segments that came back valid.
+
+        Raises ``LQAUnavailable`` when the request fails without a reply, or when another request
+        of the run already has. Only replies with a valid result for every segment are cached.
+        Retries pass ``cache=False``: an identical earlier request came back incomplete, so it
+        must reach the model again.
+        """
+        if self._unavailable.is_set():
+            raise LQAUnavailable("An earlier LQA review request got no reply")
+        service = OpenAIService()
+        messages = [
+            {"role": "system", "content": LQA_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps({"segments": [segment.as_dict() for segment in batch]},
+                                                   ensure_ascii=False)},
+        ]
+        reply = service.generate_response(
+            messages, cache=cache, model=settings.LQA_MODEL, response_format=LQA_RESPONSE_FORMAT, temperature=0,
+            cacheable=lambda reply: len(parse_results(reply, batch)) == len(batch),
+        )
+        with self._lock:
+            self.stats.requests += 1
+            if service.usage is not None:
+                self.stats.prompt_tokens += service.usage.prompt_tokens
+                self.stats.completion_tokens += service.usage.completion_tokens
+        if reply is None:
+            self._unavailable.set()
+            raise LQAUnavailable(f"No reply to the LQA review of {len(batch)} segments")
+        return parse_results(reply, batch)
+
+    def review(self, segments):
+        """Return one LQAResult per segment, in order.
+
+        Raises ``LQAUnavailable`` as soon as a request gets no reply; batches not yet sent are
+        dropped, so an outage costs no more than the ``max_concurrency`` requests already in flight.
+        """
+        segments = list(segments)
+        self.stats = LQAStats(segments=len(segments))
+        self._unavailable.clear()
+        results = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                pending = {pool.submit(self.review_batch, batch): (batch, 1) for batch in self.batches(segments)}
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch, attempt = pending.pop(future)
+                        try:
+                            found = future.result()
+                        except LQAUnavailable:
+                            pool.shutdown(cancel_futures=True)
+                            raise
+                        results.update(found)
+                        failed = [segment for segment in batch if segment.id not in found]
+                        for retry, retry_attempt in self.resplit(failed, attempt):
+                            pending[pool.submit(self.review_batch, retry, cache=False)] = (retry, retry_attempt)
+        finally:
+            metrics.increment("lqa.requests", self.stats.requests)
+        metrics.increment("lqa.segments", len(segments))
+        return [
+            results.get(segment.id) or LQAResult(segment.id, error="No valid review was returned.")
+            for segment in segments
+        ]
+
+    def resplit(self, failed, attempt):
+        """Return the (batch, attempt) pairs to send the failed segments of a batch in again."""
+        if not failed:
+            return []
+        if len(failed) > 1:
+            self.stats.resplits += 1
+            middle = len(failed) // 2
+            return [(failed[:middle], 1), (failed[middle:], 1)]
+        if attempt < self.max_attempts:
+            return [(failed, attempt + 1)]
+        logger.error(f"LQA review failed for segment {failed[0].id} after {attempt} attempts")
+        self.stats.failed += 1
+        return []
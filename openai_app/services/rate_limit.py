@@ -0,0 +1,325 @@
+"""Token-bucket pacing and rate-limit-aware retries shared by every OpenAI call."""
+
+import asyncio
+import email.utils
+import functools
+import inspect
+import logging
+import math
+import random
+import threading
+import time
+
+import openai
+import redis
+from django.conf import settings
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: 429s, 5xx responses, timeouts and dropped connections
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+# Refill every bucket in KEYS and take ARGV costs from all of them, or from none. Returns the
+# seconds to wait before the costs fit, as a string so Redis keeps the fraction.
+# ARGV: now, key ttl, then rate per second, capacity and cost for each key.
+RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local wait = 0
+local levels = {}
+for i = 1, #KEYS do
+    local rate, capacity, cost = tonumber(ARGV[i * 3]), tonumber(ARGV[i * 3 + 1]), tonumber(ARGV[i * 3 + 2])
+    local state = redis.call('HMGET', KEYS[i], 'level', 'updated')
+    local level = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    levels[i] = math.min(capacity, level + math.max(0, now - updated) * rate)
+    if levels[i] < cost then
+        wait = math.max(wait, (cost - levels[i]) / rate)
+    end
+end
+if wait == 0 then
+    for i = 1, #KEYS do
+        local level = levels[i] - tonumber(ARGV[i * 3 + 2])
+        redis.call('HMSET', KEYS[i], 'level', tostring(level), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[i], ARGV[2])
+    end
+end
+return tostring(wait)
+"""
+
+# Empty the bucket in KEYS[1] so it refills only after ARGV[3] seconds. ARGV: now, key ttl, pause, rate.
+PAUSE_SCRIPT = """
+local level = -tonumber(ARGV[3]) * tonumber(ARGV[4])
+local current = tonumber(redis.call('HGET', KEYS[1], 'level') or '0')
+if current > level then
+    redis.call('HMSET', KEYS[1], 'level', tostring(level), 'updated', ARGV[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 1
+"""
+
+
+class TokenBucketLimiter:
+    """Pace OpenAI calls to a requests-per-minute and a tokens-per-minute budget.
+
+    Each budget is a token bucket refilling at its per-minute rate and holding at most
+    ``burst_seconds`` worth of it. Buckets live in Redis when a client is given, so every
+    web and Celery worker process draws from the same budget; otherwise they are kept in
+    this process. A limit of 0 disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, redis_client=None, burst_seconds=10,
+                 key_prefix='openai:rate_limit'):
+        """Configure both budgets and where their state is kept."""
+        self.buckets = {
+            name: (limit / 60, max(1.0, limit / 60 * burst_seconds))
+            for name, limit in (('requests', requests_per_minute), ('tokens', tokens_per_minute))
+            if limit
+        }  # name -> (rate per second, capacity)
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self._levels = {}  # name -> (level, updated) when kept in process
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """Block until one request costing ``tokens`` fits both budgets; return the seconds waited."""
+        costs = {'requests': 1, 'tokens': tokens}
+        costs = {name: min(costs[name], capacity) for name, (_, capacity) in self.buckets.items()}
+        waited = 0.0
+        while costs:
+            wait = self._reserve(costs)
+            if wait <= 0:
+                break
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+    async def acquire_async(self, tokens=0):
+        """Like :meth:`acquire`, but wait without blocking the event loop."""
+        costs = {'requests': 1, 'tokens': tokens}
+        costs = {name: min(costs[name], capacity) for name, (_, capacity) in self.buckets.items()}
+        waited = 0.0
+        while costs:
+            if self.redis is not None:
+                wait = await asyncio.to_thread(self._reserve, costs)
+            else:
+                wait = self._reserve(costs)  # Only takes a lock held for microseconds
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+        return waited
+
+    def pause(self, seconds):
+        """Hold back every caller sharing these budgets for ``seconds``, e.g. after a 429."""
+        if 'requests' not in self.buckets or seconds <= 0:
+            return
+        rate = self.buckets['requests'][0]
+        if self.redis is not None:
+            self.redis.eval(PAUSE_SCRIPT, 1, self._key('requests'), time.time(), self._ttl(), seconds, rate)
+            return
+        with self._lock:
+            level, _ = self._levels.get('requests', (0.0, 0.0))
+            self._levels['requests'] = (min(level, -seconds * rate), time.monotonic())
+
+    def _key(self, name):
+        """Return the Redis key of a bucket."""
+        return f'{self.key_prefix}:{name}'
+
+    def _ttl(self):
+        """Return how long an untouched bucket is kept; by then it would be full anyway."""
+        return max(60, math.ceil(max(capacity / rate for rate, capacity in self.buckets.values())))
+
+    def _reserve(self, costs):
+        """Take ``costs`` from every bucket and return 0, or return the seconds until they fit."""
+        if self.redis is not None:
+            args = [time.time(), self._ttl()]
+            for name in costs:
+                args.extend(self.buckets[name] + (costs[name],))
+            keys = [self._key(name) for name in costs]
+            return float(self.redis.eval(RESERVE_SCRIPT, len(keys), *keys, *args))
+        with self._lock:
+            now = time.monotonic()
+            levels, wait = {}, 0.0
+            for name, cost in costs.items():
+                rate, capacity = self.buckets[name]
+                level, updated = self._levels.get(name, (capacity, now))
+                levels[name] = min(capacity, level + (now - updated) * rate)
+                if levels[name] < cost:
+                    wait = max(wait, (cost - levels[name]) / rate)
+            if not wait:
+                for name, cost in costs.items():
+                    self._levels[name] = (levels[name] - cost, now)
+            return wait
+
+
+def estimate_tokens(kwargs):
+    """Roughly estimate the tokens a call consumes: ~4 characters per prompt token plus the completion budget."""
+    characters = 0
+    for message in kwargs.get('messages') or ():
+        content = message.get('content') if isinstance(message, dict) else None
+        if isinstance(content, str):
+            characters += len(content)
+        elif isinstance(content, list):
+            characters += sum(len(part.get('text') or '') for part in content if isinstance(part, dict))
+    embedding_input = kwargs.get('input')
+    if isinstance(embedding_input, str):
+        characters += len(embedding_input)
+    elif isinstance(embedding_input, list):
+        characters += sum(len(item) for item in embedding_input if isinstance(item, str))
+    completion = kwargs.get('max_completion_tokens') or kwargs.get('max_tokens') or 0
+    return math.ceil(characters / 4) + completion
+
+
+def retry_after(error):
+    """Return the server's requested delay in seconds from ``retry-after-ms`` or ``Retry-After``, or None."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers['retry-after-ms']) / 1000
+    except (KeyError, ValueError):
+        pass
+    header = response.headers.get('retry-after')
+    if header is None:
+        return None
+    try:
+        return float(header)
+    except ValueError:
+        retry_date = email.utils.parsedate_tz(header)
+        return max(0.0, email.utils.mktime_tz(retry_date) - time.time()) if retry_date else None
+
+
+def backoff_delay(attempt, base_delay, max_delay, server_delay=None):
+    """Return a jittered exponential delay for ``attempt``, never shorter than the server asked for."""
+    ceiling = min(max_delay, base_delay * 2 ** attempt)
+    delay = random.uniform(ceiling / 2, ceiling)
+    if server_delay is not None:
+        delay = max(delay, server_delay + random.uniform(0, base_delay))  # Spread out the retrying callers
+    return delay
+
+
+def _rewindable_streams(args, kwargs):
+    """Return (stream, position) for file objects in a call so a retry can re-send them."""
+    candidates = list(args) + list(kwargs.values())
+    for value in list(candidates):
+        if isinstance(value, tuple):
+            candidates.extend(value)
+    return [(value, value.tell()) for value in candidates if hasattr(value, 'read') and hasattr(value, 'seek')]
+
+
+class RateLimitedClient:
+    """Proxy an OpenAI client so every API method call is paced and retried.
+
+    ``client.chat.completions.create(...)`` and friends work as on the SDK client; each call
+    first takes its estimated cost from the limiter, and 429s, 5xx responses and connection
+    errors are retried with jittered exponential backoff that honours ``Retry-After``.
+    """
+
+    def __init__(self, client, limiter, max_retries, base_delay, max_delay):
+        """Wrap ``client`` with a limiter and retry policy."""
+        self._client = client
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def __getattr__(self, name):
+        """Return SDK resources wrapped, so their methods are paced and retried."""
+        return _wrap(getattr(self._client, name), self)
+
+    def call(self, method, *args, **kwargs):
+        """Call an SDK method within the rate limits, retrying transient failures."""
+        tokens = estimate_tokens(kwargs)
+        streams = _rewindable_streams(args, kwargs)
+        attempt = 0
+        while True:
+            waited = self.limiter.acquire(tokens)
+            if waited:
+                metrics.increment('openai.throttled_ms', round(waited * 1000))
+            try:
+                return method(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                time.sleep(self.retry_delay(e, attempt))
+                for stream, position in streams:
+                    stream.seek(position)
+                attempt += 1
+
+    def retry_delay(self, error, attempt):
+        """Return how long to wait before retrying a failed call, or re-raise once retries are used up."""
+        if attempt >= self.max_retries:
+            raise error
+        server_delay = retry_after(error)
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay, server_delay)
+        if isinstance(error, openai.RateLimitError):
+            metrics.increment('openai.rate_limited')
+            self.limiter.pause(server_delay or delay)  # Slow down the other workers too
+        metrics.increment('openai.retries')
+        logger.warning(f"OpenAI call failed ({error.__class__.__name__}), retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+
+class AsyncRateLimitedClient(RateLimitedClient):
+    """Proxy an ``AsyncOpenAI`` client like :class:`RateLimitedClient`, waiting with ``asyncio.sleep``.
+
+    ``await client.chat.completions.create(...)`` holds no thread while it is paced, in
+    flight or backing off, so one event loop can keep hundreds of calls open.
+    """
+
+    async def call(self, method, *args, **kwargs):
+        """Await an SDK method within the rate limits, retrying transient failures."""
+        tokens = estimate_tokens(kwargs)
+        streams = _rewindable_streams(args, kwargs)
+        attempt = 0
+        while True:
+            waited = await self.limiter.acquire_async(tokens)
+            if waited:
+                metrics.increment('openai.throttled_ms', round(waited * 1000))
+            try:
+                result = method(*args, **kwargs)
+                return await result if inspect.isawaitable(result) else result
+            except RETRYABLE_ERRORS as e:
+                await asyncio.sleep(self.retry_delay(e, attempt))
+                for stream, position in streams:
+                    stream.seek(position)
+                attempt += 1
+
+
+class _RateLimitedResource:
+    """Wrap an SDK resource, routing its method calls through :meth:`RateLimitedClient.call`."""
+
+    def __init__(self, resource, client):
+        """Remember the wrapped resource and the client that paces it."""
+        self._resource = resource
+        self._rate_limited_client = client
+
+    def __getattr__(self, name):
+        """Return nested resources and methods wrapped."""
+        return _wrap(getattr(self._resource, name), self._rate_limited_client)
+
+
+def _wrap(attribute, client):
+    """Wrap SDK methods and resources so calls go through ``client``; return anything else unchanged."""
+    if inspect.ismethod(attribute):
+        return functools.partial(client.call, attribute)
+    if hasattr(attribute, 'with_raw_response'):  # An SDK resource such as ``chat`` or ``vector_stores``
+        return _RateLimitedResource(attribute, client)
+    return attribute
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return the limiter shared by this process, backed by Redis when ``REDIS_URL`` is set."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = TokenBucketLimiter(
+                requests_per_minute=settings.OPENAI_REQUESTS_PER_MINUTE,
+                tokens_per_minute=settings.OPENAI_TOKENS_PER_MINUTE,
+                redis_client=redis.Redis.from_url(settings.REDIS_URL) if settings.REDIS_URL else None,
+            )
+        return _limiter
@@ -0,0 +1,136 @@
+"""Cache of chat completion replies keyed by a canonical hash of model, messages and parameters."""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from django.conf import settings
+
+from core import metrics
+
+# KEYS[1] is a reply, KEYS[2] the sorted set of cached keys scored by last use. A hit marks the
+# key used; a miss forgets a key whose reply expired.
+FETCH_SCRIPT = """
+local reply = redis.call('GET', KEYS[1])
+if reply then
+    redis.call('ZADD', KEYS[2], 'XX', ARGV[1], KEYS[1])
+else
+    redis.call('ZREM', KEYS[2], KEYS[1])
+end
+return reply
+"""
+
+# Store a reply for ARGV[2] seconds, then evict the least recently used replies beyond ARGV[4].
+# Returns the number evicted.
+STORE_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], KEYS[1])
+local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[4])
+if excess <= 0 then
+    return 0
+end
+local evicted = redis.call('ZPOPMIN', KEYS[2], excess)
+for i = 1, #evicted, 2 do
+    redis.call('DEL', evicted[i])
+end
+return excess
+"""
+
+
+def request_key(model, messages, params):
+    """Return the SHA-256 hex digest of a chat request as canonical JSON: sorted keys, no spacing."""
+    request = {"model": model, "messages": messages, "params": params}
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Keep chat replies for ``ttl`` seconds, evicting the least recently used beyond ``max_entries``.
+
+    Replies live in Redis when a client is given, so every web and Celery worker process
+    shares them; otherwise they are kept in this process.
+    """
+
+    def __init__(self, ttl, max_entries, redis_client=None, key_prefix='openai:chat_cache'):
+        """Configure expiry, the size bound and where replies are kept."""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self._replies = OrderedDict()  # key -> (reply, expires) when kept in process
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached reply for a request key, or None."""
+        if self.redis is not None:
+            reply = self.redis.eval(FETCH_SCRIPT, 2, self._key(key), self._index_key(), time.time())
+            reply = reply.decode() if reply is not None else None
+        else:
+            with self._lock:
+                reply, expires = self._replies.get(key, (None, 0))
+                if expires > time.monotonic():
+                    self._replies.move_to_end(key)
+                else:
+                    self._replies.pop(key, None)
+                    reply = None
+        metrics.increment('openai.chat_cache.hits' if reply is not None else 'openai.chat_cache.misses')
+        return reply
+
+    def set(self, key, reply):
+        """Cache ``reply`` for a request key."""
+        if self.redis is not None:
+            evicted = self.redis.eval(
+                STORE_SCRIPT, 2, self._key(key), self._index_key(), reply, self.ttl, time.time(), self.max_entries
+            )
+        else:
+            with self._lock:
+                self._replies[key] = (reply, time.monotonic() + self.ttl)
+                self._replies.move_to_end(key)
+                evicted = max(0, len(self._replies) - self.max_entries)
+                for _ in range(evicted):
+                    self._replies.popitem(last=False)
+        if evicted:
+            metrics.increment('openai.chat_cache.evictions', evicted)
+
+    async def aget(self, key):
+        """Like :meth:`get`, without blocking the event loop on Redis."""
+        if self.redis is not None:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)  # Only takes a lock held for microseconds
+
+    async def aset(self, key, reply):
+        """Like :meth:`set`, without blocking the event loop on Redis."""
+        if self.redis is not None:
+            return await asyncio.to_thread(self.set, key, reply)
+        return self.set(key, reply)
+
+    def _key(self, key):
+        """Return the Redis key of a reply."""
+        return f'{self.key_prefix}:{key}'
+
+    def _index_key(self):
+        """Return the Redis key of the recency index."""
+        return f'{self.key_prefix}:index'
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the reply cache shared by this process, backed by Redis when ``REDIS_URL`` is set; None if disabled."""
+    global _cache
+    if not settings.CHAT_CACHE_TTL or not settings.CHAT_CACHE_MAX_ENTRIES:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                ttl=settings.CHAT_CACHE_TTL,
+                max_entries=settings.CHAT_CACHE_MAX_ENTRIES,
+                redis_client=redis.Redis.from_url(settings.REDIS_URL) if settings.REDIS_URL else None,
+            )
+        return _cache
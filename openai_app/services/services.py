@@ -1,41 +1,253 @@
+import asyncio
 import logging
+import os
+import time
+
+from django.conf import settings
+
+from core import metrics
+
 from .client import OpenAIClient
+from .response_cache import get_response_cache, request_key
+from .single_flight import get_single_flight
 
 logger = logging.getLogger(__name__)
 
+CHAT_MODEL = "gpt-4-turbo"
+FILE_BATCH_MAX_FILES = 500  # Largest file_ids list accepted by one vector store file batch
+
+
+def cache_status(response_cache, cache):
+    """Return how a reply will be looked up: "miss" until a hit is found, "bypass", or None without a cache."""
+    if response_cache is None:
+        return None
+    if not cache:
+        metrics.increment("openai.chat_cache.bypassed")
+        return "bypass"
+    return "miss"
+
+
+def stream_text(stream):
+    """Yield the text of each chunk of a streamed chat completion as it arrives.
+
+    The stream is closed however the generator ends. Closing the generator early, as a
+    server does when its client disconnects, drops the connection to OpenAI, which stops
+    generating (and billing) the rest of the completion.
+    """
+    completed = False
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        completed = True
+    finally:
+        stream.close()
+        metrics.increment("openai.chat_streams.completed" if completed else "openai.chat_streams.abandoned")
+
+
+async def astream_text(stream):
+    """Like ``stream_text``, for an ``AsyncOpenAI`` stream."""
+    completed = False
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        completed = True
+    finally:
+        await stream.close()
+        metrics.increment("openai.chat_streams.completed" if completed else "openai.chat_streams.abandoned")
+
+
 class OpenAIService:
     """Service class for handling OpenAI API calls"""
 
     def __init__(self):
         self.client = OpenAIClient.get_client()  # Get the singleton client
+        self.cache_status = None  # How the last generate_response reply was obtained
+        self.usage = None  # Tokens of the last completion this service made; None when the reply was shared
+
+    def generate_response(self, messages, cache=True, model=CHAT_MODEL, cacheable=None, **params):
+        """Handles API calls to OpenAI and returns responses
+
+        Replies are cached by ``model``, messages and ``params`` (further arguments of the completion);
+        ``cache=False`` skips the lookup but stores the fresh reply, and a ``cacheable`` function of
+        the reply can refuse to store one, say an incomplete answer. ``cache_status`` then says
+        whether the reply was a "hit", a "miss" or a "bypass", or is None with the cache disabled.
+        Identical requests made while one is in flight wait for its reply instead of calling again.
+        """
+        response_cache = get_response_cache()
+        key = request_key(model, messages, params)
+        self.cache_status = cache_status(response_cache, cache)
+        self.usage = None
+        if self.cache_status == "miss":
+            reply = response_cache.get(key)
+            if reply is not None:
+                self.cache_status = "hit"
+                return reply
+
+        def complete():
+            """Call OpenAI and cache the reply; identical calls in flight at once share this one."""
+            response = self.client.chat.completions.create(model=model, messages=messages, **params)
+            reply = response.choices[0].message.content
+            self.usage = response.usage
+            if response_cache is not None and reply and (cacheable is None or cacheable(reply)):
+                response_cache.set(key, reply)
+            return reply
 
-    def generate_response(self, messages):
-        """Handles API calls to OpenAI and returns responses"""
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=messages
-            )
-            return response.choices[0].message.content
+            return get_single_flight().do(f"chat:{key}", complete)
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
             return None
 
-    def upload_file(self, file_path):
-        """Uploads a file to OpenAI for fine-tuning or assistant processing"""
+    def stream_response(self, messages):
+        """Starts a streamed completion and returns a generator of its text pieces, or None if it failed to start."""
         try:
-            with open(file_path, "rb") as file:
-                response = self.client.files.create(file=file, purpose="user_data")
-                vector_store_file = self.client.vector_stores.files.create(
-                    vector_store_id="vs_67d4d17ccbe481918f32903175bb52b4",
-                    file_id=response.id
-                )
-            return vector_store_file # Return file ID
+            stream = self.client.chat.completions.create(model=CHAT_MODEL, messages=messages, stream=True)
         except Exception as e:
-            logger.error(f"OpenAI File Upload Error: {e}")
+            logger.error(f"OpenAI API error: {e}")
             return None
+        return stream_text(stream)
+
+    def create_file(self, file):
+        """Uploads a file object to OpenAI without attaching it to a vector store.
+
+        ``file`` is streamed from its open handle (Django's in-memory buffer or its own
+        uniquely named temporary file), so nothing is copied to disk before the upload.
+        Attach the uploaded files to a vector store with ``attach_files``.
+        """
+        file.seek(0)
+        return self.client.files.create(file=(os.path.basename(file.name), file), purpose="user_data")
+
+    def attach_files(self, vector_store_id, file_ids):
+        """Attaches uploaded files to a vector store with file batches and waits for them.
+
+        One file batch is created per ``FILE_BATCH_MAX_FILES`` ids and all of them are
+        polled in a single loop. Returns a dict of file id to VectorStoreFile.
+        """
+        file_ids = list(file_ids)
+        pending_batches = [
+            self.client.vector_stores.file_batches.create(
+                vector_store_id=vector_store_id, file_ids=file_ids[start:start + FILE_BATCH_MAX_FILES]
+            )
+            for start in range(0, len(file_ids), FILE_BATCH_MAX_FILES)
+        ]
+        finished_batches = []
+        while pending_batches:
+            still_pending = []
+            for batch in pending_batches:
+                if batch.status == "in_progress":
+                    still_pending.append(batch)
+                else:
+                    finished_batches.append(batch)
+            if still_pending:
+                time.sleep(settings.OPENAI_POLL_INTERVAL)
+                still_pending = [
+                    self.client.vector_stores.file_batches.retrieve(batch.id, vector_store_id=vector_store_id)
+                    for batch in still_pending
+                ]
+            pending_batches = still_pending
+
+        vector_store_files = {}
+        for batch in finished_batches:
+            for vector_store_file in self.client.vector_stores.file_batches.list_files(
+                batch.id, vector_store_id=vector_store_id, limit=100
+            ):
+                vector_store_files[vector_store_file.id] = vector_store_file
+        return vector_store_files
+
+    def create_vector_store(self, name):
+        """Creates an empty vector store and returns its id."""
+        return self.client.vector_stores.create(name=name).id
+
+    def expire_vector_store(self, vector_store_id, days):
+        """Lets OpenAI delete a vector store once it has been idle for ``days`` days."""
+        self.client.vector_stores.update(
+            vector_store_id, expires_after={"anchor": "last_active_at", "days": days}
+        )
 
     def get_file_content(self, file_id):
         """Fetch file content from OpenAI"""
         response = self.client.files.content(file_id)
         return response.content
+
+
+class AsyncOpenAIService:
+    """Async counterpart of OpenAIService for ASGI views: awaiting a call holds no worker thread."""
+
+    def __init__(self):
+        self.client = OpenAIClient.get_async_client()  # This event loop's client
+        self.cache_status = None  # How the last generate_response reply was obtained
+        self.usage = None  # Tokens of the last completion this service made; None when the reply was shared
+
+    async def generate_response(self, messages, cache=True, model=CHAT_MODEL, cacheable=None, **params):
+        """Handles API calls to OpenAI and returns responses, cached like ``OpenAIService.generate_response``."""
+        response_cache = get_response_cache()
+        key = request_key(model, messages, params)
+        self.cache_status = cache_status(response_cache, cache)
+        self.usage = None
+        if self.cache_status == "miss":
+            reply = await response_cache.aget(key)
+            if reply is not None:
+                self.cache_status = "hit"
+                return reply
+
+        async def complete():
+            """Call OpenAI and cache the reply; identical calls in flight at once share this one."""
+            response = await self.client.chat.completions.create(model=model, messages=messages, **params)
+            reply = response.choices[0].message.content
+            self.usage = response.usage
+            if response_cache is not None and reply and (cacheable is None or cacheable(reply)):
+                await response_cache.aset(key, reply)
+            return reply
+
+        try:
+            return await get_single_flight().ado(f"chat:{key}", complete)
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            return None
+
+    async def stream_response(self, messages):
+        """Starts a streamed completion and returns an async generator of its text pieces, or None if it failed."""
+        try:
+            stream = await self.client.chat.completions.create(model=CHAT_MODEL, messages=messages, stream=True)
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            return None
+        return astream_text(stream)
+
+    async def attach_files(self, vector_store_id, file_ids):
+        """Attaches uploaded files to a vector store with file batches and waits for them.
+
+        Works like ``OpenAIService.attach_files``, polling with ``asyncio.sleep``.
+        """
+        file_ids = list(file_ids)
+        pending_batches = await asyncio.gather(*[
+            self.client.vector_stores.file_batches.create(
+                vector_store_id=vector_store_id, file_ids=file_ids[start:start + FILE_BATCH_MAX_FILES]
+            )
+            for start in range(0, len(file_ids), FILE_BATCH_MAX_FILES)
+        ])
+        finished_batches = []
+        while pending_batches:
+            still_pending = []
+            for batch in pending_batches:
+                if batch.status == "in_progress":
+                    still_pending.append(batch)
+                else:
+                    finished_batches.append(batch)
+            if still_pending:
+                await asyncio.sleep(settings.OPENAI_POLL_INTERVAL)
+                still_pending = await asyncio.gather(*[
+                    self.client.vector_stores.file_batches.retrieve(batch.id, vector_store_id=vector_store_id)
+                    for batch in still_pending
+                ])
+            pending_batches = still_pending
+
+        vector_store_files = {}
+        for batch in finished_batches:
+            async for vector_store_file in await self.client.vector_stores.file_batches.list_files(
+                batch.id, vector_store_id=vector_store_id, limit=100
+            ):
+                vector_store_files[vector_store_file.id] = vector_store_file
+        return vector_store_files
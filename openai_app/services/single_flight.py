@@ -0,0 +1,180 @@
+"""Single-flight calls: concurrent callers asking for the same thing share one upstream call."""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+import redis
+from django.conf import settings
+
+from core import metrics
+
+# Delete the lock only while this caller holds it; once expired it may belong to another caller.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Make one call per key at a time and give its result to every caller that asked meanwhile.
+
+    In a process, later callers wait for the first one's call. With a Redis client the
+    first caller across processes also holds a lock for up to ``lock_timeout`` seconds and
+    publishes the result for ``result_ttl`` seconds; callers in other processes poll for it
+    every ``poll_interval`` seconds, and make the call themselves if the lock goes away
+    without a result. Results cross processes through ``dumps`` and ``loads``; exceptions
+    are only shared within a process.
+    """
+
+    def __init__(self, redis_client=None, lock_timeout=120, poll_interval=0.05, result_ttl=30,
+                 key_prefix='openai:single_flight'):
+        """Configure where calls are coordinated and how long callers wait on each other."""
+        self.redis = redis_client
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self.key_prefix = key_prefix
+        self._calls = {}  # key -> Future of the call this process has in flight
+        self._tasks = {}  # (event loop, key) -> Task of the call that loop has in flight
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, dumps=json.dumps, loads=json.loads):
+        """Return ``fn()``, or the result of the same call already in flight."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            metrics.increment('single_flight.coalesced')
+            return future.result()
+        try:
+            result = self._call(key, fn, dumps, loads)
+        except BaseException as e:  # Even an interrupt must not leave the other callers waiting
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key, fn, dumps=json.dumps, loads=json.loads):
+        """Like :meth:`do` for a coroutine function ``fn``, waiting without blocking the event loop.
+
+        The call runs as a task of its own, so a caller that is cancelled, say because its
+        client disconnected, leaves it running for the others.
+        """
+        loop = asyncio.get_running_loop()
+        flight = (loop, key)
+        with self._lock:
+            task = self._tasks.get(flight)
+            if task is None:
+                task = self._tasks[flight] = loop.create_task(self._acall(key, fn, dumps, loads))
+                task.add_done_callback(lambda done: self._forget(flight, done))
+            else:
+                metrics.increment('single_flight.coalesced')
+        return await asyncio.shield(task)
+
+    def _forget(self, flight, task):
+        """Drop a finished task, retrieving its exception so one nobody awaited is not reported."""
+        with self._lock:
+            del self._tasks[flight]
+        if not task.cancelled():
+            task.exception()
+
+    def _call(self, key, fn, dumps, loads):
+        """Return ``fn()``, unless another process makes the same call first."""
+        if self.redis is None:
+            metrics.increment('single_flight.calls')
+            return fn()
+        while True:
+            token = self._lock_call(key)
+            if token:
+                try:
+                    metrics.increment('single_flight.calls')
+                    result = fn()
+                    self._publish(key, dumps(result))
+                    return result
+                finally:
+                    self._release(key, token)
+            while True:  # Another process is making the call
+                data, locked = self._poll(key)
+                if data is not None:
+                    metrics.increment('single_flight.coalesced')
+                    return loads(data)
+                if not locked:
+                    break  # It failed or its process died; try to make the call here
+                time.sleep(self.poll_interval)
+
+    async def _acall(self, key, fn, dumps, loads):
+        """Like :meth:`_call` for a coroutine function, with Redis commands run in a thread."""
+        if self.redis is None:
+            metrics.increment('single_flight.calls')
+            return await fn()
+        while True:
+            token = await asyncio.to_thread(self._lock_call, key)
+            if token:
+                try:
+                    metrics.increment('single_flight.calls')
+                    result = await fn()
+                    await asyncio.to_thread(self._publish, key, dumps(result))
+                    return result
+                finally:
+                    await asyncio.to_thread(self._release, key, token)
+            while True:
+                data, locked = await asyncio.to_thread(self._poll, key)
+                if data is not None:
+                    metrics.increment('single_flight.coalesced')
+                    return loads(data)
+                if not locked:
+                    break
+                await asyncio.sleep(self.poll_interval)
+
+    def _lock_call(self, key):
+        """Take the cross-process lock on a call and clear any earlier result; return its token, or None."""
+        token = uuid.uuid4().hex
+        if not self.redis.set(self._key(key, 'lock'), token, nx=True, px=round(self.lock_timeout * 1000)):
+            return None
+        self.redis.delete(self._key(key, 'result'))
+        return token
+
+    def _publish(self, key, data):
+        """Leave a call's result for the callers polling for it."""
+        self.redis.set(self._key(key, 'result'), data, px=round(self.result_ttl * 1000))
+
+    def _release(self, key, token):
+        """Release the lock on a call if this caller still holds it."""
+        self.redis.eval(RELEASE_SCRIPT, 1, self._key(key, 'lock'), token)
+
+    def _poll(self, key):
+        """Return the call's published result, or None, and whether its lock is still held."""
+        return self.redis.pipeline().get(self._key(key, 'result')).exists(self._key(key, 'lock')).execute()
+
+    def _key(self, key, kind):
+        """Return the Redis key of a call's lock or result."""
+        return f'{self.key_prefix}:{kind}:{key}'
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Return the single-flight coordinator shared by this process, across processes when ``REDIS_URL`` is set."""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight(
+                redis_client=redis.Redis.from_url(settings.REDIS_URL) if settings.REDIS_URL else None,
+                lock_timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT,
+                poll_interval=settings.SINGLE_FLIGHT_POLL_INTERVAL,
+            )
+        return _single_flight
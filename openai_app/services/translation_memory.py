@@ -0,0 +1,145 @@
+"""Translation-memory fuzzy matching over TranslationEmbedding."""
+
+import re
+from dataclasses import asdict, dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from pgvector.django import VectorField
+
+from openai_app.models import TranslationEmbedding
+from openai_app.services.embeddings import EmbeddingService
+from openai_app.services.vector_search import set_search_parameters
+from openai_app.vector_indexes import DIMENSIONS
+
+WORD = re.compile(r"[^\W_]+")  # pg_trgm splits words on anything but letters and digits
+
+# One round trip for the whole batch: every query segment takes its nearest neighbours from
+# the HNSW index in a LATERAL subquery, which then re-scores them with pg_trgm similarity.
+# With a quantized search mode, {nearest} is itself a subquery of coarse candidates from the
+# quantized index, which the exact distance then narrows down.
+LOOKUP_SQL = """
+SELECT query.position, match.id, match.source_text, match.target_text, match.similarity, match.fuzzy, match.score
+FROM unnest(%(texts)s::text[], %(embeddings)s::vector[]) WITH ORDINALITY AS query (text, embedding, position)
+CROSS JOIN LATERAL (
+    SELECT candidate.*, %(vector_weight)s * candidate.similarity + %(fuzzy_weight)s * candidate.fuzzy AS score
+    FROM (
+        SELECT nearest.id, nearest.source_text, nearest.target_text,
+               1 - (nearest.embedding <=> query.embedding) AS similarity,
+               similarity(nearest.source_text, query.text) AS fuzzy
+        FROM {nearest} AS nearest
+        ORDER BY nearest.embedding <=> query.embedding
+        LIMIT %(candidates)s
+    ) AS candidate
+    ORDER BY score DESC
+    LIMIT %(k)s
+) AS match
+ORDER BY query.position, match.score DESC
+"""
+COARSE_SQL = "(SELECT * FROM {table} AS coarse ORDER BY {order} LIMIT %(coarse)s)"
+COARSE_ORDER = {
+    "halfvec": f"coarse.embedding::halfvec({DIMENSIONS}) <=> query.embedding::halfvec({DIMENSIONS})",
+    "binary": (
+        f"binary_quantize(coarse.embedding)::bit({DIMENSIONS}) <~> binary_quantize(query.embedding)::bit({DIMENSIONS})"
+    ),
+}
+
+
+@dataclass(slots=True)
+class TMMatch:
+    """A stored translation matching a query segment, with its vector, fuzzy and combined scores."""
+
+    id: int
+    source_text: str
+    target_text: str
+    similarity: float  # Cosine similarity of the embeddings
+    fuzzy: float  # Character trigram similarity of the source texts
+    score: float
+
+    def as_dict(self):
+        """Return the match as a dictionary."""
+        return asdict(self)
+
+
+def trigrams(text):
+    """Return the character trigrams of ``text`` the way pg_trgm extracts them."""
+    grams = set()
+    for word in WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return grams
+
+
+def trigram_similarity(first, second):
+    """Return pg_trgm's ``similarity()``: shared trigrams over all trigrams of the two texts."""
+    first, second = trigrams(first), trigrams(second)
+    union = len(first | second)
+    return len(first & second) / union if union else 0.0
+
+
+def lookup_vectors(texts, embeddings, k, vector_weight, candidates, ef_search=None, mode=None):
+    """Return the top ``k`` TMMatch lists for query texts with known embeddings, in query order.
+
+    ``mode`` is the search mode of ``nearest_translations``; quantized modes take
+    ``VECTOR_SEARCH_RERANK_FACTOR`` coarse candidates per exact one.
+    """
+    if connection.vendor != "postgresql":
+        return _lookup_in_python(texts, embeddings, k, vector_weight, candidates)
+    mode = mode or settings.VECTOR_SEARCH_MODE
+    table = connection.ops.quote_name(TranslationEmbedding._meta.db_table)
+    nearest = table if mode == "full" else COARSE_SQL.format(table=table, order=COARSE_ORDER[mode])
+    fetched = candidates if mode == "full" else candidates * settings.VECTOR_SEARCH_RERANK_FACTOR
+    field = VectorField()
+    params = {
+        "texts": list(texts),
+        "embeddings": [field.get_prep_value(embedding) for embedding in embeddings],
+        "vector_weight": vector_weight,
+        "fuzzy_weight": 1 - vector_weight,
+        "candidates": candidates,
+        "coarse": fetched,
+        "k": k,
+    }
+    results = [[] for _ in texts]
+    with transaction.atomic():
+        set_search_parameters(max(ef_search or settings.VECTOR_SEARCH_EF_SEARCH, fetched))
+        with connection.cursor() as cursor:
+            cursor.execute(LOOKUP_SQL.format(nearest=nearest), params)
+            for position, *match in cursor.fetchall():
+                results[position - 1].append(TMMatch(*match))
+    return results
+
+
+def _lookup_in_python(texts, embeddings, k, vector_weight, candidates):
+    """Score every stored row in memory; a stand-in for the indexed query on databases without pgvector."""
+    rows = list(TranslationEmbedding.objects.values_list("id", "source_text", "target_text", "embedding"))
+    if not rows:
+        return [[] for _ in texts]
+    matrix = np.array([row[3] for row in rows], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    results = []
+    for text, embedding in zip(texts, embeddings):
+        query = np.asarray(embedding, dtype=np.float32)
+        similarities = matrix @ (query / np.linalg.norm(query))
+        matches = []
+        for index in np.argsort(-similarities)[:candidates]:
+            row_id, source_text, target_text, _ = rows[index]
+            similarity = float(similarities[index])
+            fuzzy = trigram_similarity(source_text, text)
+            score = vector_weight * similarity + (1 - vector_weight) * fuzzy
+            matches.append(TMMatch(row_id, source_text, target_text, similarity, fuzzy, score))
+        results.append(sorted(matches, key=lambda match: -match.score)[:k])
+    return results
+
+
+def lookup(texts, k=5, vector_weight=None, candidates=None, ef_search=None, mode=None):
+    """Return the top ``k`` translation-memory matches for each text, in order.
+
+    Matches are the ``candidates`` nearest stored source texts by embedding, ranked by
+    ``vector_weight`` times their cosine similarity plus the rest times their character
+    trigram similarity. Query embeddings go through the embedding cache.
+    """
+    vector_weight = settings.TM_VECTOR_WEIGHT if vector_weight is None else vector_weight
+    candidates = max(candidates or settings.TM_CANDIDATES, k)
+    embeddings = list(EmbeddingService().embed(texts))
+    return lookup_vectors(texts, embeddings, k, vector_weight, candidates, ef_search, mode)
@@ -0,0 +1,50 @@
+"""Nearest-neighbour queries over TranslationEmbedding with per-query recall settings."""
+
+from django.conf import settings
+from django.db import connection, transaction
+from pgvector.django import CosineDistance, HammingDistance
+
+from openai_app.models import TranslationEmbedding
+from openai_app.vector_indexes import quantized, quantized_query
+
+
+def set_search_parameters(ef_search=None, probes=None):
+    """Set ``hnsw.ef_search`` and ``ivfflat.probes`` until the current transaction ends.
+
+    Larger values visit more of the index: better recall, slower queries. Outside PostgreSQL
+    there is no index and this does nothing.
+    """
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('hnsw.ef_search', %s, true), set_config('ivfflat.probes', %s, true)",
+            [str(ef_search or settings.VECTOR_SEARCH_EF_SEARCH), str(probes or settings.VECTOR_SEARCH_IVFFLAT_PROBES)],
+        )
+
+
+def nearest_translations(embedding, k=10, ef_search=None, probes=None, queryset=None, mode=None, rerank_factor=None):
+    """Return the ``k`` TranslationEmbedding rows nearest to ``embedding`` by cosine distance, nearest first.
+
+    Each row has a ``distance`` attribute. ``ef_search`` and ``probes`` override the index
+    search settings for this query only; ``ef_search`` is raised to the number of rows
+    fetched because HNSW returns at most that many.
+
+    ``mode`` (``VECTOR_SEARCH_MODE`` by default) picks the index searched. ``"halfvec"`` and
+    ``"binary"`` fetch ``k * rerank_factor`` candidates from the quantized index, then order
+    those by their exact distance on the full vectors.
+    """
+    mode = mode or settings.VECTOR_SEARCH_MODE
+    queryset = TranslationEmbedding.objects.all() if queryset is None else queryset
+    fetched = k
+    if mode != "full":
+        fetched = k * (rerank_factor or settings.VECTOR_SEARCH_RERANK_FACTOR)
+        distance = HammingDistance if mode == "binary" else CosineDistance
+        candidates = queryset.annotate(
+            coarse_distance=distance(quantized(mode), quantized_query(mode, embedding))
+        ).order_by("coarse_distance").values("pk")[:fetched]
+        queryset = TranslationEmbedding.objects.filter(pk__in=candidates)
+    queryset = queryset.annotate(distance=CosineDistance("embedding", embedding)).order_by("distance")[:k]
+    with transaction.atomic():
+        set_search_parameters(max(ef_search or settings.VECTOR_SEARCH_EF_SEARCH, fetched), probes)
+        return list(queryset)
@@ -0,0 +1,389 @@
+"""Local OpenAI-compatible stub server used by tests and benchmarks."""
+
+import base64
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import uuid
+from array import array
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Answer the subset of the OpenAI REST API used by this project."""
+
+    protocol_version = 'HTTP/1.1'
+    routes = [
+        ('POST', re.compile(r'^/v1/chat/completions$'), 'create_chat_completion'),
+        ('POST', re.compile(r'^/v1/embeddings$'), 'create_embedding'),
+        ('POST', re.compile(r'^/v1/files$'), 'create_file'),
+        ('POST', re.compile(r'^/v1/vector_stores$'), 'create_vector_store'),
+        ('POST', re.compile(r'^/v1/vector_stores/(?P<vector_store_id>[^/]+)$'), 'update_vector_store'),
+        ('POST', re.compile(r'^/v1/vector_stores/(?P<vector_store_id>[^/]+)/files$'), 'create_vector_store_file'),
+        ('POST', re.compile(r'^/v1/vector_stores/(?P<vector_store_id>[^/]+)/file_batches$'), 'create_file_batch'),
+        ('GET', re.compile(r'^/v1/vector_stores/(?P<vector_store_id>[^/]+)/file_batches/(?P<batch_id>[^/]+)$'),
+         'retrieve_file_batch'),
+        ('GET', re.compile(r'^/v1/vector_stores/(?P<vector_store_id>[^/]+)/file_batches/(?P<batch_id>[^/]+)/files$'),
+         'list_file_batch_files'),
+    ]
+
+    def log_message(self, format, *args):
+        """Keep test and benchmark output quiet."""
+
+    def do_GET(self):
+        """Dispatch GET requests."""
+        self._dispatch('GET')
+
+    def do_POST(self):
+        """Dispatch POST requests."""
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        """Route a request to the matching handler method."""
+        path = self.path.split('?', 1)[0]
+        body = self._read_body()
+        stub = self.server.stub
+        stub.record_request(method, path, len(body))
+        retry_after = stub.take_rate_limit()
+        if retry_after:
+            return self._send_json(
+                429,
+                {'error': {'message': 'Rate limit reached', 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                {'retry-after-ms': str(round(retry_after * 1000)), 'retry-after': str(math.ceil(retry_after))},
+            )
+        if stub.error_status:
+            return self._send_json(stub.error_status, {'error': {'message': 'Stub outage', 'type': 'server_error'}})
+        for route_method, pattern, handler_name in self.routes:
+            match = pattern.match(path)
+            if route_method == method and match:
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, payload = getattr(self, handler_name)(body, **match.groupdict())
+                if isinstance(payload, Iterator):
+                    return self._send_events(status, payload)
+                return self._send_json(status, payload)
+        return self._send_json(404, {'error': {'message': f'No stub route for {method} {path}'}})
+
+    def _read_body(self):
+        """Read a fixed-length or chunked request body."""
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _send_json(self, status, payload, headers=None):
+        """Write a JSON response."""
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_events(self, status, events):
+        """Stream server-sent events, each after ``token_delay``; a client hanging up ends the stream."""
+        stub = self.server.stub
+        self.close_connection = True
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        try:
+            for event in events:
+                if stub.token_delay:
+                    time.sleep(stub.token_delay)
+                self.wfile.write(f'data: {event}\n\n'.encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with stub._lock:
+                stub.aborted_streams += 1
+
+    def create_chat_completion(self, body):
+        """Answer a chat completion by echoing the last message, streamed word by word when asked to.
+
+        Requests for the ``lqa_report`` structured output are answered with a review of their segments instead.
+        """
+        request = json.loads(body)
+        content = request['messages'][-1]['content'] if request.get('messages') else ''
+        if ((request.get('response_format') or {}).get('json_schema') or {}).get('name') == 'lqa_report':
+            results = [stub_lqa_result(segment) for segment in json.loads(content)['segments']]
+            content = json.dumps({'results': results[:self.server.stub.lqa_max_items]})
+        prompt_tokens = math.ceil(len(json.dumps(request.get('messages', []))) / 4)
+        completion_tokens = math.ceil(len(content) / 4)
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+        if request.get('stream'):
+            return 200, self._chat_chunks(request, content, usage)
+        time.sleep(self.server.stub.token_delay * len(re.findall(r'\S+\s*', content)))  # As long as streaming it
+        return 200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model'),
+            'choices': [
+                {'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'},
+            ],
+            'usage': usage,
+        }
+
+    def _chat_chunks(self, request, content, usage):
+        """Yield the ``chat.completion.chunk`` events of a streamed completion, one word per chunk."""
+        chunk = {'id': f'chatcmpl-{uuid.uuid4().hex}', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                 'model': request.get('model')}
+        deltas = [{'role': 'assistant', 'content': ''}] + [{'content': word} for word in re.findall(r'\S+\s*', content)]
+        for delta in deltas:
+            yield json.dumps({**chunk, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})
+        yield json.dumps({**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+        if (request.get('stream_options') or {}).get('include_usage'):
+            yield json.dumps({**chunk, 'choices': [], 'usage': usage})
+        yield '[DONE]'
+
+    def create_embedding(self, body):
+        """Answer with a deterministic vector per input, derived from a hash of its text."""
+        request = json.loads(body)
+        inputs = request['input'] if isinstance(request['input'], list) else [request['input']]
+        dimensions = request.get('dimensions') or self.server.stub.embedding_dimensions
+        data = []
+        for index, text in enumerate(inputs):
+            vector = stub_embedding(text, dimensions)
+            if request.get('encoding_format') == 'base64':
+                vector = base64.b64encode(array('f', vector).tobytes()).decode()
+            data.append({'object': 'embedding', 'index': index, 'embedding': vector})
+        tokens = sum(math.ceil(len(text) / 4) for text in inputs)
+        return 200, {
+            'object': 'list',
+            'data': data,
+            'model': request.get('model'),
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens},
+        }
+
+    def create_file(self, body):
+        """Store an uploaded file's size and name."""
+        match = re.search(rb'filename="([^"]*)"', body)
+        file_object = {
+            'id': f'file-{uuid.uuid4().hex}',
+            'object': 'file',
+            'bytes': len(body),
+            'created_at': int(time.time()),
+            'filename': match.group(1).decode() if match else 'upload',
+            'purpose': 'user_data',
+            'status': 'processed',
+        }
+        self.server.stub.files[file_object['id']] = file_object
+        return 200, file_object
+
+    def create_vector_store(self, body):
+        """Create an empty vector store."""
+        vector_store = {
+            'id': f'vs_{uuid.uuid4().hex}',
+            'object': 'vector_store',
+            'created_at': int(time.time()),
+            'name': json.loads(body or b'{}').get('name'),
+            'usage_bytes': 0,
+            'status': 'completed',
+            'last_active_at': None,
+            'metadata': None,
+            'expires_after': None,
+            'file_counts': {'in_progress': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'total': 0},
+        }
+        self.server.stub.vector_stores[vector_store['id']] = vector_store
+        return 200, vector_store
+
+    def update_vector_store(self, body, vector_store_id):
+        """Update a vector store's name, metadata or expiry policy."""
+        vector_store = self.server.stub.vector_stores[vector_store_id]
+        vector_store.update(json.loads(body))
+        return 200, vector_store
+
+    def create_vector_store_file(self, body, vector_store_id):
+        """Attach an uploaded file to a vector store."""
+        return 200, self._attach(vector_store_id, json.loads(body)['file_id'])
+
+    def _attach(self, vector_store_id, file_id):
+        """Record a vector store attachment; unknown file ids fail like the real API."""
+        known = file_id in self.server.stub.files
+        vector_store_file = {
+            'id': file_id,
+            'object': 'vector_store.file',
+            'created_at': int(time.time()),
+            'last_error': None if known else {'code': 'invalid_file', 'message': f'No file {file_id}'},
+            'status': 'completed' if known else 'failed',
+            'usage_bytes': self.server.stub.files.get(file_id, {}).get('bytes', 0),
+            'vector_store_id': vector_store_id,
+        }
+        self.server.stub.vector_store_files.setdefault(vector_store_id, {})[file_id] = vector_store_file
+        return vector_store_file
+
+    def create_file_batch(self, body, vector_store_id):
+        """Start a file batch that completes after ``StubOpenAIServer.batch_polls`` retrievals."""
+        file_ids = json.loads(body)['file_ids']
+        batch = {
+            'id': f'vsfb_{uuid.uuid4().hex}',
+            'object': 'vector_store.files_batch',
+            'created_at': int(time.time()),
+            'status': 'in_progress',
+            'vector_store_id': vector_store_id,
+            'file_counts': {'in_progress': len(file_ids), 'completed': 0, 'failed': 0, 'cancelled': 0,
+                            'total': len(file_ids)},
+        }
+        self.server.stub.file_batches[batch['id']] = {'batch': batch, 'file_ids': file_ids, 'polls': 0}
+        return 200, batch
+
+    def retrieve_file_batch(self, body, vector_store_id, batch_id):
+        """Return a file batch, attaching its files once it has been polled enough times."""
+        state = self.server.stub.file_batches[batch_id]
+        state['polls'] += 1
+        batch = state['batch']
+        if batch['status'] == 'in_progress' and state['polls'] >= self.server.stub.batch_polls:
+            attached = [self._attach(vector_store_id, file_id) for file_id in state['file_ids']]
+            failed = sum(item['status'] == 'failed' for item in attached)
+            batch['status'] = 'completed'
+            batch['file_counts'].update(in_progress=0, completed=len(attached) - failed, failed=failed)
+        return 200, batch
+
+    def list_file_batch_files(self, body, vector_store_id, batch_id):
+        """List the vector store files of a batch."""
+        files = self.server.stub.vector_store_files.get(vector_store_id, {})
+        data = [files[file_id] for file_id in self.server.stub.file_batches[batch_id]['file_ids'] if file_id in files]
+        return 200, {'object': 'list', 'data': data, 'first_id': None, 'last_id': None, 'has_more': False}
+
+
+def stub_lqa_result(segment):
+    """Return a deterministic review of a segment: empty, untranslated, and with numbers missing from the target."""
+    issues = []
+    if not segment['target'].strip():
+        issues.append({'category': 'omission', 'severity': 'major', 'description': 'The translation is empty.'})
+    elif segment['target'].strip() == segment['source'].strip():
+        issues.append({'category': 'omission', 'severity': 'minor', 'description': 'The segment is untranslated.'})
+    missing = set(re.findall(r'\d+', segment['source'])) - set(re.findall(r'\d+', segment['target']))
+    if missing:
+        issues.append({'category': 'accuracy', 'severity': 'major',
+                       'description': f"Numbers missing from the translation: {', '.join(sorted(missing))}."})
+    score = 100 - sum(25 if issue['severity'] == 'major' else 5 for issue in issues)
+    return {'id': segment['id'], 'score': max(0, score), 'issues': issues}
+
+
+def stub_embedding(text, dimensions):
+    """Return a fixed pseudo-random vector for ``text``; equal texts get equal vectors."""
+    digest = hashlib.sha256(str(text).encode()).digest()
+    values = [(byte - 127.5) / 127.5 for byte in digest]
+    return (values * math.ceil(dimensions / len(values)))[:dimensions]
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    """A thread per connection, with a listen backlog deep enough for load tests' bursts of connections."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StubOpenAIServer:
+    """Run :class:`StubOpenAIHandler` on a background thread.
+
+    Usage::
+
+        with StubOpenAIServer() as stub:
+            client = OpenAI(api_key='test', base_url=stub.base_url)
+    """
+
+    handler_class = StubOpenAIHandler
+    embedding_dimensions = 1536
+
+    def __init__(self, latency=0.0, batch_polls=1, requests_per_second=None, token_delay=0.0, lqa_max_items=None,
+                 error_status=None):
+        """Initialize stub state.
+
+        ``latency`` is added to every routed request in seconds and ``batch_polls`` is the
+        number of retrievals after which a vector store file batch completes. With
+        ``requests_per_second`` set, requests beyond that rate (with a one second burst)
+        are answered with a 429 and ``Retry-After`` headers, like the real API.
+        ``token_delay`` is the pause in seconds before each event of a streamed completion,
+        and is spent per word on unstreamed completions too. With ``lqa_max_items`` set, LQA
+        reports stop after that many results, like a model that drops items from long batches.
+        With ``error_status`` set, every request is answered with that HTTP error, like an outage.
+        """
+        self.latency = latency
+        self.token_delay = token_delay
+        self.lqa_max_items = lqa_max_items
+        self.error_status = error_status
+        self.aborted_streams = 0  # Streamed completions the client stopped reading
+        self.batch_polls = batch_polls
+        self.requests_per_second = requests_per_second
+        self.rate_limited = 0
+        self._allowance = requests_per_second or 0
+        self._allowance_updated = time.monotonic()
+        self.files = {}
+        self.vector_stores = {}
+        self.vector_store_files = {}
+        self.file_batches = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Return the base URL to hand to the OpenAI client."""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    @property
+    def bytes_received(self):
+        """Return the total request body bytes received so far."""
+        return sum(size for _, _, size in self.requests)
+
+    def record_request(self, method, path, size):
+        """Record a request for later assertions."""
+        with self._lock:
+            self.requests.append((method, path, size))
+
+    def take_rate_limit(self):
+        """Admit one request and return 0, or return the seconds until it would be admitted."""
+        if not self.requests_per_second:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self._allowance_updated = now - self._allowance_updated, now
+            self._allowance = min(self.requests_per_second, self._allowance + elapsed * self.requests_per_second)
+            if self._allowance >= 1:
+                self._allowance -= 1
+                return 0
+            self.rate_limited += 1
+            return (1 - self._allowance) / self.requests_per_second
+
+    def start(self):
+        """Start serving on an ephemeral localhost port."""
+        self._server = StubHTTPServer(('127.0.0.1', 0), self.handler_class)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        """Start the server when used as a context manager."""
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        """Stop the server when leaving the context."""
+        self.stop()
@@ -0,0 +1,22 @@
+"""Test helpers for code that calls OpenAI."""
+
+from unittest.mock import patch
+
+from django.test import override_settings
+from openai import OpenAI
+
+from openai_app.services.client import OpenAIClient
+from openai_app.utils.stub_server import StubOpenAIServer
+
+
+class StubOpenAIMixin:
+    """Point the shared OpenAI clients at a local stub server, started for each test as ``self.stub``."""
+
+    def setUp(self):
+        """Start the stub and swap it in as the singleton client and as the async clients' base URL."""
+        super().setUp()
+        self.stub = StubOpenAIServer().start()
+        self.addCleanup(self.stub.stop)
+        client = OpenAI(api_key='test', base_url=self.stub.base_url, max_retries=0)
+        self.enterContext(patch.object(OpenAIClient, '_client', client))
+        self.enterContext(override_settings(OPENAI_API_KEY='test', OPENAI_BASE_URL=self.stub.base_url))
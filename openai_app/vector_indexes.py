@@ -0,0 +1,86 @@
+"""Approximate nearest neighbour indexes on ``TranslationEmbedding.embedding``.
+
+Index parameters come from settings rather than model ``Meta``, so they can be tuned per
+deployment without new migrations; the migrations and ``rebuild_vector_indexes`` build them
+from here.
+
+Besides the full-precision indexes, HNSW can index the vectors quantized: cast to
+``halfvec`` (half the index size) or ``binary_quantize``-d to one bit per dimension (a 32nd).
+Searches use those for a coarse candidate pass and rerank the candidates on the full vectors.
+"""
+
+from django.conf import settings
+from django.contrib.postgres.indexes import OpClass
+from django.db.models import Func, Value
+from django.db.models.functions import Cast
+from pgvector.django import BitField, HalfVectorField, HnswIndex, IvfflatIndex, VectorField
+
+DIMENSIONS = 1536  # Of TranslationEmbedding.embedding; quantized casts need it
+HNSW_INDEX_NAME = "translation_embedding_hnsw"
+IVFFLAT_INDEX_NAME = "translation_embedding_ivfflat"
+QUANTIZED_INDEX_NAMES = {"halfvec": "translation_embedding_halfvec", "binary": "translation_embedding_binary"}
+QUANTIZATION_MODES = ("full", *QUANTIZED_INDEX_NAMES)
+OPCLASS = "vector_cosine_ops"  # Searches order by cosine distance
+
+
+class BinaryQuantize(Func):
+    """pgvector's ``binary_quantize()``: one bit per dimension, set where the value is positive."""
+
+    function = "binary_quantize"
+    output_field = BitField(length=DIMENSIONS)
+
+
+def quantized(mode, expression="embedding"):
+    """Return ``expression`` (a vector column or expression) as the index of ``mode`` stores it."""
+    if mode == "halfvec":
+        return Cast(expression, HalfVectorField(dimensions=DIMENSIONS))
+    if mode == "binary":
+        return Cast(BinaryQuantize(expression), BitField(length=DIMENSIONS))
+    return expression
+
+
+def quantized_query(mode, vector):
+    """Return a query vector as an expression comparable with ``quantized(mode)``."""
+    return quantized(mode, Cast(Value(VectorField().get_prep_value(vector)), VectorField(dimensions=DIMENSIONS)))
+
+
+def hnsw_index(m=None, ef_construction=None, name=HNSW_INDEX_NAME):
+    """Return the HNSW index, with ``VECTOR_INDEX_HNSW_*`` for parameters not given."""
+    return HnswIndex(
+        name=name,
+        fields=["embedding"],
+        m=m or settings.VECTOR_INDEX_HNSW_M,
+        ef_construction=ef_construction or settings.VECTOR_INDEX_HNSW_EF_CONSTRUCTION,
+        opclasses=[OPCLASS],
+    )
+
+
+def ivfflat_index(lists=None, name=IVFFLAT_INDEX_NAME):
+    """Return the IVFFlat index, with ``VECTOR_INDEX_IVFFLAT_LISTS`` lists unless given."""
+    return IvfflatIndex(
+        name=name, fields=["embedding"], lists=lists or settings.VECTOR_INDEX_IVFFLAT_LISTS, opclasses=[OPCLASS]
+    )
+
+
+def quantized_index(mode, m=None, ef_construction=None, name=None):
+    """Return the HNSW index over the ``halfvec`` or ``binary`` quantized vectors."""
+    opclass = "halfvec_cosine_ops" if mode == "halfvec" else "bit_hamming_ops"
+    return HnswIndex(
+        OpClass(quantized(mode), name=opclass),
+        name=name or QUANTIZED_INDEX_NAMES[mode],
+        m=m or settings.VECTOR_INDEX_HNSW_M,
+        ef_construction=ef_construction or settings.VECTOR_INDEX_HNSW_EF_CONSTRUCTION,
+    )
+
+
+def configured_quantizations():
+    """Return the quantized index modes listed in ``VECTOR_INDEX_QUANTIZATION``."""
+    return [mode for mode in QUANTIZED_INDEX_NAMES if mode in settings.VECTOR_INDEX_QUANTIZATION]
+
+
+def configured_indexes():
+    """Return the indexes the settings ask for: always HNSW, IVFFlat when it has a list count."""
+    indexes = [hnsw_index()]
+    if settings.VECTOR_INDEX_IVFFLAT_LISTS:
+        indexes.append(ivfflat_index())
+    return indexes
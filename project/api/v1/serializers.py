@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from project.models import Project,ProjectFile,UploadedFile
+from project.models import Project, ProjectFile, UploadedFile, UploadJob, UploadJobFile
 
 
 class ProjectSerializer(serializers.ModelSerializer):
@@ -66,4 +66,51 @@ class UploadedFileSerializer(serializers.ModelSerializer):
 class FetchFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProjectFile
-        fields = ["id", "project", "openai_file_id", "vector_store_id","file_name", "file_type", "created_at"]
\ No newline at end of file
+        fields = ["id", "project", "openai_file_id", "vector_store_id","file_name", "file_type", "version",
+                  "previous_version", "created_at"]
+
+
+class UploadJobFileSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of one file in an upload job."""
+
+    class Meta:
+        model = UploadJobFile
+        fields = ["id", "file_name", "file_type", "content_hash", "status", "cached", "error", "project_file"]
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    """Serializer for polling an asynchronous upload job and its per-file progress."""
+
+    files = UploadJobFileSerializer(many=True, read_only=True)
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadJob
+        fields = ["id", "project", "status", "progress", "files", "created_at", "updated_at"]
+
+    def get_progress(self, job):
+        """Count files by status."""
+        statuses = [job_file.status for job_file in job.files.all()]
+        return {
+            "total": len(statuses),
+            "completed": statuses.count("completed"),
+            "failed": statuses.count("failed"),
+        }
+
+
+class HybridSearchSerializer(serializers.Serializer):
+    """Validates a hybrid lexical and vector search."""
+
+    query = serializers.CharField(max_length=2000)
+    corpus = serializers.ChoiceField(choices=["segments", "memory"], default="segments")
+    project = serializers.UUIDField(required=False)  # Limits a segment search to one project
+    k = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    lexical_weight = serializers.FloatField(min_value=0, required=False)
+    vector_weight = serializers.FloatField(min_value=0, required=False)
+    ef_search = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+
+    def validate(self, data):
+        """Reject requests that give both rankings no weight."""
+        if data.get("lexical_weight") == 0 and data.get("vector_weight") == 0:
+            raise serializers.ValidationError("At least one of lexical_weight and vector_weight must be positive.")
+        return data
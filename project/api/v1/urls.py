@@ -2,7 +2,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import ProjectViewSet, UploadFileViewSet, MediaUpload, FileFetchView
+from .views import ProjectViewSet, UploadFileViewSet, MediaUpload, MediaUploadView, FileFetchView, HybridSearchView
 
 router = DefaultRouter()
 
@@ -14,4 +14,8 @@ router.register(r"media", MediaUpload, basename="media")
 urlpatterns = [
     path('files/', FileFetchView.as_view({'get': 'list'}), name='all-files'),
     path('files/<uuid:pk>/', FileFetchView.as_view({'get': 'retrieve'}), name='file-detail'),
+    path('files/<uuid:pk>/versions/', FileFetchView.as_view({'post': 'create_version'}), name='file-versions'),
+    path('files/<uuid:pk>/review/', FileFetchView.as_view({'post': 'review'}), name='file-review'),
+    path('media/media/', MediaUploadView.as_view(), name='media-media'),
+    path('search/', HybridSearchView.as_view({'post': 'search'}), name='hybrid-search'),
     path('', include(router.urls)), ]
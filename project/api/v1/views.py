@@ -1,18 +1,24 @@
-import os
-
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.shortcuts import aget_object_or_404, get_object_or_404
 from rest_framework import viewsets, permissions,status
 import logging
 
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
-from project.models import Project, ProjectFile, UploadedFile
-from .serializers import ProjectSerializer, ProjectFileSerializer, FileUploadSerializer, UploadSerializer, \
-    UploadedFileSerializer, FetchFileSerializer
-from concurrent.futures import ThreadPoolExecutor
-from openai_app.services.services import OpenAIService  # Import OpenAIService
+from core.async_views import AsyncAPIView
+from project.models import Project, ProjectFile, UploadJob, UploadJobFile
+from project.services import hybrid_search
+from project.services.upload_scheduler import UploadQueueFull
+from project.services.uploads import aupload_files, upload_files
+from project.services.vector_stores import VectorStoreManager
+from project.services.qa import has_review
+from project.services.versions import create_file_version, parse_file_version
+from project.tasks import embed_file_segments, process_upload_job, review_file_segments
+from project.upload_handlers import get_content_hash
+from .serializers import ProjectSerializer, ProjectFileSerializer, UploadSerializer, FetchFileSerializer, \
+    UploadJobSerializer, HybridSearchSerializer
 
 logger = logging.getLogger(__name__)
 # Allowed file extensions
@@ -32,10 +38,9 @@ class UploadFileViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['post'])
     def file(self, request, *args, **kwargs):
-        """Handles storing file metadata after media upload API call"""
+        """Handles storing file metadata after a synchronous media upload (async upload jobs record it themselves)"""
         try:
             project_id = request.data.get("Project")  # Fetch Project UUID
-            vector_store_id = request.data.get("vector_store_id")
             files_data = request.data.get("files", [])
 
             if not project_id or not files_data:
@@ -43,6 +48,7 @@ class UploadFileViewSet(viewsets.ViewSet):
                                 status=status.HTTP_400_BAD_REQUEST)
 
             project = get_object_or_404(Project, id=project_id)  # Fetch project instance
+            vector_store_id = VectorStoreManager().get_vector_store_id(project.id)  # The store media uploads used
             current_user = request.user  # Get logged-in user
 
             project_files = [
@@ -53,6 +59,7 @@ class UploadFileViewSet(viewsets.ViewSet):
                     vector_store_id=vector_store_id,  # Same for all files
                     file_name=file_data.get("filename"),
                     file_type=file_data.get("file_type"),
+                    content_hash=file_data.get("content_hash"),
                 )
                 for file_data in files_data
                 if file_data.get("filename") and file_data.get("openai_file_id")  # Ensure required fields exist
@@ -73,49 +80,68 @@ class UploadFileViewSet(viewsets.ViewSet):
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class MediaUpload(viewsets.ViewSet):
+class MediaUploadView(AsyncAPIView):
+    """Upload files to a project's vector store; the request awaits OpenAI without holding a worker thread."""
+
     parser_classes = [MultiPartParser, FormParser]
     serializer_class = UploadSerializer
 
-    @action(detail=False, methods=['post'])
-    def media(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
+        """Upload the files and return their results, or queue an upload job when ``async`` is set."""
+        data = await self.request_data()
         files = request.FILES.getlist("file")  # Get multiple files
-        openai_service = OpenAIService()
 
         if not files:
             return Response({"error": "At least one file is required"}, status=status.HTTP_400_BAD_REQUEST)
+        project_id = data.get("project")  # Files go to this project's vector store
+        if not project_id:
+            return Response({"error": "Project ID is required."}, status=status.HTTP_400_BAD_REQUEST)
+        project = await aget_object_or_404(Project, id=project_id)
+
+        if str(data.get("async", "")).lower() in ("1", "true"):
+            return await sync_to_async(self._enqueue_upload_job)(request, project, files)
+
+        # Execute parallel file uploads on the process-wide, bounded upload pool
+        try:
+            uploaded_files = await aupload_files(request.user.pk, project.id, files)
+        except UploadQueueFull as e:
+            return Response({"error": "Upload queue is full, please retry later."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(e.retry_after)})
+
+        cache_hits = sum(result["cached"] for result in uploaded_files)
+        return Response({"data": uploaded_files, "cache_hits": cache_hits}, status=status.HTTP_201_CREATED)
+
+    def _enqueue_upload_job(self, request, project, files):
+        """Store the files, hand them to a Celery worker and return the job id straight away."""
+        invalid_files = [file.name for file in files if file.name.rsplit(".", 1)[-1].lower() not in ALLOWED_EXTENSIONS]
+        if invalid_files:
+            return Response({"error": f"Invalid file type: {', '.join(invalid_files)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            job = UploadJob.objects.create(project=project, created_by=request.user)
+            for file in files:
+                UploadJobFile.objects.create(
+                    job=job,
+                    file=file,
+                    file_name=file.name,
+                    file_type=file.name.rsplit(".", 1)[-1].lower(),
+                    content_hash=get_content_hash(file),
+                )
+            transaction.on_commit(lambda: process_upload_job.delay(str(job.id)))
+
+        return Response({"job_id": job.id, "status": job.status}, status=status.HTTP_202_ACCEPTED)
+
+
+class MediaUpload(viewsets.ViewSet):
+    serializer_class = UploadSerializer
+
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[^/.]+)')
+    def job(self, request, job_id=None):
+        """Return an upload job's status and per-file progress."""
+        job = get_object_or_404(UploadJob.objects.prefetch_related("files"), id=job_id, created_by=request.user)
+        return Response(UploadJobSerializer(job).data, status=status.HTTP_200_OK)
 
-        uploaded_files = []  # Store results
-
-        def process_file(file):
-            file_path = f"/tmp/{file.name}"
-            with open(file_path, "wb") as temp_file:
-                for chunk in file.chunks():
-                    temp_file.write(chunk)
-
-            try:
-                openai_file = openai_service.upload_file(file_path)
-                os.remove(file_path)
-                # Convert VectorStoreFile object to dictionary# Cleanup
-                openai_file_dict = {
-                    "id": openai_file.id,
-                    "created_at": openai_file.created_at,
-                    "last_error": openai_file.last_error,
-                    "object": openai_file.object,
-                    "status": openai_file.status,
-                    "usage_bytes": openai_file.usage_bytes,
-                    "vector_store_id": openai_file.vector_store_id,
-                }
-                return {"filename": file.name, "data": openai_file_dict}
-            except Exception as e:
-                return {"filename": file.name, "error": str(e)}
-
-        # Execute parallel file uploads
-        with ThreadPoolExecutor() as executor:
-
-            uploaded_files = list(executor.map(process_file, files))
-
-        return Response({"data": uploaded_files}, status=status.HTTP_201_CREATED)
 
 class FileFetchView(viewsets.ModelViewSet):
     # queryset = ProjectFile.objects.all()
@@ -132,6 +158,45 @@ class FileFetchView(viewsets.ModelViewSet):
         serializer = FetchFileSerializer(project_file)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def create_version(self, request, pk=None):
+        """Upload an updated copy of a ProjectFile and re-process only the segments that changed"""
+        previous = get_object_or_404(ProjectFile.objects.select_related("project"), id=pk)
+        file = request.FILES.get("file")
+        if not file:
+            return Response({"error": "A file is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if file.name.rsplit(".", 1)[-1].lower() != previous.file_type:
+            return Response({"error": f"A new version must also be a {previous.file_type} file."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            segments = parse_file_version(previous, file)  # Before the upload, so a bad file leaves nothing behind
+        except Exception as e:
+            logger.error(f"Could not parse version of {previous.file_name}: {e}")
+            return Response({"error": f"Could not parse {file.name}: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            (result,) = upload_files(request.user.pk, previous.project_id, [file])
+        except UploadQueueFull as e:
+            return Response({"error": "Upload queue is full, please retry later."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(e.retry_after)})
+        if "error" in result:
+            return Response({"error": result["error"]}, status=status.HTTP_502_BAD_GATEWAY)
+
+        project_file, diff = create_file_version(previous, file, segments, result, request.user)
+        if diff.recomputed:
+            # Reused segments already carry their embeddings and QA results
+            embed_file_segments.delay(str(project_file.id))
+            if has_review(previous):
+                review_file_segments.delay(str(project_file.id))
+        return Response({"file": FetchFileSerializer(project_file).data, "segments": diff.as_dict()},
+                        status=status.HTTP_201_CREATED)
+
+    def review(self, request, pk=None):
+        """Queue LQA of a ProjectFile's segments that have no QA result yet"""
+        project_file = get_object_or_404(ProjectFile, id=pk)
+        review_file_segments.delay(str(project_file.id))
+        return Response({"file": project_file.id, "status": "queued"}, status=status.HTTP_202_ACCEPTED)
+
     def get_by_project(self, request, project_id):
         """Fetch all ProjectFile records by project_id"""
         project_files = ProjectFile.objects.filter(project_id=project_id)
@@ -140,4 +205,23 @@ class FileFetchView(viewsets.ModelViewSet):
                             status=status.HTTP_404_NOT_FOUND)
 
         serializer = FetchFileSerializer(project_files, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class HybridSearchView(viewsets.ViewSet):
+    """Search segments or the translation memory by keywords and meaning at once."""
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = HybridSearchSerializer
+
+    def search(self, request):
+        """Return segments or stored translations matching a query by words, trigrams and embedding, best first."""
+        serializer = HybridSearchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        matches = hybrid_search.search(
+            data["query"], corpus=data["corpus"], k=data["k"], lexical_weight=data.get("lexical_weight"),
+            vector_weight=data.get("vector_weight"), project=data.get("project"), ef_search=data.get("ef_search"),
+        )
+        return Response({"results": [match.as_dict() for match in matches]}, status=status.HTTP_200_OK)
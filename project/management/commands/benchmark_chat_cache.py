@@ -0,0 +1,58 @@
+"""Benchmark chat replies served from the reply cache against replies fetched from OpenAI."""
+
+import statistics
+import time
+from unittest.mock import patch
+
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from openai import OpenAI
+
+from openai_app.services.client import OpenAIClient
+from openai_app.services.response_cache import ResponseCache
+from openai_app.services.services import OpenAIService
+from openai_app.utils.stub_server import StubOpenAIServer
+
+
+class Command(BaseCommand):
+    """Ask a local stub ``--prompts`` distinct LQA prompts twice: the first pass misses, the second hits."""
+
+    help = 'Compare reply latency for cache misses and cache hits of the chat reply cache.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--prompts', type=int, default=200)
+        parser.add_argument('--latency', type=float, default=0.2, help='Seconds the stub spends per request.')
+        parser.add_argument('--redis', action='store_true', help='Keep the replies in REDIS_URL.')
+
+    def handle(self, *args, **options):
+        """Time both passes and print latency percentiles."""
+        redis_client = redis.Redis.from_url(settings.REDIS_URL) if options['redis'] else None
+        response_cache = ResponseCache(ttl=600, max_entries=options['prompts'], redis_client=redis_client,
+                                       key_prefix=f'benchmark:{time.time_ns()}')
+        prompts = [
+            [{'role': 'system', 'content': 'You are a translation quality reviewer.'},
+             {'role': 'user', 'content': f'Review segment {index}: "Drücken Sie die Taste", "Press the button".'}]
+            for index in range(options['prompts'])
+        ]
+        passes = {}
+        with StubOpenAIServer(latency=options['latency']) as stub, \
+                patch.object(OpenAIClient, '_client', OpenAI(api_key='stub', base_url=stub.base_url, max_retries=0)), \
+                patch('openai_app.services.services.get_response_cache', return_value=response_cache):
+            for label in ('miss', 'hit'):
+                latencies = []
+                for messages in prompts:
+                    service = OpenAIService()
+                    started = time.perf_counter()
+                    service.generate_response(messages)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                passes[label] = latencies
+
+        self.stdout.write(f"Replies kept in {'Redis' if redis_client else 'process memory'}")
+        self.stdout.write(f"{'pass':<6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for label, latencies in passes.items():
+            percentiles = statistics.quantiles(latencies, n=20)
+            self.stdout.write(
+                f'{label:<6} {statistics.median(latencies):>8.2f} {percentiles[18]:>8.2f} {max(latencies):>8.2f}'
+            )
@@ -0,0 +1,49 @@
+"""Benchmark time to first token of streamed chat replies against waiting for the whole reply."""
+
+import statistics
+import time
+from unittest.mock import patch
+
+from django.core.management.base import BaseCommand
+from openai import OpenAI
+
+from openai_app.services.client import OpenAIClient
+from openai_app.services.services import OpenAIService
+from openai_app.utils.stub_server import StubOpenAIServer
+
+
+class Command(BaseCommand):
+    """Ask a local stub that emits one word per ``--token-delay`` for the same reply, blocking and streamed."""
+
+    help = 'Compare what users wait for: the full reply, or the first streamed token.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--words', type=int, default=300)
+        parser.add_argument('--token-delay', type=float, default=0.01, help='Seconds the stub spends per token.')
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        """Time both modes and print median seconds."""
+        messages = [{'role': 'user', 'content': 'word ' * options['words']}]
+        blocking, first_token, streamed = [], [], []
+        with StubOpenAIServer(token_delay=options['token_delay']) as stub, \
+                patch.object(OpenAIClient, '_client', OpenAI(api_key='stub', base_url=stub.base_url, max_retries=0)):
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                OpenAIService().generate_response(messages, cache=False)
+                blocking.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                pieces = OpenAIService().stream_response(messages)
+                next(pieces)
+                first_token.append(time.perf_counter() - started)
+                for _ in pieces:
+                    pass
+                streamed.append(time.perf_counter() - started)
+
+        self.stdout.write(f"{'mode':<10} {'first token s':>14} {'full reply s':>13}")
+        self.stdout.write(f"{'blocking':<10} {statistics.median(blocking):>14.2f} {statistics.median(blocking):>13.2f}")
+        self.stdout.write(
+            f"{'streamed':<10} {statistics.median(first_token):>14.2f} {statistics.median(streamed):>13.2f}"
+        )
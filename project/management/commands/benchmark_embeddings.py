@@ -0,0 +1,78 @@
+"""Benchmark batched segment embedding against one API call per text."""
+
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from openai import OpenAI
+
+from openai_app.services.client import OpenAIClient
+from openai_app.services.embeddings import EmbeddingService
+from openai_app.utils.stub_server import StubOpenAIServer
+from project.management.commands.benchmark_segment_ingest import synthetic_segments
+from project.models import Project, ProjectFile
+from project.services.embeddings import embed_project_file
+from project.services.segments import ingest_segments
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Embed a file's segments through a local stub with per-call latency; every write is rolled back.
+
+    The same content is embedded without the cache, with an empty cache and again with the
+    cache filled by the previous run.
+    """
+
+    help = 'Compare one-call-per-text, batched and cached embedding of a large file.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--segments', type=int, default=50_000)
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds the stub spends per request.')
+        parser.add_argument('--per-text-sample', type=int, default=200,
+                            help='Texts embedded one call each; the full file time is extrapolated from them.')
+
+    def handle(self, *args, **options):
+        """Time each approach against the same stub and print a summary table."""
+        if not User.objects.exists():
+            raise CommandError('Create a user first; the benchmark project needs an owner.')
+        segments = list(synthetic_segments(options['segments']))
+        with StubOpenAIServer(latency=options['latency']) as stub, \
+                patch.object(OpenAIClient, '_client', OpenAI(api_key='stub', base_url=stub.base_url, max_retries=0)):
+            sample = [source for _, source, _, _ in segments[:options['per_text_sample']]]
+            started = time.perf_counter()
+            for text in sample:
+                EmbeddingService(cache=False).embed_one(text)
+            per_text = (time.perf_counter() - started) / len(sample) * len(segments)
+            service = EmbeddingService()
+
+            results = []
+            with transaction.atomic():
+                project = Project.objects.create(
+                    name=f'benchmark-{time.time_ns()}', client_name=f'benchmark-{time.time_ns()}',
+                    created_by=User.objects.first(),
+                )
+                runs = [('batched, no cache', EmbeddingService(cache=False)),
+                        ('batched, cold cache', service), ('batched, warm cache', service)]
+                for label, run_service in runs:
+                    project_file = ProjectFile.objects.create(
+                        project=project, openai_file_id='file-benchmark', file_name='benchmark.sdlxliff',
+                        file_type='sdlxliff',
+                    )
+                    ingest_segments(project_file, segments)
+                    calls_before = len(stub.requests)
+                    started = time.perf_counter()
+                    count = embed_project_file(project_file, run_service)
+                    results.append((label, count, len(stub.requests) - calls_before, time.perf_counter() - started))
+                transaction.set_rollback(True)
+
+        self.stdout.write(f"{'approach':<24} {'segments':>9} {'calls':>7} {'seconds':>9} {'segments/s':>11}")
+        self.stdout.write(
+            f"{'one call per text (est.)':<24} {len(segments):>9} {len(segments):>7} {per_text:>9.1f} "
+            f"{len(segments) / per_text:>11.0f}"
+        )
+        for label, count, calls, elapsed in results:
+            self.stdout.write(f"{label:<24} {count:>9} {calls:>7} {elapsed:>9.1f} {count / elapsed:>11.0f}")
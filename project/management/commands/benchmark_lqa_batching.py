@@ -0,0 +1,76 @@
+"""Benchmark LQA review throughput and token cost with segments packed per request against one at a time."""
+
+import time
+from unittest.mock import patch
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from openai import OpenAI
+
+from openai_app.services.client import OpenAIClient
+from openai_app.services.lqa import LQABatchEngine, LQASegment
+from openai_app.utils.stub_server import StubOpenAIServer
+from project.management.commands.benchmark_offline_pipeline import synthetic_sentences
+
+
+def synthetic_segments(rng, count):
+    """Return ``count`` segments whose targets are shuffled sources; some drop their digits or are left empty."""
+    segments = []
+    for index, source in enumerate(synthetic_sentences(rng, count)):
+        words = source.rstrip('.').split()
+        rng.shuffle(words)
+        target = ' '.join(words) + '.'
+        if index % 7 == 3:
+            target = ''.join(char for char in target if not char.isdigit())
+        elif index % 11 == 5:
+            target = ''
+        segments.append(LQASegment(str(index), source, target))
+    return segments
+
+
+class Command(BaseCommand):
+    """Review ``--segments`` synthetic segments against a local stub, one segment per request and packed.
+
+    The reply cache is bypassed so that both modes pay for every request. With ``--drop`` the
+    stub returns at most that many results per reply, which exercises re-splitting.
+    """
+
+    help = 'Compare segments/sec and tokens per segment of batched LQA prompts with one request per segment.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--segments', type=int, default=400)
+        parser.add_argument('--latency', type=float, default=0.5, help='Seconds the stub spends per request.')
+        parser.add_argument('--token-delay', type=float, default=0.0005, help='Seconds the stub spends per word.')
+        parser.add_argument('--token-budget', type=int, default=8000)
+        parser.add_argument('--max-segments', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--drop', type=int, default=None, help='Results the stub returns per reply at most.')
+
+    def handle(self, *args, **options):
+        """Run both modes against a fresh stub and print a summary table."""
+        segments = synthetic_segments(np.random.default_rng(0), options['segments'])
+        modes = (
+            ('one at a time', LQABatchEngine(max_segments=1, max_concurrency=options['concurrency'])),
+            ('batched', LQABatchEngine(token_budget=options['token_budget'], max_segments=options['max_segments'],
+                                       max_concurrency=options['concurrency'])),
+        )
+        self.stdout.write(
+            f"{'mode':<14} {'requests':>9} {'resplits':>9} {'failed':>7} {'seconds':>8} {'segments/s':>11} "
+            f"{'prompt tok/seg':>15} {'completion tok/seg':>19}"
+        )
+        for label, engine in modes:
+            with StubOpenAIServer(latency=options['latency'], token_delay=options['token_delay'],
+                                  lqa_max_items=options['drop']) as stub, \
+                    patch('openai_app.services.services.get_response_cache', return_value=None):
+                client = OpenAI(api_key='stub', base_url=stub.base_url, max_retries=0)
+                with patch.object(OpenAIClient, '_client', client):
+                    started = time.perf_counter()
+                    engine.review(segments)
+                    elapsed = time.perf_counter() - started
+            stats = engine.stats
+            self.stdout.write(
+                f'{label:<14} {stats.requests:>9} {stats.resplits:>9} {stats.failed:>7} {elapsed:>8.2f} '
+                f'{stats.segments / elapsed:>11.1f} {stats.prompt_tokens / stats.segments:>15.1f} '
+                f'{stats.completion_tokens / stats.segments:>19.1f}'
+            )
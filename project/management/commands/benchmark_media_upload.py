@@ -0,0 +1,96 @@
+"""Benchmark the media upload path against a local OpenAI stub."""
+
+import io
+import os
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.core.management.base import BaseCommand
+from openai import OpenAI
+
+from openai_app.services.client import OpenAIClient
+from openai_app.services.services import OpenAIService
+from openai_app.utils.stub_server import StubOpenAIServer
+
+MB = 1024 * 1024
+
+
+def disk_bytes_written():
+    """Return bytes this process has caused to be written to storage, or None off Linux."""
+    try:
+        with open('/proc/self/io') as io_stats:
+            for line in io_stats:
+                if line.startswith('write_bytes:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def make_upload(name, size):
+    """Build the upload object Django's default handlers would hand to the view."""
+    payload = os.urandom(size)
+    if size <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        return InMemoryUploadedFile(io.BytesIO(payload), 'file', name, 'application/octet-stream', size, None)
+    upload = TemporaryUploadedFile(name, 'application/octet-stream', size, None)
+    upload.write(payload)
+    upload.flush()
+    return upload
+
+
+def legacy_upload(service, file):
+    """Reproduce the previous behaviour: copy to /tmp, reopen, upload, delete."""
+    file_path = f"/tmp/{file.name}"
+    with open(file_path, "wb") as temp_file:
+        for chunk in file.chunks():
+            temp_file.write(chunk)
+    with open(file_path, "rb") as temp_file:
+        response = service.client.files.create(file=temp_file, purpose="user_data")
+        service.client.vector_stores.files.create(vector_store_id="vs_benchmark", file_id=response.id)
+    os.remove(file_path)
+
+
+def streaming_upload(service, file):
+    """Stream the file from its handle and attach it with a file batch, as the upload flow does."""
+    service.attach_files('vs_benchmark', [service.create_file(file).id])
+
+
+class Command(BaseCommand):
+    """Compare disk bytes written and wall time per MB for the legacy and streaming upload paths."""
+
+    help = 'Benchmark /tmp spooling against streaming uploads using a local OpenAI stub.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--sizes-mb', nargs='+', type=float, default=[1, 8, 32, 128])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        """Run both upload paths for each file size and print a summary table."""
+        with StubOpenAIServer() as stub:
+            OpenAIClient._client = OpenAI(api_key='stub', base_url=stub.base_url)
+            service = OpenAIService()
+            streaming_upload(service, make_upload('warmup.sdlxliff', 1024))  # Open the connection
+            paths = {
+                'legacy /tmp copy': lambda file: legacy_upload(service, file),
+                'streaming': lambda file: streaming_upload(service, file),
+            }
+            self.stdout.write(f"{'path':<18} {'size MB':>8} {'s/MB':>10} {'disk bytes/MB':>14}")
+            for size_mb in options['sizes_mb']:
+                size = int(size_mb * MB)
+                for label, upload in paths.items():
+                    elapsed, written = 0.0, 0
+                    for index in range(options['repeat']):
+                        file = make_upload(f'benchmark-{index}.sdlxliff', size)
+                        before = disk_bytes_written()
+                        started = time.perf_counter()
+                        upload(file)
+                        elapsed += time.perf_counter() - started
+                        after = disk_bytes_written()
+                        written += (after - before) if before is not None else 0
+                        file.close()
+                    total_mb = size_mb * options['repeat']
+                    self.stdout.write(
+                        f'{label:<18} {size_mb:>8g} {elapsed / total_mb:>10.4f} {written / total_mb:>14.0f}'
+                    )
+        OpenAIClient._client = None
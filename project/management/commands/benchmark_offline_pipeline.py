@@ -0,0 +1,101 @@
+"""Benchmark segment ingest, embedding and hybrid search end to end with an offline embedding backend."""
+
+import statistics
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from openai_app.services.embedding_backends import get_embedding_backend
+from openai_app.services.embeddings import EmbeddingService
+from project.models import Project, ProjectFile, TranslationSegment
+from project.services.embeddings import embed_project_file
+from project.services.hybrid_search import search_vector
+from project.services.segments import ingest_segments
+
+User = get_user_model()
+
+
+def synthetic_sentences(rng, count, vocabulary=5000, length=(6, 18)):
+    """Return ``count`` sentences of random pseudo-words, some with a product code, so texts differ."""
+    syllables = np.array(['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'to', 'vi', 'ze', 'pa', 'do', 'fi'])
+    words = [''.join(rng.choice(syllables, size=rng.integers(2, 5))) for _ in range(vocabulary)]
+    sentences = []
+    for index in range(count):
+        sentence = [words[word] for word in rng.zipf(1.3, size=rng.integers(*length)) % vocabulary]
+        if index % 5 == 0:
+            sentence.insert(int(rng.integers(len(sentence))), f'PX-{rng.integers(10_000):04d}')
+        sentences.append(' '.join(sentence).capitalize() + '.')
+    return sentences
+
+
+class Command(BaseCommand):
+    """Run ingest, embedding (which maintains the vector indexes) and search for one synthetic file.
+
+    Queries are four-word excerpts of stored segments; a hit is the source segment ranking in
+    the top ``k``. Everything runs locally with the chosen backend and is rolled back.
+    """
+
+    help = 'Time the ingest, embed and search pipeline with an offline embedding backend.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--segments', type=int, default=20_000)
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--backend', default='openai_app.services.embedding_backends.HashingBackend',
+                            help='Dotted path of the embedding backend class.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Run each stage on the same data and print a summary table."""
+        if not User.objects.exists():
+            raise CommandError('Create a user first; the benchmark project needs an owner.')
+        rng = np.random.default_rng(options['seed'])
+        sources = synthetic_sentences(rng, options['segments'])
+        segments = [(f'unit-{index}', source, '', 'New') for index, source in enumerate(sources)]
+        service = EmbeddingService(backend=get_embedding_backend(options['backend']), cache=False)
+        k = options['k']
+
+        with transaction.atomic():
+            project = Project.objects.create(
+                name=f'benchmark-{time.time_ns()}', client_name=f'benchmark-{time.time_ns()}',
+                created_by=User.objects.first(),
+            )
+            project_file = ProjectFile.objects.create(
+                project=project, openai_file_id='file-benchmark', file_name='benchmark.xliff', file_type='xliff',
+            )
+            started = time.perf_counter()
+            ingest_segments(project_file, segments)
+            ingested = time.perf_counter() - started
+
+            started = time.perf_counter()
+            embedded = embed_project_file(project_file, service)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(TranslationSegment._meta.db_table)}')
+            embedding = time.perf_counter() - started
+
+            ids = dict(project_file.segments.values_list('segment_id', 'id'))
+            latencies, hits = [], 0
+            for index in rng.integers(len(segments), size=options['queries']):
+                words = sources[index].split()
+                start = int(rng.integers(max(1, len(words) - 3)))
+                query = ' '.join(words[start:start + 4])
+                started = time.perf_counter()
+                matches = search_vector(query, service.embed_one(query), 'segments', k, project=project.id)
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits += ids[f'unit-{index}'] in {match.id for match in matches}
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'Backend {service.model}, {connection.vendor}')
+        self.stdout.write(f"{'stage':<8} {'items':>8} {'seconds':>9} {'items/s':>9}")
+        for stage, count, elapsed in [('ingest', len(segments), ingested), ('embed', embedded, embedding)]:
+            self.stdout.write(f'{stage:<8} {count:>8} {elapsed:>9.2f} {count / elapsed:>9.0f}')
+        percentiles = statistics.quantiles(latencies, n=20)
+        self.stdout.write(
+            f'search: {len(latencies)} queries, p50 {statistics.median(latencies):.1f} ms, '
+            f'p95 {percentiles[18]:.1f} ms, hit@{k} {hits / len(latencies):.3f}'
+        )
@@ -0,0 +1,74 @@
+"""Benchmark OpenAI call throughput against a rate-limited local stub."""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from openai import OpenAI
+
+from openai_app.services.rate_limit import RateLimitedClient, TokenBucketLimiter
+from openai_app.utils.stub_server import StubOpenAIServer
+
+
+class Command(BaseCommand):
+    """Compare unpaced calls, SDK retries, backoff alone and token-bucket pacing under a simulated rate limit."""
+
+    help = 'Benchmark chat completion throughput against a local OpenAI stub that answers 429s past its rate.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--rate', type=float, default=50, help='Requests per second the stub accepts.')
+        parser.add_argument('--latency', type=float, default=0.02, help='Seconds the stub spends per request.')
+        parser.add_argument('--redis', action='store_true', help='Keep the token buckets in REDIS_URL.')
+
+    def handle(self, *args, **options):
+        """Run every strategy against a fresh stub and print a summary table."""
+        logging.getLogger('openai_app.services.rate_limit').setLevel(logging.ERROR)  # Silence per-retry warnings
+        redis_client = redis.Redis.from_url(settings.REDIS_URL) if options['redis'] else None
+        strategies = {
+            'no retry': lambda url: OpenAI(api_key='stub', base_url=url, max_retries=0),
+            'sdk retries': lambda url: OpenAI(api_key='stub', base_url=url, max_retries=2),
+            'backoff only': lambda url: self.rate_limited_client(url, TokenBucketLimiter(0, 0)),
+            'paced + backoff': lambda url: self.rate_limited_client(
+                url, TokenBucketLimiter(options['rate'] * 60, 0, redis_client, burst_seconds=1,
+                                        key_prefix=f'benchmark:{time.time_ns()}')
+            ),
+        }
+        self.stdout.write(f"{'strategy':<16} {'ok':>6} {'failed':>7} {'429s':>6} {'seconds':>8} {'ok/s':>8}")
+        for label, make_client in strategies.items():
+            with StubOpenAIServer(latency=options['latency'], requests_per_second=options['rate']) as stub:
+                client = make_client(stub.base_url)
+                started = time.perf_counter()
+                with ThreadPoolExecutor(options['threads']) as pool:
+                    outcomes = list(pool.map(lambda index: self.call(client, index), range(options['requests'])))
+                elapsed = time.perf_counter() - started
+                succeeded = sum(outcomes)
+                self.stdout.write(
+                    f'{label:<16} {succeeded:>6} {len(outcomes) - succeeded:>7} {stub.rate_limited:>6} '
+                    f'{elapsed:>8.2f} {succeeded / elapsed:>8.1f}'
+                )
+
+    @staticmethod
+    def rate_limited_client(base_url, limiter):
+        """Wrap an SDK client without its own retries in the shared retry policy."""
+        return RateLimitedClient(
+            OpenAI(api_key='stub', base_url=base_url, max_retries=0), limiter,
+            max_retries=settings.OPENAI_MAX_RETRIES, base_delay=0.05, max_delay=settings.OPENAI_RETRY_MAX_DELAY,
+        )
+
+    @staticmethod
+    def call(client, index):
+        """Send one chat completion and return whether it succeeded."""
+        try:
+            client.chat.completions.create(
+                model='gpt-4-turbo', messages=[{'role': 'user', 'content': f'Segment {index}'}], max_tokens=16
+            )
+            return True
+        except openai.APIError:
+            return False
@@ -0,0 +1,53 @@
+"""Benchmark a parse-cache hit against parsing the file again."""
+
+import hashlib
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from project.management.commands.benchmark_xliff_parser import write_sdlxliff
+from project.services.parse_cache import ParseCache
+
+MB = 1024 * 1024
+
+
+def file_hash(path):
+    """Return the SHA-256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(MB), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    """Time a cold parse, a cache hit, and a cache hit that decodes every segment."""
+
+    help = 'Benchmark parse-cache reads against re-parsing a generated SDLXLIFF file.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--sizes-mb', nargs='+', type=float, default=[10, 100])
+
+    def handle(self, *args, **options):
+        """Parse each file size once through the cache, read it back and print a summary table."""
+        self.stdout.write(f"{'size MB':>8} {'segments':>10} {'parse ms':>10} {'hit ms':>8} {'hit + decode ms':>16}")
+        for size_mb in options['sizes_mb']:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'benchmark.sdlxliff')
+                write_sdlxliff(path, int(size_mb * MB))
+                cache = ParseCache(os.path.join(directory, 'cache'), max_bytes=10 * 1024 * MB)
+                content_hash = file_hash(path)
+
+                started = time.perf_counter()
+                batch = cache.get_or_parse(content_hash, 'sdlxliff', path)
+                parse_ms = (time.perf_counter() - started) * 1000
+
+                started = time.perf_counter()
+                batch = cache.get_or_parse(content_hash, 'sdlxliff', path)
+                hit_ms = (time.perf_counter() - started) * 1000
+                count = sum(1 for _ in batch)
+                decode_ms = (time.perf_counter() - started) * 1000
+                self.stdout.write(f'{size_mb:>8g} {count:>10} {parse_ms:>10.0f} {hit_ms:>8.2f} {decode_ms:>16.0f}')
@@ -0,0 +1,63 @@
+"""Benchmark parsing a multi-file batch across a growing number of worker processes."""
+
+import multiprocessing
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from project.management.commands.benchmark_xliff_parser import write_sdlxliff
+from project.parsers.batches import iter_file_segments, parse_to_batch
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    """Report wall time and speedup over one process for each pool size, plus pickled result sizes."""
+
+    help = 'Benchmark process-pool SDLXLIFF parsing speedup versus worker count.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--files', type=int, default=8)
+        parser.add_argument('--size-mb', type=float, default=8)
+        parser.add_argument('--workers', nargs='+', type=int,
+                            default=sorted({1, 2, 4, os.cpu_count() or 1}))
+
+    def handle(self, *args, **options):
+        """Generate the files, parse them with each pool size and print a summary table."""
+        context = multiprocessing.get_context('spawn')
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, f'file-{index}.sdlxliff') for index in range(options['files'])]
+            for path in paths:
+                write_sdlxliff(path, int(options['size_mb'] * MB))
+
+            results = {
+                'tuples': list(iter_file_segments(paths[0], 'sdlxliff')),
+                'columnar batch': parse_to_batch(paths[0], 'sdlxliff'),
+            }
+            for label, result in results.items():
+                started = time.perf_counter()
+                data = pickle.dumps(result)
+                pickle.loads(data)
+                self.stdout.write(
+                    f"One file's {len(result)} segments as {label}: {len(data) / MB:.2f} MB pickled, "
+                    f"{(time.perf_counter() - started) * 1000:.1f} ms to pickle and unpickle."
+                )
+            self.stdout.write(f'{os.cpu_count()} cores available.')
+            self.stdout.write(f"{'workers':>7} {'seconds':>9} {'speedup':>8} {'segments/s':>12}")
+            baseline = None
+            for workers in options['workers']:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                    list(pool.map(time.sleep, [0.2] * workers))  # Start every worker before timing
+                    started = time.perf_counter()
+                    batches = list(pool.map(parse_to_batch, paths, ['sdlxliff'] * len(paths)))
+                    elapsed = time.perf_counter() - started
+                baseline = baseline or elapsed
+                segments = sum(len(batch) for batch in batches)
+                self.stdout.write(
+                    f'{workers:>7} {elapsed:>9.2f} {baseline / elapsed:>8.2f} {segments / elapsed:>12.0f}'
+                )
@@ -0,0 +1,91 @@
+"""Benchmark index size and recall of quantized vector search against the full-precision HNSW index."""
+
+import statistics
+import time
+
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from openai_app.models import TranslationEmbedding
+from openai_app.services.vector_search import nearest_translations
+from openai_app.vector_indexes import HNSW_INDEX_NAME, QUANTIZATION_MODES, QUANTIZED_INDEX_NAMES
+from project.management.commands import benchmark_vector_search
+from project.management.commands.benchmark_vector_search import DIMENSIONS, synthetic_vectors
+
+
+class Command(BaseCommand):
+    """Search the synthetic vector corpus with each index and compare against exact neighbours.
+
+    The table keeps the full vectors for reranking whatever the mode, so its size is shared;
+    the indexes are what shrink. Generated rows are kept for reuse by the other vector benchmarks.
+    """
+
+    help = 'Report index size, recall@k and latency of full, halfvec and binary quantized searches.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--ef-search', type=int, default=40)
+        parser.add_argument('--rerank-factor', nargs='+', type=int, default=[4, 10, 20])
+        parser.add_argument('--clusters', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Load the corpus and quantized indexes, compute exact neighbours and print a table per mode."""
+        if connection.vendor != 'postgresql':
+            raise CommandError('pgvector indexes need PostgreSQL.')
+        rng = np.random.default_rng(options['seed'])
+        centers = rng.normal(0, 1, (options['clusters'], DIMENSIONS))
+        modes = list(QUANTIZED_INDEX_NAMES)
+        benchmark_vector_search.Command(stdout=self.stdout).load_corpus(
+            rng, centers, options['rows'], quantization=modes
+        )
+        sizes = self.relation_sizes()
+        if any(name not in sizes for name in QUANTIZED_INDEX_NAMES.values()):
+            call_command('rebuild_vector_indexes', quantization=modes, stdout=self.stdout)
+            sizes = self.relation_sizes()
+        queries = synthetic_vectors(rng, centers, options['queries'])
+        k = options['k']
+
+        self.stdout.write('Computing exact neighbours with a sequential scan...')
+        exact = []
+        for query in queries:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('enable_indexscan', 'off', true)")
+                exact.append({row.pk for row in nearest_translations(query, k, mode='full')})
+
+        self.stdout.write(f"Table with full vectors: {sizes['table'] / 1024 ** 2:.0f} MB")
+        self.stdout.write(
+            f"{'mode':<8} {'rerank':>6} {'index MB':>9} {'recall@' + str(k):>10} {'p50 ms':>8} {'p95 ms':>8}"
+        )
+        index_names = {'full': HNSW_INDEX_NAME, **QUANTIZED_INDEX_NAMES}
+        for mode in QUANTIZATION_MODES:
+            for factor in [1] if mode == 'full' else options['rerank_factor']:
+                recalls, latencies = [], []
+                for query, expected in zip(queries, exact):
+                    started = time.perf_counter()
+                    found = nearest_translations(
+                        query, k, ef_search=options['ef_search'], mode=mode, rerank_factor=factor
+                    )
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    recalls.append(len({row.pk for row in found} & expected) / k)
+                percentiles = statistics.quantiles(latencies, n=20)
+                self.stdout.write(
+                    f'{mode:<8} {factor:>6} {sizes[index_names[mode]] / 1024 ** 2:>9.0f} '
+                    f'{statistics.mean(recalls):>10.3f} {statistics.median(latencies):>8.2f} {percentiles[18]:>8.2f}'
+                )
+
+    def relation_sizes(self):
+        """Return the on-disk size in bytes of the table (``"table"``) and of each of its indexes, by name."""
+        table = TranslationEmbedding._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 'table', pg_table_size(%s::regclass) UNION ALL "
+                "SELECT indexname, pg_relation_size(indexname::regclass) FROM pg_indexes WHERE tablename = %s",
+                [table, table],
+            )
+            return dict(cursor.fetchall())
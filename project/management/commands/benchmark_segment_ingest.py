@@ -0,0 +1,60 @@
+"""Benchmark loading TranslationSegment rows with COPY against bulk_create."""
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from project.models import Project, ProjectFile
+from project.services.segments import bulk_create_rows, copy_rows, segment_rows
+
+User = get_user_model()
+
+
+def synthetic_segments(count):
+    """Yield ``count`` SDLXLIFF-like segments."""
+    for index in range(count):
+        yield (
+            f"unit-{index // 3}:{index}",
+            f"Press Save to keep the {index}th change.\tTabs and\nnew lines are escaped.",
+            f"Klicken Sie auf Speichern, um die {index}. Änderung zu behalten.",
+            "Translated",
+        )
+
+
+class Command(BaseCommand):
+    """Time both insert paths for the same segments; every write is rolled back afterwards."""
+
+    help = 'Compare PostgreSQL COPY with batched bulk_create for TranslationSegment ingestion.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--segments', type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        """Load the segments once per path inside a rolled back transaction and print a summary table."""
+        paths = {'bulk_create': bulk_create_rows}
+        if connection.vendor == 'postgresql':
+            paths['COPY'] = copy_rows
+        else:
+            self.stderr.write(f'COPY needs PostgreSQL; {connection.vendor} only runs bulk_create.')
+        if not User.objects.exists():
+            raise CommandError('Create a user first; the benchmark project needs an owner.')
+
+        self.stdout.write(f"{'path':<12} {'segments':>10} {'seconds':>9} {'segments/s':>12}")
+        for label, load in paths.items():
+            with transaction.atomic():
+                project = Project.objects.create(
+                    name=f'benchmark-{time.time_ns()}', client_name=f'benchmark-{time.time_ns()}',
+                    created_by=User.objects.first(),
+                )
+                project_file = ProjectFile.objects.create(
+                    project=project, openai_file_id='file-benchmark', file_name='benchmark.sdlxliff',
+                    file_type='sdlxliff',
+                )
+                started = time.perf_counter()
+                count = load(segment_rows(project_file.pk, synthetic_segments(options['segments'])))
+                elapsed = time.perf_counter() - started
+                transaction.set_rollback(True)
+            self.stdout.write(f'{label:<12} {count:>10} {elapsed:>9.2f} {count / elapsed:>12.0f}')
@@ -0,0 +1,66 @@
+"""Benchmark upstream chat calls made by bursts of identical requests, with and without coalescing."""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.core.management.base import BaseCommand
+from openai import OpenAI
+
+from openai_app.services.client import OpenAIClient
+from openai_app.services.services import OpenAIService
+from openai_app.services.single_flight import SingleFlight
+from openai_app.utils.stub_server import StubOpenAIServer
+
+
+class PassThrough(SingleFlight):
+    """A coordinator that lets every call through, for the baseline."""
+
+    def do(self, key, fn, dumps=None, loads=None):
+        """Return ``fn()``."""
+        return fn()
+
+
+class Command(BaseCommand):
+    """Send ``--prompts`` distinct prompts, each requested by ``--reviewers`` threads at the same moment.
+
+    The reply cache is bypassed so that only coalescing can save calls.
+    """
+
+    help = 'Count upstream chat completions for bursts of identical requests, with and without single-flight.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--prompts', type=int, default=20)
+        parser.add_argument('--reviewers', type=int, default=8)
+        parser.add_argument('--latency', type=float, default=0.3, help='Seconds the stub spends per request.')
+
+    def handle(self, *args, **options):
+        """Run both modes against a fresh stub and print a summary table."""
+        self.stdout.write(f"{'mode':<14} {'upstream calls':>15} {'p50 s':>7} {'seconds':>8}")
+        for label, single_flight in (('no coalescing', PassThrough()), ('single-flight', SingleFlight())):
+            with StubOpenAIServer(latency=options['latency']) as stub, \
+                    patch('openai_app.services.services.get_single_flight', return_value=single_flight):
+                client = OpenAI(api_key='stub', base_url=stub.base_url, max_retries=0)
+                with patch.object(OpenAIClient, '_client', client):
+                    latencies, elapsed = self.bursts(options['prompts'], options['reviewers'])
+                calls = sum(path.endswith('/chat/completions') for _, path, _ in stub.requests)
+            self.stdout.write(f'{label:<14} {calls:>15} {statistics.median(latencies):>7.2f} {elapsed:>8.2f}')
+
+    def bursts(self, prompts, reviewers):
+        """Send each prompt from every reviewer at once; return the per-request and total seconds."""
+        latencies = []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(reviewers) as pool:
+            for index in range(prompts):
+                messages = [{'role': 'user', 'content': f'Review segment {index}.'}]
+                latencies.extend(pool.map(lambda _: self.timed(messages), range(reviewers)))
+        return latencies, time.perf_counter() - started
+
+    @staticmethod
+    def timed(messages):
+        """Request a reply, bypassing the reply cache, and return the seconds it took."""
+        started = time.perf_counter()
+        OpenAIService().generate_response(messages, cache=False)
+        return time.perf_counter() - started
@@ -0,0 +1,56 @@
+"""Benchmark translation-memory lookup latency for batches of query segments."""
+
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from openai_app.models import TranslationEmbedding
+from openai_app.services.translation_memory import lookup_vectors
+from project.management.commands import benchmark_vector_search
+from project.management.commands.benchmark_vector_search import DIMENSIONS, TAG, synthetic_vectors
+
+
+class Command(BaseCommand):
+    """Time the database stage of TM lookups: one query per batch on the synthetic vector corpus.
+
+    Query embeddings are generated, as a cached embedding would be, so only the database
+    round trip is measured. Generated rows are kept for reuse by both vector benchmarks.
+    """
+
+    help = 'Report p50/p95 latency of batched translation-memory lookups.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--batches', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--candidates', type=int, default=40)
+        parser.add_argument('--clusters', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        """Load the corpus if needed, run the lookups and print latency percentiles."""
+        if connection.vendor != 'postgresql':
+            raise CommandError('The indexed lookup needs PostgreSQL with pgvector and pg_trgm.')
+        rng = np.random.default_rng(0)
+        centers = rng.normal(0, 1, (options['clusters'], DIMENSIONS))
+        benchmark_vector_search.Command(stdout=self.stdout).load_corpus(rng, centers, options['rows'])
+        texts = list(
+            TranslationEmbedding.objects.filter(source_text__startswith=TAG)
+            .values_list('source_text', flat=True)[:options['batch_size']]
+        )
+
+        latencies = []
+        for _ in range(options['batches']):
+            embeddings = synthetic_vectors(rng, centers, len(texts))
+            started = time.perf_counter()
+            lookup_vectors(texts, embeddings, options['k'], 0.6, options['candidates'])
+            latencies.append((time.perf_counter() - started) * 1000)
+        percentiles = statistics.quantiles(latencies, n=20)
+        self.stdout.write(
+            f"{len(texts)} segments per batch, {options['rows']} rows: "
+            f'p50 {statistics.median(latencies):.1f} ms, p95 {percentiles[18]:.1f} ms'
+        )
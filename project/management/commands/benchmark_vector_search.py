@@ -0,0 +1,115 @@
+"""Benchmark HNSW recall and latency against exact search over a synthetic TranslationEmbedding corpus."""
+
+import statistics
+import time
+
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from openai_app.models import TranslationEmbedding
+from openai_app.services.vector_search import nearest_translations
+from openai_app.vector_indexes import HNSW_INDEX_NAME, IVFFLAT_INDEX_NAME, QUANTIZED_INDEX_NAMES
+from project.services.segments import CopyReader
+
+DIMENSIONS = 1536
+TAG = 'benchmark:'  # Prefix of the source text of generated rows
+
+
+def synthetic_vectors(rng, centers, count, spread=0.35):
+    """Return ``count`` unit vectors scattered around random cluster centers, like embeddings of similar texts."""
+    vectors = centers[rng.integers(len(centers), size=count)] + rng.normal(0, spread, (count, DIMENSIONS))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def vector_text(vector):
+    """Return a vector in pgvector's text format."""
+    return '[' + ','.join(map(str, np.round(vector, 6).tolist())) + ']'
+
+
+class Command(BaseCommand):
+    """Load a corpus of at least 1M vectors, then compare HNSW search at several ef_search values with exact search.
+
+    Exact neighbours come from a sequential scan with index scans disabled; recall@k is the
+    share of them HNSW returns. Generated rows are tagged and deleted afterwards unless
+    ``--keep`` is given, so later runs can reuse them.
+    """
+
+    help = 'Report recall@k and latency percentiles of HNSW searches for a range of hnsw.ef_search values.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--ef-search', nargs='+', type=int, default=[10, 20, 40, 80, 160, 320])
+        parser.add_argument('--clusters', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated rows for the next run.')
+
+    def handle(self, *args, **options):
+        """Load the corpus, compute exact neighbours, time each ef_search and print a summary table."""
+        if connection.vendor != 'postgresql':
+            raise CommandError('pgvector indexes need PostgreSQL.')
+        rng = np.random.default_rng(options['seed'])
+        centers = rng.normal(0, 1, (options['clusters'], DIMENSIONS))
+        self.load_corpus(rng, centers, options['rows'])
+        queries = synthetic_vectors(rng, centers, options['queries'])
+        k = options['k']
+
+        self.stdout.write('Computing exact neighbours with a sequential scan...')
+        exact = []
+        for query in queries:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('enable_indexscan', 'off', true)")
+                exact.append({row.pk for row in nearest_translations(query, k)})
+
+        self.stdout.write(f"{'ef_search':>9} {'recall@' + str(k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+        for ef_search in options['ef_search']:
+            recalls, latencies = [], []
+            for query, expected in zip(queries, exact):
+                started = time.perf_counter()
+                found = {row.pk for row in nearest_translations(query, k, ef_search=ef_search)}
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(len(found & expected) / k)
+            percentiles = statistics.quantiles(latencies, n=20)
+            self.stdout.write(
+                f'{ef_search:>9} {statistics.mean(recalls):>10.3f} {statistics.median(latencies):>8.2f} '
+                f'{percentiles[18]:>8.2f}'
+            )
+
+        if not options['keep']:
+            deleted, _ = TranslationEmbedding.objects.filter(source_text__startswith=TAG).delete()
+            self.stdout.write(f'Deleted {deleted} generated rows.')
+
+    def load_corpus(self, rng, centers, rows, chunk=10_000, quantization=None):
+        """Add generated rows with COPY until ``rows`` tagged rows exist, then rebuild the indexes.
+
+        The indexes are dropped while loading: building HNSW once is far faster than
+        inserting a million rows into it. ``quantization`` lists the quantized indexes to
+        rebuild, ``VECTOR_INDEX_QUANTIZATION`` by default.
+        """
+        existing = TranslationEmbedding.objects.filter(source_text__startswith=TAG).count()
+        if existing >= rows:
+            return
+        self.stdout.write(f'Loading {rows - existing} vectors...')
+        quote = connection.ops.quote_name
+        table = quote(TranslationEmbedding._meta.db_table)
+        with connection.cursor() as cursor:
+            for name in (HNSW_INDEX_NAME, IVFFLAT_INDEX_NAME, *QUANTIZED_INDEX_NAMES.values()):
+                cursor.execute(f'DROP INDEX IF EXISTS {quote(name)}')
+        now = timezone.now().isoformat()
+        for start in range(existing, rows, chunk):
+            vectors = synthetic_vectors(rng, centers, min(chunk, rows - start))
+            reader = CopyReader(
+                (f'{TAG}{start + index}', '', vector_text(vector), now) for index, vector in enumerate(vectors)
+            )
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY {table} (source_text, target_text, embedding, created_at) FROM STDIN', reader
+                )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {table}')
+        call_command('rebuild_vector_indexes', quantization=quantization, stdout=self.stdout)
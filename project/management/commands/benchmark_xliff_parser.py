@@ -0,0 +1,103 @@
+"""Benchmark the streaming XLIFF parser on a generated SDLXLIFF file."""
+
+import multiprocessing
+import os
+import tempfile
+import time
+from xml.etree import ElementTree
+
+from django.core.management.base import BaseCommand
+
+from project.parsers.xliff import parse_xliff, unit_segments
+
+MB = 1024 * 1024
+
+SDLXLIFF_HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<xliff xmlns:sdl="http://sdl.com/FileTypes/SdlXliff/1.0" xmlns="urn:oasis:names:tc:xliff:document:1.2" '
+    'version="1.2" sdl:version="1.0">\n'
+    '<file original="benchmark.docx" datatype="x-sdlfilterframework2" source-language="en-US" '
+    'target-language="de-DE"><header><reference><internal-file form="base64">UEsDBA==</internal-file>'
+    '</reference></header><body>\n'
+)
+SDLXLIFF_UNIT = (
+    '<trans-unit id="{index}"><source>Press <g id="1">Save</g> to keep the {index}th change.<x id="2"/></source>'
+    '<seg-source><mrk mtype="seg" mid="{index}">Press <g id="1">Save</g> to keep the {index}th change.<x id="2"/>'
+    '</mrk></seg-source><target><mrk mtype="seg" mid="{index}">Klicken Sie auf <g id="1">Speichern</g>, um die '
+    '{index}. Änderung zu behalten.<x id="2"/></mrk></target><sdl:seg-defs><sdl:seg id="{index}" conf="Translated" '
+    'origin="tm" percent="100"/></sdl:seg-defs></trans-unit>\n'
+)
+SDLXLIFF_FOOTER = '</body></file></xliff>\n'
+
+
+def write_sdlxliff(path, size):
+    """Write an SDLXLIFF file of roughly ``size`` bytes and return its segment count."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as document:
+        document.write(SDLXLIFF_HEADER)
+        written = 0
+        while written < size:
+            unit = SDLXLIFF_UNIT.format(index=count)
+            document.write(unit)
+            written += len(unit)
+            count += 1
+        document.write(SDLXLIFF_FOOTER)
+    return count
+
+
+def memory_kb(field):
+    """Return a VmRSS/VmHWM style field of /proc/self/status in kB, or 0 off Linux."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def parse_whole_tree(path):
+    """Yield segments after loading the whole document, as a non-streaming parser would."""
+    for unit in ElementTree.parse(path).getroot().iter('{urn:oasis:names:tc:xliff:document:1.2}trans-unit'):
+        yield from unit_segments(unit)
+
+
+def run_parser(parser, path, results):
+    """Parse ``path`` in a fresh process and report segment count, seconds and peak RSS growth."""
+    baseline = memory_kb('VmRSS')
+    started = time.perf_counter()
+    count = sum(1 for _ in parser(path))
+    results.put((count, time.perf_counter() - started, max(0, memory_kb('VmHWM') - baseline)))
+
+
+class Command(BaseCommand):
+    """Report segments per second and peak RSS growth for streaming and whole-tree parsing."""
+
+    help = 'Benchmark the streaming SDLXLIFF parser against loading the whole tree.'
+
+    def add_arguments(self, parser):
+        """Add benchmark options."""
+        parser.add_argument('--sizes-mb', nargs='+', type=float, default=[10, 100])
+        parser.add_argument('--skip-tree', action='store_true', help='Only run the streaming parser.')
+
+    def handle(self, *args, **options):
+        """Generate each file size, parse it in a child process per parser and print a summary table."""
+        parsers = {'streaming': parse_xliff}
+        if not options['skip_tree']:
+            parsers['whole tree'] = parse_whole_tree
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(f"{'parser':<12} {'size MB':>8} {'segments':>10} {'segments/s':>12} {'peak RSS MB':>12}")
+        for size_mb in options['sizes_mb']:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'benchmark.sdlxliff')
+                write_sdlxliff(path, int(size_mb * MB))
+                for label, parser in parsers.items():
+                    results = context.Queue()
+                    process = context.Process(target=run_parser, args=(parser, path, results))
+                    process.start()
+                    count, elapsed, peak_kb = results.get()
+                    process.join()
+                    self.stdout.write(
+                        f'{label:<12} {size_mb:>8g} {count:>10} {count / elapsed:>12.0f} {peak_kb / 1024:>12.1f}'
+                    )
@@ -0,0 +1,85 @@
+"""Load test the async chat endpoint: how many OpenAI replies one ASGI worker awaits at once."""
+
+import asyncio
+import statistics
+import time
+from collections import Counter
+from unittest.mock import patch
+
+import httpx
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from openai_app.services.rate_limit import TokenBucketLimiter
+from openai_app.utils.stub_server import StubOpenAIServer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Send ``--requests`` chat requests at once and time them until the last reply.
+
+    By default the ASGI application runs in this process, on one event loop as in a single
+    uvicorn worker, against a local stub that answers after ``--latency`` seconds; the
+    process's rate limiter is lifted for the run. A worker holding a thread per call would
+    need requests / threads rounds of the latency; awaiting, one round should do. ``--url``
+    targets a running server instead, which must point ``OPENAI_BASE_URL`` at a stub itself.
+    """
+
+    help = 'Measure how many concurrent chat requests one ASGI worker serves against a slow OpenAI stub.'
+
+    def add_arguments(self, parser):
+        """Add load test options."""
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--latency', type=float, default=2.0, help='Seconds the stub takes per reply.')
+        parser.add_argument('--url', help='Base URL of a running server, e.g. http://127.0.0.1:8000.')
+
+    def handle(self, *args, **options):
+        """Run the load and print throughput, latency percentiles and the mean number of requests in flight."""
+        user = User.objects.first()
+        if user is None:
+            raise CommandError('Create a user first; the requests are authenticated as them.')
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        if options['url']:
+            client = httpx.AsyncClient(base_url=options['url'], headers=headers, timeout=None,
+                                       limits=httpx.Limits(max_connections=None))
+            statuses, latencies, elapsed = asyncio.run(self.load(client, options['requests']))
+        else:
+            if settings.DEBUG_TOOLBAR_ENABLED:
+                self.stderr.write('The debug toolbar is enabled; its sync middleware serves requests one at a time.')
+            unlimited = TokenBucketLimiter(requests_per_minute=0, tokens_per_minute=0)
+            with StubOpenAIServer(latency=options['latency']) as stub, \
+                    override_settings(OPENAI_API_KEY='stub', OPENAI_BASE_URL=stub.base_url), \
+                    patch('openai_app.services.client.get_rate_limiter', return_value=unlimited):
+                transport = httpx.ASGITransport(app=get_asgi_application())
+                client = httpx.AsyncClient(transport=transport, base_url='http://localhost', headers=headers,
+                                           timeout=None)
+                statuses, latencies, elapsed = asyncio.run(self.load(client, options['requests']))
+
+        self.stdout.write(f"Status codes: {dict(sorted(statuses.items()))}")
+        percentiles = statistics.quantiles(latencies, n=20)
+        self.stdout.write(
+            f"{options['requests']} requests in {elapsed:.2f} s ({options['requests'] / elapsed:.0f}/s): "
+            f"p50 {statistics.median(latencies):.2f} s, p95 {percentiles[18]:.2f} s, max {max(latencies):.2f} s, "
+            f"{sum(latencies) / elapsed:.0f} in flight on average"
+        )
+
+    async def load(self, client, requests):
+        """Send every request at once; return the status code counts, per-request seconds and total seconds."""
+        url = reverse('chat-list')
+
+        async def chat(index):
+            started = time.perf_counter()
+            response = await client.post(url, json={'messages': [{'role': 'user', 'content': f'Request {index}'}]})
+            return response.status_code, time.perf_counter() - started
+
+        async with client:
+            started = time.perf_counter()
+            results = await asyncio.gather(*[chat(index) for index in range(requests)])
+            elapsed = time.perf_counter() - started
+        return Counter(status for status, _ in results), [seconds for _, seconds in results], elapsed
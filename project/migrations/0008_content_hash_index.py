@@ -0,0 +1,38 @@
+# Generated by Django 5.0.4 on 2026-10-18 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0007_alter_projectfile_vector_store_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadedContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('vector_store_id', models.CharField(max_length=255)),
+                ('openai_file_id', models.CharField(max_length=255)),
+                ('usage_bytes', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='projectfile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='projectfile',
+            name='openai_file_id',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddConstraint(
+            model_name='uploadedcontent',
+            constraint=models.UniqueConstraint(fields=('content_hash', 'vector_store_id'), name='unique_content_per_vector_store'),
+        ),
+    ]
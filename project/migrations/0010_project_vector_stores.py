@@ -0,0 +1,34 @@
+# Generated by Django 5.0.4 on 2026-10-18 00:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0009_upload_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectVectorStore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vector_store_id', models.CharField(max_length=255, unique=True)),
+                ('file_count', models.PositiveIntegerField(default=0)),
+                ('usage_bytes', models.BigIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('rotated_at', models.DateTimeField(blank=True, null=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vector_stores', to='project.project')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='projectvectorstore',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('project',), name='one_active_vector_store_per_project'),
+        ),
+    ]
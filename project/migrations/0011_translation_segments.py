@@ -0,0 +1,35 @@
+# Generated by Django 5.0.4 on 2026-10-18 00:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0010_project_vector_stores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment_id', models.CharField(max_length=255)),
+                ('position', models.PositiveIntegerField()),
+                ('source', models.TextField()),
+                ('target', models.TextField(blank=True, null=True)),
+                ('state', models.CharField(blank=True, default='', max_length=50)),
+                ('source_hash', models.CharField(db_index=True, max_length=64)),
+                ('target_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('project_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='project.projectfile')),
+            ],
+            options={
+                'ordering': ['project_file', 'position'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='translationsegment',
+            constraint=models.UniqueConstraint(fields=('project_file', 'segment_id'), name='unique_segment_per_file'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.4 on 2026-10-18 00:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0011_translation_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectfile',
+            name='previous_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='next_versions', to='project.projectfile'),
+        ),
+        migrations.AddField(
+            model_name='projectfile',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
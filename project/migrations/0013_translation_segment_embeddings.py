@@ -0,0 +1,20 @@
+# Generated by Django 5.0.4 on 2026-10-18 00:33
+
+import pgvector.django.vector
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openai_app', '0001_initial'),  # Enables the vector extension
+        ('project', '0012_project_file_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='translationsegment',
+            name='embedding',
+            field=pgvector.django.vector.VectorField(blank=True, dimensions=1536, null=True),
+        ),
+    ]
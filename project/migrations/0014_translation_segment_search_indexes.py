@@ -0,0 +1,35 @@
+from django.db import migrations
+
+from openai_app.lexical_indexes import create_lexical_indexes, drop_lexical_indexes
+from openai_app.vector_indexes import hnsw_index
+
+PREFIX = "translation_segment_source"
+HNSW_INDEX_NAME = "translation_segment_hnsw"
+
+
+def create_indexes(apps, schema_editor):
+    """Index segment sources for trigram, full-text and embedding search; PostgreSQL only."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    model = apps.get_model("project", "TranslationSegment")
+    create_lexical_indexes(schema_editor, model._meta.db_table, "source", PREFIX)
+    schema_editor.add_index(model, hnsw_index(name=HNSW_INDEX_NAME))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    drop_lexical_indexes(schema_editor, PREFIX)
+    schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(HNSW_INDEX_NAME)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openai_app', '0004_pg_trgm'),
+        ('project', '0013_translation_segment_embeddings'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
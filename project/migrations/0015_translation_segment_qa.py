@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0014_translation_segment_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='translationsegment',
+            name='qa_issues',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='translationsegment',
+            name='qa_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
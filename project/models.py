@@ -26,6 +26,29 @@ class Project(models.Model):
         return self.name
 
 
+class ProjectVectorStore(models.Model):
+    """OpenAI vector store holding a project's files; rotated once it grows past the size limits."""
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="vector_stores")
+    vector_store_id = models.CharField(max_length=255, unique=True)
+    file_count = models.PositiveIntegerField(default=0)
+    usage_bytes = models.BigIntegerField(default=0)
+    is_active = models.BooleanField(default=True)  # New uploads go to the project's active store
+    created_at = models.DateTimeField(auto_now_add=True)
+    rotated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["project"], condition=models.Q(is_active=True),
+                                    name="one_active_vector_store_per_project"),
+        ]
+
+    def __str__(self):
+        """Return the OpenAI vector store id."""
+        return self.vector_store_id
+
+
 # file storage as vector
 # Define supported file types
 FILE_TYPE_CHOICES = [
@@ -46,16 +69,54 @@ class ProjectFile(models.Model):
     """Model for handling multiple file uploads for a project."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="uploaded_files")
-    openai_file_id = models.CharField(max_length=255, unique=True)  # Store OpenAI's file ID
+    openai_file_id = models.CharField(max_length=255, db_index=True)  # Shared by files with identical content
     vector_store_id = models.CharField(max_length=255, unique=False,null=True)  # Store OpenAI's file ID
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # SHA-256 of file bytes
     file_name = models.CharField(max_length=255)
     file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    version = models.PositiveIntegerField(default=1)
+    previous_version = models.ForeignKey(
+        "self", on_delete=models.SET_NULL, null=True, blank=True, related_name="next_versions"
+    )  # The file this one updates; its unchanged segments' results are carried over
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.filename
 
+class TranslationSegment(models.Model):
+    """A source/target segment parsed from a ProjectFile.
+
+    Fields beyond ``CONTENT_FIELDS`` hold results computed from the segment; they are copied
+    to unchanged segments of a new file version instead of being computed again.
+    """
+
+    CONTENT_FIELDS = {"id", "project_file", "segment_id", "position", "source", "target", "state", "source_hash",
+                      "target_hash"}
+
+    project_file = models.ForeignKey(ProjectFile, on_delete=models.CASCADE, related_name="segments")
+    segment_id = models.CharField(max_length=255)  # "unit:mrk" for XLIFF, "part:location" for Office files
+    position = models.PositiveIntegerField()  # Order within the file
+    source = models.TextField()
+    target = models.TextField(null=True, blank=True)  # Null when the file has no target for the segment
+    state = models.CharField(max_length=50, blank=True, default="")
+    source_hash = models.CharField(max_length=64, db_index=True)  # SHA-256 of the source text
+    target_hash = models.CharField(max_length=64, blank=True, default="")
+    embedding = VectorField(dimensions=1536, null=True, blank=True)  # Of the source text; null until embedded
+    qa_score = models.PositiveSmallIntegerField(null=True, blank=True)  # LQA score out of 100; null until reviewed
+    qa_issues = models.JSONField(null=True, blank=True)  # LQA issues, each with category, severity and description
+
+    class Meta:
+        ordering = ["project_file", "position"]
+        constraints = [
+            models.UniqueConstraint(fields=["project_file", "segment_id"], name="unique_segment_per_file"),
+        ]
+
+    def __str__(self):
+        """Return the segment id and the start of its source."""
+        return f"{self.segment_id}: {self.source[:50]}"
+
+
 class UploadedFile(models.Model):
     project = models.ForeignKey("Project", on_delete=models.CASCADE, related_name="files")
     file = models.FileField(upload_to="uploads/")  # ✅ Store file locally
@@ -63,4 +124,78 @@ class UploadedFile(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.file.name
\ No newline at end of file
+        return self.file.name
+
+class UploadedContent(models.Model):
+    """Content-addressed index of files already uploaded to OpenAI and attached to a vector store."""
+
+    content_hash = models.CharField(max_length=64)  # SHA-256 of file bytes
+    vector_store_id = models.CharField(max_length=255)
+    openai_file_id = models.CharField(max_length=255)
+    usage_bytes = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["content_hash", "vector_store_id"], name="unique_content_per_vector_store"),
+        ]
+
+    def __str__(self):
+        """Return the content hash and the OpenAI file it maps to."""
+        return f"{self.content_hash} -> {self.openai_file_id}"
+
+    def as_vector_store_file(self):
+        """Return the cached attachment in the same shape as a VectorStoreFile response."""
+        return {
+            "id": self.openai_file_id,
+            "created_at": int(self.created_at.timestamp()),
+            "last_error": None,
+            "object": "vector_store.file",
+            "status": "completed",
+            "usage_bytes": self.usage_bytes,
+            "vector_store_id": self.vector_store_id,
+        }
+
+
+JOB_STATUS_CHOICES = [
+    ("queued", "Queued"),
+    ("running", "Running"),
+    ("completed", "Completed"),
+    ("failed", "Failed"),
+]
+
+
+class UploadJob(models.Model):
+    """Batch of media files uploaded to OpenAI by a Celery worker instead of the request."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="upload_jobs")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    status = models.CharField(max_length=20, choices=JOB_STATUS_CHOICES, default="queued")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        """Return the job id and status."""
+        return f"Upload job {self.id} ({self.status})"
+
+
+class UploadJobFile(models.Model):
+    """A file accepted into an UploadJob, with its upload progress."""
+
+    job = models.ForeignKey(UploadJob, on_delete=models.CASCADE, related_name="files")
+    file = models.FileField(upload_to="upload_jobs/")  # Stored until the worker has uploaded and parsed it
+    file_name = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES)
+    content_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=JOB_STATUS_CHOICES, default="queued")
+    cached = models.BooleanField(default=False)
+    error = models.TextField(blank=True, default="")
+    project_file = models.ForeignKey(ProjectFile, on_delete=models.SET_NULL, null=True, blank=True)
+
+    def __str__(self):
+        """Return the uploaded file's name."""
+        return self.file_name
@@ -0,0 +1,122 @@
+"""Parser dispatch by file type and compact columnar segment batches."""
+
+import io
+import struct
+from array import array
+
+from project.parsers.ooxml import EXTRACTORS, extract_text_blocks
+from project.parsers.xliff import parse_xliff
+
+XLIFF_TYPES = {"xliff", "sdlxliff"}
+PARSEABLE_TYPES = XLIFF_TYPES | set(EXTRACTORS)
+PARSER_VERSION = 1  # Bump whenever parser output changes so cached parse results are not reused
+BATCH_MAGIC = b"SEGB"
+BATCH_FORMAT_VERSION = 1
+BATCH_HEADER = struct.Struct("<4sIII")  # Magic, format version, segment count, text buffer size
+
+
+def iter_file_segments(source, file_type):
+    """Yield (segment_id, source, target, state) for every segment of a parseable file."""
+    if file_type in XLIFF_TYPES:
+        for segment in parse_xliff(source):
+            unit_id = segment.unit_id or ""
+            segment_id = f"{unit_id}:{segment.segment_id}" if segment.segment_id else unit_id
+            yield segment_id, segment.source, segment.target, segment.state
+    else:
+        for block in extract_text_blocks(source, file_type):
+            yield f"{block.part}:{block.location}", block.text, None, None
+
+
+class SegmentBatch:
+    """The segments of one file in columnar form: one UTF-8 buffer plus an offset array.
+
+    Every segment adds four strings (id, source, target, state) to ``buffer`` and their end
+    positions to ``offsets``; ``has_target`` tells a missing target from an empty one. A batch
+    pickles as three flat byte strings however many segments it holds, instead of one object
+    graph per segment, so it is cheap to send back from a worker process. Offsets are 32-bit,
+    which bounds a file's text at 4 GiB.
+    """
+
+    FIELDS = 4
+    __slots__ = ("buffer", "offsets", "has_target")
+
+    def __init__(self, buffer=b"", offsets=None, has_target=b""):
+        """Wrap already encoded columns."""
+        self.buffer = buffer
+        self.offsets = offsets if offsets is not None else array("I")
+        self.has_target = has_target
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Build a batch from (segment_id, source, target, state) tuples."""
+        buffer, offsets, has_target = bytearray(), array("I"), bytearray()
+        for segment_id, source, target, state in segments:
+            has_target.append(target is not None)
+            for text in (segment_id, source, target or "", state or ""):
+                buffer += text.encode()
+                offsets.append(len(buffer))
+        return cls(bytes(buffer), offsets, bytes(has_target))
+
+    def __len__(self):
+        """Return the number of segments."""
+        return len(self.has_target)
+
+    def __iter__(self):
+        """Yield (segment_id, source, target, state) tuples, decoding one segment at a time."""
+        buffer, offsets = self.buffer, self.offsets
+        start = 0
+        for index, has_target in enumerate(self.has_target):
+            ends = offsets[index * self.FIELDS:(index + 1) * self.FIELDS]
+            segment_id, source, target, state = (
+                str(buffer[begin:end], "utf-8") for begin, end in zip([start, *ends[:-1]], ends)
+            )
+            start = ends[-1]
+            yield segment_id, source, target if has_target else None, state or None
+
+    def __getstate__(self):
+        """Pickle the three columns, copying them out of any memory map."""
+        return bytes(self.buffer), array("I", self.offsets), bytes(self.has_target)
+
+    def __setstate__(self, state):
+        """Restore the three columns."""
+        self.buffer, self.offsets, self.has_target = state
+
+    def write(self, file):
+        """Write the batch's binary layout: header, target flags, padding, offsets, then the text buffer.
+
+        Offsets start 4-byte aligned so :meth:`from_buffer` can view them in place.
+        """
+        file.write(BATCH_HEADER.pack(BATCH_MAGIC, BATCH_FORMAT_VERSION, len(self), len(self.buffer)))
+        file.write(self.has_target)
+        file.write(b"\0" * (-len(self.has_target) % 4))
+        file.write(self.offsets)
+        file.write(self.buffer)
+
+    @classmethod
+    def from_buffer(cls, data):
+        """Return a batch viewing the output of :meth:`write` in ``data``, such as an mmap, without copying it."""
+        view = memoryview(data)
+        magic, version, count, buffer_size = BATCH_HEADER.unpack_from(view)
+        if magic != BATCH_MAGIC or version != BATCH_FORMAT_VERSION:
+            raise ValueError("Not a segment batch in the current format.")
+        position = BATCH_HEADER.size
+        has_target = view[position:position + count]
+        position += count + (-count % 4)
+        offsets_size = count * cls.FIELDS * array("I").itemsize
+        offsets = view[position:position + offsets_size].cast("I")
+        position += offsets_size
+        if len(view) != position + buffer_size:
+            raise ValueError("Truncated segment batch.")
+        return cls(view[position:], offsets, has_target)
+
+    @property
+    def nbytes(self):
+        """Return the size of the batch's columns in bytes."""
+        return len(self.buffer) + self.offsets.itemsize * len(self.offsets) + len(self.has_target)
+
+
+def parse_to_batch(source, file_type):
+    """Parse a file given as a path, a binary file object or bytes into a SegmentBatch."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return SegmentBatch.from_segments(iter_file_segments(source, file_type))
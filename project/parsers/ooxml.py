@@ -0,0 +1,195 @@
+"""Streaming text extraction for DOCX, PPTX and XLSX packages."""
+
+import multiprocessing
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import repeat
+
+from defusedxml.ElementTree import iterparse
+
+from project.parsers.xliff import local_name
+
+RELATIONSHIP_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+
+@dataclass(slots=True)
+class TextBlock:
+    """A paragraph or spreadsheet cell, with the text of each run it is made of."""
+
+    kind: str  # "paragraph" or "cell"
+    part: str  # Zip member the block came from
+    location: str  # Paragraph number within the part, or cell reference such as "B7"
+    text: str
+    runs: list = field(default_factory=list)
+
+
+def iter_elements(stream, name, containers=(), skip=("Fallback",)):
+    """Yield every ``name`` element of an XML stream as it ends, then detach it.
+
+    Finished children of ``containers`` are detached as well, so only the ancestors of the
+    current element stay in memory. Matches inside ``skip`` elements are ignored; by default
+    the ``mc:Fallback`` copies Office writes next to text boxes and other newer content.
+    """
+    stack = []
+    skipping = 0
+    for event, element in iterparse(stream, events=("start", "end")):
+        if event == "start":
+            stack.append(element)
+            skipping += local_name(element.tag) in skip
+            continue
+        stack.pop()
+        skipping -= local_name(element.tag) in skip
+        matched = local_name(element.tag) == name
+        if matched and not skipping:
+            yield element
+        if stack and (matched or local_name(stack[-1].tag) in containers):
+            element.clear()
+            stack[-1].remove(element)
+
+
+def paragraph_runs(paragraph):
+    """Return the text of each run in a WordprocessingML or DrawingML paragraph."""
+    runs = []
+    for element in paragraph.iter():
+        name = local_name(element.tag)
+        if name in ("r", "fld"):  # DrawingML fields hold text like runs
+            runs.append("")
+        elif name == "t" and runs:
+            runs[-1] += element.text or ""
+        elif name in ("tab", "br", "cr"):
+            character = "\t" if name == "tab" else "\n"
+            if runs:
+                runs[-1] += character
+            else:
+                runs.append(character)
+    return runs
+
+
+def relationship_targets(package, rels_part):
+    """Return a relationship id to zip member mapping from a ``.rels`` part."""
+    base = posixpath.dirname(posixpath.dirname(rels_part))  # "ppt/_rels/presentation.xml.rels" -> "ppt"
+    targets = {}
+    with package.open(rels_part) as stream:
+        for relationship in iter_elements(stream, "Relationship", containers=("Relationships",)):
+            target = relationship.get("Target")
+            targets[relationship.get("Id")] = (
+                target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+            )
+    return targets
+
+
+def ordered_parts(package, main_part, list_name, item_name):
+    """Return the members listed in a main part's ``list_name``, in document order."""
+    rels_part = posixpath.join(posixpath.dirname(main_part), "_rels", posixpath.basename(main_part) + ".rels")
+    targets = relationship_targets(package, rels_part)
+    parts = []
+    with package.open(main_part) as stream:
+        for item_list in iter_elements(stream, list_name):
+            parts.extend(
+                (item.get("name"), targets[item.get(RELATIONSHIP_ID)])
+                for item in item_list
+                if local_name(item.tag) == item_name
+            )
+    return parts
+
+
+def extract_docx(source):
+    """Yield the paragraphs of a DOCX body, including those in tables and text boxes."""
+    part = "word/document.xml"
+    with zipfile.ZipFile(source) as package, package.open(part) as stream:
+        for index, paragraph in enumerate(iter_elements(stream, "p", containers=("document", "body"))):
+            runs = paragraph_runs(paragraph)
+            if any(runs):
+                yield TextBlock("paragraph", part, str(index), "".join(runs), runs)
+
+
+def slide_blocks(source, part):
+    """Return the paragraphs of one PPTX slide."""
+    blocks = []
+    with zipfile.ZipFile(source) as package, package.open(part) as stream:
+        for index, paragraph in enumerate(iter_elements(stream, "p", containers=("sld", "cSld", "spTree"))):
+            runs = paragraph_runs(paragraph)
+            if any(runs):
+                blocks.append(TextBlock("paragraph", part, str(index), "".join(runs), runs))
+    return blocks
+
+
+def pptx_slide_parts(source):
+    """Return the slide members of a PPTX in presentation order."""
+    with zipfile.ZipFile(source) as package:
+        return [part for _, part in ordered_parts(package, "ppt/presentation.xml", "sldIdLst", "sldId")]
+
+
+def extract_pptx(source, max_workers=1):
+    """Yield the paragraphs of every PPTX slide in presentation order.
+
+    With ``max_workers`` above 1 and ``source`` given as a path, slides are parsed in a
+    process pool. Daemonic processes such as Celery prefork workers cannot start a pool, so
+    they always parse sequentially.
+    """
+    slide_parts = pptx_slide_parts(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    parallel = (
+        max_workers > 1 and len(slide_parts) > 1 and isinstance(source, (str, os.PathLike))
+        and not multiprocessing.current_process().daemon
+    )
+    if not parallel:
+        for part in slide_parts:
+            yield from slide_blocks(source, part)
+        return
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(slide_parts))) as executor:
+        for blocks in executor.map(slide_blocks, repeat(source), slide_parts):
+            yield from blocks
+
+
+def shared_strings(package):
+    """Return the shared string table of an XLSX as (text, runs) pairs."""
+    if "xl/sharedStrings.xml" not in package.namelist():
+        return []
+    strings = []
+    with package.open("xl/sharedStrings.xml") as stream:
+        for item in iter_elements(stream, "si", containers=("sst",)):
+            runs = [element.text or "" for element in item.iter() if local_name(element.tag) == "t"]
+            strings.append(("".join(runs), runs))
+    return strings
+
+
+def cell_text(cell, strings):
+    """Return the (text, runs) of a shared, inline or formula string cell, or None for other cells."""
+    cell_type = cell.get("t")
+    if cell_type == "s":
+        value = next((element.text for element in cell if local_name(element.tag) == "v"), None)
+        return strings[int(value)] if value is not None else None
+    if cell_type == "inlineStr":
+        runs = [element.text or "" for element in cell.iter() if local_name(element.tag) == "t"]
+    elif cell_type == "str":  # Cached result of a formula
+        runs = [element.text or "" for element in cell if local_name(element.tag) == "v"]
+    else:
+        return None
+    return "".join(runs), runs
+
+
+def extract_xlsx(source):
+    """Yield the text cells of every XLSX sheet in workbook order; numbers and booleans are skipped."""
+    with zipfile.ZipFile(source) as package:
+        strings = shared_strings(package)
+        for _, part in ordered_parts(package, "xl/workbook.xml", "sheets", "sheet"):
+            with package.open(part) as stream:
+                for cell in iter_elements(stream, "c", containers=("worksheet", "sheetData", "row")):
+                    text_and_runs = cell_text(cell, strings)
+                    if text_and_runs and text_and_runs[0]:
+                        yield TextBlock("cell", part, cell.get("r"), *text_and_runs)
+
+
+EXTRACTORS = {"docx": extract_docx, "pptx": extract_pptx, "xlsx": extract_xlsx}
+
+
+def extract_text_blocks(source, file_type):
+    """Yield the text blocks of a DOCX, PPTX or XLSX file, chosen by ``file_type``."""
+    if file_type not in EXTRACTORS:
+        raise ValueError(f"No text extractor for {file_type!r} files.")
+    return EXTRACTORS[file_type](source)
@@ -0,0 +1,131 @@
+"""Streaming XLIFF 1.2 and SDLXLIFF segment parser."""
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from defusedxml.ElementTree import iterparse
+
+CONTAINER_TAGS = {"xliff", "file", "body", "group"}  # Kept while parsing; their finished children are freed
+CODE_TAGS = {"bpt", "ept", "it", "ph", "x", "bx", "ex"}  # Inline codes whose content is native markup, not text
+
+
+@dataclass(slots=True)
+class InlineTag:
+    """An inline tag, located by character offsets into its segment's plain text."""
+
+    name: str
+    id: str | None
+    start: int
+    end: int
+
+
+@dataclass(slots=True)
+class Segment:
+    """A translatable source/target pair from a ``trans-unit`` or one of its ``mrk`` segments."""
+
+    unit_id: str | None
+    segment_id: str | None
+    source: str
+    target: str | None
+    state: str | None
+    source_tags: list = field(default_factory=list)
+    target_tags: list = field(default_factory=list)
+    file: str | None = None
+
+
+@lru_cache(maxsize=256)
+def local_name(tag):
+    """Return a tag name without its namespace; cached since a document uses a handful of tags."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def extract_text(element):
+    """Return the plain text of ``element`` and the inline tags inside it."""
+    parts, tags = [], []
+    length = 0
+
+    def walk(node):
+        nonlocal length
+        if node.text:
+            parts.append(node.text)
+            length += len(node.text)
+        for child in node:
+            name = local_name(child.tag)
+            tag = InlineTag(name, child.get("id") or child.get("mid"), length, length)
+            tags.append(tag)
+            if name not in CODE_TAGS:
+                walk(child)
+                tag.end = length
+            if child.tail:
+                parts.append(child.tail)
+                length += len(child.tail)
+
+    walk(element)
+    return "".join(parts), tags
+
+
+def segment_markers(element):
+    """Return the ``mrk mtype="seg"`` elements under ``element`` keyed by ``mid``."""
+    return {
+        marker.get("mid"): marker
+        for marker in element.iter()
+        if local_name(marker.tag) == "mrk" and marker.get("mtype") == "seg"
+    }
+
+
+def unit_segments(unit, file_name=None):
+    """Yield the segments of one ``trans-unit`` element."""
+    children = {}
+    for child in unit:
+        children.setdefault(local_name(child.tag), child)
+    source, target = children.get("source"), children.get("target")
+    seg_source = children.get("seg-source")
+    source_markers = segment_markers(seg_source) if seg_source is not None else {}
+    if not source_markers:
+        if source is None:
+            return
+        source_text, source_tags = extract_text(source)
+        target_text, target_tags = extract_text(target) if target is not None else (None, [])
+        state = target.get("state") if target is not None else None
+        yield Segment(unit.get("id"), None, source_text, target_text, state, source_tags, target_tags, file_name)
+        return
+
+    # Segmented unit: SDLXLIFF keeps each segment's status in sdl:seg-defs, plain XLIFF on the target
+    target_markers = segment_markers(target) if target is not None else {}
+    seg_defs = children.get("seg-defs")
+    states = {}
+    if seg_defs is not None:
+        states = {seg.get("id"): seg.get("conf") for seg in seg_defs if local_name(seg.tag) == "seg"}
+    default_state = target.get("state") if target is not None else None
+    for mid, source_marker in source_markers.items():
+        source_text, source_tags = extract_text(source_marker)
+        target_marker = target_markers.get(mid)
+        target_text, target_tags = extract_text(target_marker) if target_marker is not None else (None, [])
+        yield Segment(
+            unit.get("id"), mid, source_text, target_text, states.get(mid, default_state), source_tags, target_tags,
+            file_name,
+        )
+
+
+def parse_xliff(source):
+    """Yield every segment of an XLIFF 1.2 or SDLXLIFF document.
+
+    ``source`` is a path or a binary file object. The document is parsed incrementally and
+    each ``trans-unit`` (and any other finished child of a file, body or group, such as
+    SDL's header and skeleton data) is detached as soon as it ends, so memory stays flat
+    however large the file is. Entities and DTDs are refused.
+    """
+    stack = []
+    file_name = None
+    for event, element in iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(element)
+            if local_name(element.tag) == "file":
+                file_name = element.get("original")
+            continue
+        stack.pop()
+        if local_name(element.tag) == "trans-unit":
+            yield from unit_segments(element, file_name)
+        if stack and local_name(stack[-1].tag) in CONTAINER_TAGS:
+            element.clear()
+            stack[-1].remove(element)
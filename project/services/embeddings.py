@@ -0,0 +1,69 @@
+"""Embed translation segments in batches and store the vectors in pgvector."""
+
+import logging
+from collections import deque
+from itertools import islice
+
+from django.db import connection
+
+from openai_app.services.embeddings import EmbeddingService
+from project.models import TranslationSegment
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = 1000
+
+
+def write_embeddings(rows):
+    """Store (segment pk, vector) rows; one ``UPDATE ... FROM (VALUES ...)`` per page on PostgreSQL."""
+    field = TranslationSegment._meta.get_field("embedding")
+    if connection.vendor == "postgresql":
+        from psycopg2.extras import execute_values
+
+        quote = connection.ops.quote_name
+        table = quote(TranslationSegment._meta.db_table)
+        sql = (
+            f"UPDATE {table} SET {quote(field.column)} = data.embedding "
+            f"FROM (VALUES %s) AS data (id, embedding) WHERE {table}.id = data.id"
+        )
+        with connection.cursor() as cursor:
+            execute_values(
+                cursor.cursor, sql, [(pk, field.get_prep_value(vector)) for pk, vector in rows],
+                template="(%s, %s::vector)", page_size=len(rows),
+            )
+        return
+    TranslationSegment.objects.bulk_update(
+        [TranslationSegment(pk=pk, embedding=vector) for pk, vector in rows], ["embedding"]
+    )
+
+
+def embed_segments(segments, service=None):
+    """Embed the source text of every segment in a queryset that has none yet; return how many were embedded.
+
+    Segments are streamed from the database into the embedding batches, and vectors are written
+    back ``WRITE_BATCH_SIZE`` at a time as batches complete, so memory stays bounded however
+    large the file is. Segments carried over from an earlier file version already have one.
+    """
+    service = service or EmbeddingService()
+    rows = segments.filter(embedding__isnull=True).exclude(source="").values_list("pk", "source")
+    pks = deque()
+
+    def texts():
+        """Yield source texts, queueing their pks to pair with the vectors."""
+        for pk, source in rows.iterator(chunk_size=WRITE_BATCH_SIZE):
+            pks.append(pk)
+            yield source
+
+    embedded = ((pks.popleft(), vector) for vector in service.embed(texts()))
+    count = 0
+    while batch := list(islice(embedded, WRITE_BATCH_SIZE)):
+        write_embeddings(batch)
+        count += len(batch)
+    return count
+
+
+def embed_project_file(project_file, service=None):
+    """Embed a project file's segments that have no embedding yet and return how many were embedded."""
+    count = embed_segments(project_file.segments.all(), service)
+    logger.info(f"Embedded {count} segments of {project_file.file_name}")
+    return count
@@ -0,0 +1,178 @@
+"""Hybrid retrieval: lexical and vector rankings of source texts fused with reciprocal rank fusion."""
+
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from pgvector.django import VectorField
+
+from openai_app.lexical_indexes import tsquery_sql, tsvector_sql
+from openai_app.models import TranslationEmbedding
+from openai_app.services.embeddings import EmbeddingService
+from openai_app.services.translation_memory import WORD, trigram_similarity
+from openai_app.services.vector_search import set_search_parameters
+from project.models import ProjectFile, TranslationSegment
+
+TRIGRAM_THRESHOLD = 0.3  # pg_trgm.similarity_threshold, which the % operator uses
+
+# Both rankings and their fusion run as one statement. "lexical" takes full-text matches,
+# best ts_rank_cd first, then rows only similar by trigrams; "semantic" the nearest rows by
+# embedding. Each row scores the sum over rankings of weight / (rrf_k + rank); rows found only
+# by a ranking given no weight are left out.
+HYBRID_SQL = """
+WITH lexical AS (
+    SELECT id, row_number() OVER (
+        ORDER BY ts_rank_cd({tsvector}, {tsquery}) DESC, similarity({source}, %(text)s) DESC
+    ) AS rank
+    FROM {table}
+    WHERE ({tsvector} @@ {tsquery} OR {source} %% %(text)s){scope}
+    ORDER BY rank
+    LIMIT %(candidates)s
+),
+semantic AS (
+    SELECT id, row_number() OVER (ORDER BY distance) AS rank
+    FROM (
+        SELECT id, embedding <=> %(embedding)s::vector AS distance
+        FROM {table}
+        WHERE embedding IS NOT NULL{scope}
+        ORDER BY distance
+        LIMIT %(candidates)s
+    ) AS nearest
+)
+SELECT hit.id, hit.{source}, hit.{target}, fused.score, fused.lexical_rank, fused.vector_rank
+FROM (
+    SELECT id,
+           COALESCE(%(lexical_weight)s / (%(rrf_k)s + lexical.rank), 0)
+           + COALESCE(%(vector_weight)s / (%(rrf_k)s + semantic.rank), 0) AS score,
+           lexical.rank AS lexical_rank, semantic.rank AS vector_rank
+    FROM lexical FULL OUTER JOIN semantic USING (id)
+) AS fused
+JOIN {table} AS hit USING (id)
+WHERE fused.score > 0
+ORDER BY fused.score DESC, hit.id
+LIMIT %(k)s
+"""
+PROJECT_SCOPE_SQL = " AND project_file_id IN (SELECT id FROM {files} WHERE project_id = %(project)s)"
+
+
+@dataclass(frozen=True)
+class Corpus:
+    """A searchable model: its source and target text columns, next to an ``embedding`` of the source."""
+
+    model: type
+    source: str
+    target: str
+
+
+CORPORA = {
+    "memory": Corpus(TranslationEmbedding, "source_text", "target_text"),
+    "segments": Corpus(TranslationSegment, "source", "target"),
+}
+
+
+@dataclass(slots=True)
+class HybridMatch:
+    """A row found by hybrid search, with its fused score and its rank in each ranking that found it."""
+
+    id: int
+    source_text: str
+    target_text: str
+    score: float
+    lexical_rank: int | None
+    vector_rank: int | None
+
+    def as_dict(self):
+        """Return the match as a dictionary."""
+        return asdict(self)
+
+
+def reciprocal_rank_fusion(rankings, weights, rrf_k):
+    """Return {id: score} summing ``weight / (rrf_k + rank)`` over the rankings (lists of ids, best first)."""
+    scores = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, row_id in enumerate(ranking, start=1):
+            scores[row_id] += weight / (rrf_k + rank)
+    return scores
+
+
+def search_vector(text, embedding, corpus="segments", k=10, lexical_weight=None, vector_weight=None, project=None,
+                  candidates=None, ef_search=None):
+    """Return the top ``k`` HybridMatch rows of a corpus for a text with a known embedding, best first.
+
+    ``lexical_weight`` and ``vector_weight`` scale each ranking's share of the fused score;
+    ``project`` limits segment searches to the files of one project.
+    """
+    corpus = CORPORA[corpus]
+    lexical_weight = settings.HYBRID_SEARCH_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+    vector_weight = settings.HYBRID_SEARCH_VECTOR_WEIGHT if vector_weight is None else vector_weight
+    candidates = max(candidates or settings.HYBRID_SEARCH_CANDIDATES, k)
+    if connection.vendor != "postgresql":
+        return _search_in_python(corpus, text, embedding, k, lexical_weight, vector_weight, project, candidates)
+
+    quote = connection.ops.quote_name
+    scope = ""
+    if project is not None and corpus.model is TranslationSegment:
+        scope = PROJECT_SCOPE_SQL.format(files=quote(ProjectFile._meta.db_table))
+    sql = HYBRID_SQL.format(
+        table=quote(corpus.model._meta.db_table), source=quote(corpus.source), target=quote(corpus.target),
+        tsvector=tsvector_sql(quote(corpus.source)), tsquery=tsquery_sql("%(text)s"), scope=scope,
+    )
+    params = {
+        "text": text,
+        "embedding": VectorField().get_prep_value(embedding),
+        "lexical_weight": float(lexical_weight),
+        "vector_weight": float(vector_weight),
+        "rrf_k": settings.HYBRID_SEARCH_RRF_K,
+        "candidates": candidates,
+        "project": str(project),
+        "k": k,
+    }
+    with transaction.atomic():
+        set_search_parameters(max(ef_search or settings.VECTOR_SEARCH_EF_SEARCH, candidates))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [HybridMatch(*row) for row in cursor.fetchall()]
+
+
+def _search_in_python(corpus, text, embedding, k, lexical_weight, vector_weight, project, candidates):
+    """Rank every row in memory; a stand-in for the indexed query on databases without pg_trgm and pgvector."""
+    queryset = corpus.model.objects.all()
+    if project is not None and corpus.model is TranslationSegment:
+        queryset = queryset.filter(project_file__project_id=project)
+    rows = {row[0]: row for row in queryset.values_list("id", corpus.source, corpus.target, "embedding")}
+
+    terms = set(WORD.findall(text.lower()))
+    lexical = []
+    for row_id, source, _, _ in rows.values():
+        full_text = bool(terms) and terms <= set(WORD.findall(source.lower()))
+        fuzzy = trigram_similarity(source, text)
+        if full_text or fuzzy >= TRIGRAM_THRESHOLD:
+            lexical.append((not full_text, -fuzzy, row_id))
+    lexical = [row_id for *_, row_id in sorted(lexical)[:candidates]]
+
+    embedded = [row for row in rows.values() if row[3] is not None]
+    semantic = []
+    if embedded:
+        matrix = np.array([row[3] for row in embedded], dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        query = np.asarray(embedding, dtype=np.float32)
+        distances = 1 - matrix @ (query / np.linalg.norm(query))
+        semantic = [embedded[index][0] for index in np.argsort(distances, kind="stable")[:candidates]]
+
+    scores = reciprocal_rank_fusion([lexical, semantic], [lexical_weight, vector_weight], settings.HYBRID_SEARCH_RRF_K)
+    lexical_ranks = {row_id: rank for rank, row_id in enumerate(lexical, start=1)}
+    vector_ranks = {row_id: rank for rank, row_id in enumerate(semantic, start=1)}
+    return [
+        HybridMatch(row_id, rows[row_id][1], rows[row_id][2], score, lexical_ranks.get(row_id),
+                    vector_ranks.get(row_id))
+        for row_id, score in sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        if score > 0
+    ]
+
+
+def search(text, corpus="segments", k=10, lexical_weight=None, vector_weight=None, project=None, ef_search=None):
+    """Return the top ``k`` HybridMatch rows of a corpus for ``text``, embedding it through the cache."""
+    embedding = EmbeddingService().embed_one(text)
+    return search_vector(text, embedding, corpus, k, lexical_weight, vector_weight, project, ef_search=ef_search)
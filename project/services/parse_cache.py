@@ -0,0 +1,104 @@
+"""Local disk cache of parsed segment batches keyed by file content and parser version."""
+
+import logging
+import mmap
+import os
+import tempfile
+
+from django.conf import settings
+
+from core import metrics
+from project.parsers.batches import PARSER_VERSION, SegmentBatch, parse_to_batch
+
+logger = logging.getLogger(__name__)
+
+
+class ParseCache:
+    """Store :class:`SegmentBatch` files on local disk and map them back in on a hit.
+
+    Entries are keyed by (content SHA-256, file type, ``PARSER_VERSION``), so a parser change
+    never serves stale output. A hit touches the entry's mtime and writes past ``max_bytes``
+    evict the least recently used entries. Files are written atomically, so web and Celery
+    processes on the same host can share the directory.
+    """
+
+    suffix = ".segb"
+
+    def __init__(self, directory, max_bytes):
+        """Use ``directory`` for entries and keep their total size under ``max_bytes``."""
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, content_hash, file_type):
+        """Return the entry path for a file's content and type."""
+        return os.path.join(
+            self.directory, content_hash[:2], f"{content_hash}-{file_type}-v{PARSER_VERSION}{self.suffix}"
+        )
+
+    def get(self, content_hash, file_type):
+        """Return the cached batch memory-mapped from disk, or None."""
+        path = self.path(content_hash, file_type)
+        try:
+            with open(path, "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)  # Mark as recently used
+            batch = SegmentBatch.from_buffer(data)
+        except (OSError, ValueError):  # Missing, evicted meanwhile, empty or corrupt
+            metrics.increment("parse_cache.misses")
+            return None
+        metrics.increment("parse_cache.hits")
+        return batch
+
+    def put(self, content_hash, file_type, batch):
+        """Store a batch and evict old entries if the cache grew past its size limit."""
+        path = self.path(content_hash, file_type)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as file:
+            batch.write(file)
+        os.replace(file.name, path)
+        self.evict()
+
+    def get_or_parse(self, content_hash, file_type, source):
+        """Return the cached batch for this content, parsing ``source`` and caching it on a miss."""
+        batch = self.get(content_hash, file_type)
+        if batch is None:
+            batch = parse_to_batch(source, file_type)
+            try:
+                self.put(content_hash, file_type, batch)
+            except OSError as e:
+                logger.error(f"Could not cache parsed {content_hash}: {e}")
+        return batch
+
+    def entries(self):
+        """Return (mtime, size, path) for every entry."""
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:  # Evicted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Delete the least recently used entries until the total size is within ``max_bytes``."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)  # Readers holding a mapping keep their data
+            except FileNotFoundError:
+                pass
+            total -= size
+            metrics.increment("parse_cache.evictions")
+
+
+def get_parse_cache():
+    """Return the parse cache configured by ``PARSE_CACHE_DIR`` and ``PARSE_CACHE_MAX_BYTES``."""
+    return ParseCache(settings.PARSE_CACHE_DIR, settings.PARSE_CACHE_MAX_BYTES)
@@ -0,0 +1,79 @@
+"""Process pool that parses uploaded files off the request thread."""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from project.parsers.batches import parse_to_batch
+from project.services.parse_cache import get_parse_cache
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """Return this process's parsing pool, sized by ``PARSE_MAX_WORKERS``.
+
+    Workers are spawned rather than forked so they start clean of the parent's threads; they
+    only import the parsers, never Django.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PARSE_MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def can_use_pool():
+    """Return whether this process may start worker processes; Celery prefork children may not."""
+    return settings.PARSE_MAX_WORKERS > 0 and not multiprocessing.current_process().daemon
+
+
+def parse_files(files):
+    """Parse (source, file_type) pairs and return a SegmentBatch per file, in order.
+
+    Sources are paths or bytes so they can be sent to the pool cheaply. Even a single file is
+    parsed by a worker, so a web request thread only waits for it. With ``PARSE_MAX_WORKERS``
+    at 0, or from a daemonic process, files are parsed here instead; Celery fans job files out
+    with one ``ingest_upload_job_file`` task each.
+    """
+    files = list(files)
+    if not files or not can_use_pool():
+        return [parse_to_batch(source, file_type) for source, file_type in files]
+    return list(get_parse_pool().map(parse_to_batch, *zip(*files)))
+
+
+def pool_source(file):
+    """Return an uploaded file as a pool source: the path of its temporary file, or its bytes."""
+    if hasattr(file, "temporary_file_path"):
+        return file.temporary_file_path()
+    file.seek(0)
+    return file.read()
+
+
+def get_or_parse_files(files):
+    """Return a SegmentBatch per (content_hash, file_type, uploaded file), in order.
+
+    Batches come from the parse cache where possible; the rest are parsed together by
+    :func:`parse_files` and cached.
+    """
+    files = list(files)
+    cache = get_parse_cache()
+    batches = [cache.get(content_hash, file_type) for content_hash, file_type, _ in files]
+    misses = [index for index, batch in enumerate(batches) if batch is None]
+    parsed = parse_files((pool_source(files[index][2]), files[index][1]) for index in misses)
+    for index, batch in zip(misses, parsed):
+        content_hash, file_type, _ = files[index]
+        batches[index] = batch
+        try:
+            cache.put(content_hash, file_type, batch)
+        except OSError as e:
+            logger.error(f"Could not cache parsed {content_hash}: {e}")
+    return batches
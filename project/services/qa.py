@@ -0,0 +1,47 @@
+"""Run batched LQA over translation segments and store the scores and issues on them."""
+
+import logging
+from itertools import islice
+
+from openai_app.services.lqa import LQABatchEngine, LQASegment
+from project.models import TranslationSegment
+
+logger = logging.getLogger(__name__)
+
+REVIEW_CHUNK_SIZE = 1000
+
+
+def review_segments(segments, engine=None):
+    """Review every segment in a queryset that has a target and no QA result yet; return how many were reviewed.
+
+    Segments are read and reviewed ``REVIEW_CHUNK_SIZE`` at a time, and the engine packs each
+    chunk into as few requests as its token budget allows. Segments carried over from an earlier
+    file version already have a result, so a new version only pays for its changed segments.
+    Segments the engine could not review stay without a result and are tried again next time.
+    ``LQAUnavailable`` from an outage is raised as is; chunks stored before it keep their results.
+    """
+    engine = engine or LQABatchEngine()
+    rows = segments.filter(qa_score__isnull=True, target__isnull=False).values_list("pk", "source", "target")
+    rows = rows.iterator(chunk_size=REVIEW_CHUNK_SIZE)
+    count = 0
+    while chunk := list(islice(rows, REVIEW_CHUNK_SIZE)):
+        results = engine.review(LQASegment(str(pk), source, target) for pk, source, target in chunk)
+        reviewed = [
+            TranslationSegment(pk=int(result.id), qa_score=result.score, qa_issues=result.issues)
+            for result in results if result.error is None
+        ]
+        TranslationSegment.objects.bulk_update(reviewed, ["qa_score", "qa_issues"])
+        count += len(reviewed)
+    return count
+
+
+def review_project_file(project_file, engine=None):
+    """Review a project file's segments that have no QA result yet and return how many were reviewed."""
+    count = review_segments(project_file.segments.all(), engine)
+    logger.info(f"Reviewed {count} segments of {project_file.file_name}")
+    return count
+
+
+def has_review(project_file):
+    """Return whether any of a project file's segments have been reviewed."""
+    return project_file.segments.filter(qa_score__isnull=False).exists()
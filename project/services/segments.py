@@ -0,0 +1,126 @@
+"""Parse project files into TranslationSegment rows and load them with PostgreSQL COPY."""
+
+import hashlib
+import logging
+from itertools import islice
+
+from django.db import connection, transaction
+
+from project.models import TranslationSegment
+from project.parsers.batches import PARSEABLE_TYPES, iter_file_segments
+from project.services.parse_cache import get_parse_cache
+
+logger = logging.getLogger(__name__)
+
+COPY_COLUMNS = ("project_file_id", "segment_id", "position", "source", "target", "state", "source_hash", "target_hash")
+BULK_CREATE_BATCH_SIZE = 1000
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\x00": ""})
+
+
+def text_hash(text):
+    """Return the SHA-256 hex digest of a segment text."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def segment_rows(project_file_id, segments):
+    """Yield a row of ``COPY_COLUMNS`` values per segment, numbering them and making ids unique."""
+    seen = set()
+    for position, (segment_id, source, target, state) in enumerate(segments):
+        segment_id = segment_id[:255]
+        if segment_id in seen:  # Malformed files repeat ids; keep the content under a suffixed id
+            segment_id = f"{segment_id[:240]}#{position}"
+        seen.add(segment_id)
+        yield (
+            project_file_id, segment_id, position, source, target, state or "",
+            text_hash(source), text_hash(target) if target is not None else "",
+        )
+
+
+class CopyReader:
+    """File-like object producing COPY text-format lines lazily from rows, so memory stays flat."""
+
+    def __init__(self, rows):
+        """Wrap an iterable of row tuples."""
+        self._rows = iter(rows)
+        self._buffer = ""
+        self.count = 0
+
+    @staticmethod
+    def format_row(row):
+        r"""Return one row as a tab separated COPY line, with ``\N`` for nulls."""
+        return "\t".join(
+            "\\N" if value is None else str(value).translate(COPY_ESCAPES) for value in row
+        ) + "\n"
+
+    def read(self, size=-1):
+        """Return up to ``size`` characters of COPY data, or all of it when ``size`` is negative."""
+        chunks, length = [self._buffer], len(self._buffer)
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = self.format_row(row)
+            chunks.append(line)
+            length += len(line)
+            self.count += 1
+        data = "".join(chunks)
+        if size < 0:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def copy_rows(rows):
+    """Stream rows into the segment table with COPY and return how many were loaded."""
+    quote = connection.ops.quote_name
+    reader = CopyReader(rows)
+    sql = (
+        f"COPY {quote(TranslationSegment._meta.db_table)} ({', '.join(quote(column) for column in COPY_COLUMNS)}) "
+        "FROM STDIN"
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, reader, size=64 * 1024)
+    return reader.count
+
+
+def bulk_create_rows(rows):
+    """Insert rows with ``bulk_create`` in batches; used where COPY is unavailable."""
+    rows = iter(rows)
+    count = 0
+    while batch := list(islice(rows, BULK_CREATE_BATCH_SIZE)):
+        TranslationSegment.objects.bulk_create([TranslationSegment(**dict(zip(COPY_COLUMNS, row))) for row in batch])
+        count += len(batch)
+    return count
+
+
+def load_rows(rows):
+    """Insert rows with a single streamed ``COPY`` on PostgreSQL, or batched ``bulk_create`` elsewhere."""
+    if connection.vendor == "postgresql":
+        return copy_rows(rows)
+    return bulk_create_rows(rows)
+
+
+def ingest_segments(project_file, segments):
+    """Replace a file's stored segments with ``segments`` and return how many were stored."""
+    rows = segment_rows(project_file.pk, segments)
+    with transaction.atomic():
+        TranslationSegment.objects.filter(project_file=project_file).delete()
+        return load_rows(rows)
+
+
+def ingest_project_file(project_file, source):
+    """Parse ``source`` as the project file's type and store its segments; return the count or None if unparseable.
+
+    Files with a content hash are parsed through the parse cache, so re-ingesting known
+    content only reads the cached batch.
+    """
+    if project_file.file_type not in PARSEABLE_TYPES:
+        return None
+    if project_file.content_hash:
+        segments = get_parse_cache().get_or_parse(project_file.content_hash, project_file.file_type, source)
+    else:
+        segments = iter_file_segments(source, project_file.file_type)
+    count = ingest_segments(project_file, segments)
+    logger.info(f"Stored {count} segments for {project_file.file_name}")
+    return count
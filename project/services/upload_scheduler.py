@@ -0,0 +1,153 @@
+"""Process-wide, bounded scheduler for OpenAI file uploads."""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from core import metrics
+
+
+class UploadQueueFull(Exception):
+    """Raised when accepting more uploads would exceed the queue depth limit."""
+
+    def __init__(self, retry_after):
+        """Store the suggested number of seconds before the client retries."""
+        super().__init__(f'Upload queue is full, retry after {retry_after}s.')
+        self.retry_after = retry_after
+
+
+class UploadScheduler:
+    """Run uploads on a fixed set of worker threads, sharing them fairly between users.
+
+    Pending uploads are kept in one queue per user and dispatched round-robin. A user
+    never holds more than its fair share of workers (the pool divided between users
+    with pending or running uploads, capped by ``per_user_limit``). Batches are admitted
+    all-or-nothing so a request is either fully queued or rejected with a retry hint.
+    """
+
+    def __init__(self, max_workers, max_queue_depth, per_user_limit):
+        """Configure pool size, total queue depth and the per-user concurrency cap."""
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.per_user_limit = per_user_limit
+        self._condition = threading.Condition()
+        self._pending = OrderedDict()  # user -> deque of (future, fn, item), in round-robin order
+        self._in_flight = {}  # user -> running upload count
+        self._queue_length = 0
+        self._average_duration = 1.0  # Seconds, exponentially weighted
+        self._pid = None
+
+    def submit(self, user, fn, items):
+        """Queue ``fn(item)`` for every item on behalf of ``user`` and return their futures."""
+        if not items:
+            return []
+        with self._condition:
+            self._ensure_workers()
+            if self._queue_length + len(items) > self.max_queue_depth:
+                metrics.increment('uploads.rejected', len(items))
+                raise UploadQueueFull(self._estimate_retry_after())
+            futures = []
+            queue = self._pending.setdefault(user, deque())
+            for item in items:
+                future = Future()
+                queue.append((future, fn, item))
+                futures.append(future)
+            self._queue_length += len(items)
+            self._condition.notify_all()
+        return futures
+
+    def map(self, user, fn, items):
+        """Run ``fn`` over ``items`` through the shared pool and return results in order."""
+        return [future.result() for future in self.submit(user, fn, list(items))]
+
+    def metrics(self):
+        """Return queue length, in-flight uploads and their per-user breakdown."""
+        with self._condition:
+            return {
+                'queue_length': self._queue_length,
+                'in_flight': sum(self._in_flight.values()),
+                'max_workers': self.max_workers,
+                'max_queue_depth': self.max_queue_depth,
+                'users': {
+                    str(user): {'queued': len(self._pending.get(user, ())), 'in_flight': self._in_flight.get(user, 0)}
+                    for user in set(self._pending) | set(self._in_flight)
+                },
+            }
+
+    def _ensure_workers(self):
+        """Start worker threads lazily, and again in a process forked after they started."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        for _ in range(self.max_workers):
+            threading.Thread(target=self._work, daemon=True, name='upload-scheduler').start()
+
+    def _fair_share(self):
+        """Return how many workers a single user may occupy right now."""
+        active_users = len(set(self._pending) | set(self._in_flight)) or 1
+        return max(1, min(self.per_user_limit, math.ceil(self.max_workers / active_users)))
+
+    def _next_task(self):
+        """Pop the next runnable task in round-robin order, or return None."""
+        share = self._fair_share()
+        for user in list(self._pending):
+            if self._in_flight.get(user, 0) >= share:
+                continue
+            queue = self._pending.pop(user)
+            task = queue.popleft()
+            if queue:
+                self._pending[user] = queue  # Re-append so the next user goes first
+            self._queue_length -= 1
+            self._in_flight[user] = self._in_flight.get(user, 0) + 1
+            return user, task
+        return None
+
+    def _estimate_retry_after(self):
+        """Guess when enough capacity frees up to admit new work, in whole seconds."""
+        return max(1, math.ceil(self._average_duration * self._queue_length / self.max_workers))
+
+    def _work(self):
+        """Worker loop: take the next fair task, run it, and release the user's slot."""
+        while True:
+            with self._condition:
+                next_task = self._next_task()
+                while next_task is None:
+                    self._condition.wait()
+                    next_task = self._next_task()
+            user, (future, fn, item) = next_task
+            started = time.monotonic()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(item))
+                except BaseException as exc:
+                    future.set_exception(exc)
+            with self._condition:
+                self._average_duration = 0.8 * self._average_duration + 0.2 * (time.monotonic() - started)
+                self._in_flight[user] -= 1
+                if not self._in_flight[user]:
+                    del self._in_flight[user]
+                self._condition.notify_all()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_upload_scheduler():
+    """Return the scheduler shared by every request in this process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = UploadScheduler(
+                max_workers=settings.UPLOAD_MAX_CONCURRENCY,
+                max_queue_depth=settings.UPLOAD_MAX_QUEUE_DEPTH,
+                per_user_limit=settings.UPLOAD_PER_USER_MAX_IN_FLIGHT,
+            )
+            metrics.register_gauge('uploads.queue_length', lambda: _scheduler.metrics()['queue_length'])
+            metrics.register_gauge('uploads.in_flight', lambda: _scheduler.metrics()['in_flight'])
+        return _scheduler
@@ -0,0 +1,222 @@
+"""Upload files to OpenAI through the content index and the shared upload scheduler."""
+
+import asyncio
+import logging
+from concurrent.futures import as_completed
+
+from asgiref.sync import sync_to_async
+
+from openai_app.services.services import AsyncOpenAIService, OpenAIService
+from project.models import UploadedContent
+from project.services.upload_scheduler import get_upload_scheduler
+from project.services.vector_stores import VectorStoreManager
+from project.upload_handlers import get_content_hash
+
+logger = logging.getLogger(__name__)
+
+
+def vector_store_file_dict(openai_file):
+    """Convert a VectorStoreFile object to a dictionary."""
+    return {
+        "id": openai_file.id,
+        "created_at": openai_file.created_at,
+        "last_error": openai_file.last_error,
+        "object": openai_file.object,
+        "status": openai_file.status,
+        "usage_bytes": openai_file.usage_bytes,
+        "vector_store_id": openai_file.vector_store_id,
+    }
+
+
+def attachment_results(vector_store_files, openai_file_ids, filenames):
+    """Return an upload result per content hash from the vector store files the attachment produced."""
+    results = {}
+    for content_hash, file_id in openai_file_ids.items():
+        vector_store_file = vector_store_files.get(file_id)
+        result = {"filename": filenames[content_hash]}
+        if vector_store_file is not None and vector_store_file.status == "completed":
+            result["data"] = vector_store_file_dict(vector_store_file)
+        else:
+            last_error = vector_store_file and vector_store_file.last_error
+            result["error"] = last_error.message if last_error else "Vector store attachment failed."
+        results[content_hash] = result
+    return results
+
+
+def attach_to_vector_store(openai_service, vector_store_id, openai_file_ids, filenames):
+    """Attach uploaded files with file batches and return an upload result per content hash."""
+    try:
+        vector_store_files = openai_service.attach_files(vector_store_id, openai_file_ids.values())
+    except Exception as e:
+        logger.error(f"OpenAI vector store batch error: {e}")
+        vector_store_files = {}
+    return attachment_results(vector_store_files, openai_file_ids, filenames)
+
+
+async def aattach_to_vector_store(openai_service, vector_store_id, openai_file_ids, filenames):
+    """Like ``attach_to_vector_store``, with an ``AsyncOpenAIService``."""
+    try:
+        vector_store_files = await openai_service.attach_files(vector_store_id, openai_file_ids.values())
+    except Exception as e:
+        logger.error(f"OpenAI vector store batch error: {e}")
+        vector_store_files = {}
+    return attachment_results(vector_store_files, openai_file_ids, filenames)
+
+
+def index_attached_contents(vector_store_manager, project_id, vector_store_id, upload_results):
+    """Record successful attachments in the content index and in the store's usage totals."""
+    attached = {content_hash: result["data"] for content_hash, result in upload_results.items() if "data" in result}
+    if not attached:
+        return
+    vector_store_manager.record_usage(
+        project_id, vector_store_id, len(attached), sum(data["usage_bytes"] or 0 for data in attached.values())
+    )
+    UploadedContent.objects.bulk_create(
+        [
+            UploadedContent(
+                content_hash=content_hash,
+                vector_store_id=vector_store_id,
+                openai_file_id=data["id"],
+                usage_bytes=data["usage_bytes"] or 0,
+            )
+            for content_hash, data in attached.items()
+        ],
+        ignore_conflicts=True,  # A concurrent request may have indexed the same content
+    )
+
+
+class UploadPlan:
+    """The work of uploading ``files`` to a project's vector store, and its results as they arrive.
+
+    Content already in the project's store is answered without calling OpenAI, content
+    uploaded for another project is only attached, and duplicates inside ``files`` are
+    uploaded once. ``on_result(index, result)`` is called as each file finishes.
+    """
+
+    def __init__(self, openai_service, project_id, files, on_result=None):
+        """Look the files' contents up in the content index; needs the project's vector store."""
+        self.vector_store_manager = VectorStoreManager(openai_service)
+        self.project_id = project_id
+        self.vector_store_id = self.vector_store_manager.get_vector_store_id(project_id)
+        self.files = files
+        self.on_result = on_result
+        self.content_hashes = [get_content_hash(file) for file in files]
+        self.known_contents = {}  # Already attached to this project's store
+        openai_file_ids = {}  # Uploaded before for another store; only needs attaching
+        for content in UploadedContent.objects.filter(content_hash__in=self.content_hashes):
+            if content.vector_store_id == self.vector_store_id:
+                self.known_contents[content.content_hash] = content
+            else:
+                openai_file_ids[content.content_hash] = content.openai_file_id
+        self.pending_files = {}  # First file seen for each content hash not yet in this store
+        for file, content_hash in zip(files, self.content_hashes):
+            if content_hash not in self.known_contents:
+                self.pending_files.setdefault(content_hash, file)
+        self.reused_hashes = set(openai_file_ids) & set(self.pending_files)
+        self.openai_file_ids = {content_hash: openai_file_ids[content_hash] for content_hash in self.reused_hashes}
+        self.new_hashes = [
+            content_hash for content_hash in self.pending_files if content_hash not in self.reused_hashes
+        ]
+        self.upload_results = {}
+        self.results = [None] * len(files)
+
+    @property
+    def new_files(self):
+        """The files to upload, one per content hash in ``new_hashes``."""
+        return [self.pending_files[content_hash] for content_hash in self.new_hashes]
+
+    @property
+    def filenames(self):
+        """The name of the file each pending content hash is uploaded as."""
+        return {content_hash: file.name for content_hash, file in self.pending_files.items()}
+
+    def finish(self, content_hash, upload_result=None):
+        """Fill in the result of every file with this content; without a result, from the content index."""
+        for index, (file, file_hash) in enumerate(zip(self.files, self.content_hashes)):
+            if file_hash != content_hash:
+                continue
+            if upload_result is None:
+                result = {"filename": file.name, "data": self.known_contents[content_hash].as_vector_store_file()}
+            elif self.pending_files[content_hash] is file:
+                result = dict(upload_result, cached=content_hash in self.reused_hashes)
+            else:  # Duplicate of a file uploaded earlier in this batch
+                result = dict(upload_result, filename=file.name)
+            result.setdefault("cached", "error" not in result)
+            self.results[index] = dict(result, content_hash=content_hash)
+            if self.on_result:
+                self.on_result(index, self.results[index])
+
+    def finish_known(self):
+        """Answer the files whose content is already in the project's store."""
+        for content_hash in self.known_contents:
+            self.finish(content_hash)
+
+    def uploaded(self, content_hash, future):
+        """Record the outcome of a finished upload future; a failed upload finishes its files."""
+        try:
+            self.openai_file_ids[content_hash] = future.result().id
+        except Exception as e:
+            logger.error(f"OpenAI File Upload Error: {e}")
+            self.upload_results[content_hash] = {"filename": self.pending_files[content_hash].name, "error": str(e)}
+            self.finish(content_hash, self.upload_results[content_hash])
+
+    def attached(self, attach_results):
+        """Finish every file given to the vector store with the result of its attachment."""
+        for content_hash, result in attach_results.items():
+            self.upload_results[content_hash] = result
+            self.finish(content_hash, result)
+
+    def index(self):
+        """Record the successful attachments in the content index."""
+        index_attached_contents(self.vector_store_manager, self.project_id, self.vector_store_id, self.upload_results)
+
+
+def upload_files(user_id, project_id, files, on_result=None):
+    """Upload ``files`` to a project's vector store and return one result per file, in order.
+
+    See ``UploadPlan`` for what is uploaded; ``on_result(index, result)`` is called from the
+    calling thread as each file finishes. Raises ``UploadQueueFull`` when the scheduler is
+    saturated.
+    """
+    openai_service = OpenAIService()
+    plan = UploadPlan(openai_service, project_id, files, on_result)
+
+    # Upload new content concurrently on the shared pool, then attach it all with file batches
+    futures = get_upload_scheduler().submit(user_id, openai_service.create_file, plan.new_files)
+    plan.finish_known()
+    future_hashes = dict(zip(futures, plan.new_hashes))
+    for future in as_completed(futures):
+        plan.uploaded(future_hashes[future], future)
+
+    if plan.openai_file_ids:
+        plan.attached(attach_to_vector_store(
+            openai_service, plan.vector_store_id, plan.openai_file_ids, plan.filenames
+        ))
+
+    plan.index()
+    return plan.results
+
+
+async def aupload_files(user_id, project_id, files):
+    """Like ``upload_files``, awaiting OpenAI instead of blocking a thread on it.
+
+    Uploads still go through the shared scheduler, which keeps them fair across users and
+    bounded (so this too raises ``UploadQueueFull``); the request awaits their futures. The
+    vector store attachment, which waits on OpenAI's processing, runs on the event loop.
+    """
+    openai_service = OpenAIService()
+    plan = await sync_to_async(UploadPlan)(openai_service, project_id, files)
+    futures = get_upload_scheduler().submit(user_id, openai_service.create_file, plan.new_files)
+    plan.finish_known()
+    if futures:
+        await asyncio.wait([asyncio.wrap_future(future) for future in futures])
+    for content_hash, future in zip(plan.new_hashes, futures):
+        plan.uploaded(content_hash, future)
+
+    if plan.openai_file_ids:
+        plan.attached(await aattach_to_vector_store(
+            AsyncOpenAIService(), plan.vector_store_id, plan.openai_file_ids, plan.filenames
+        ))
+
+    await sync_to_async(plan.index)()
+    return plan.results
@@ -0,0 +1,114 @@
+"""Per-project OpenAI vector stores with cached lookups and size-based rotation."""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from openai_app.services.services import OpenAIService
+from project.models import Project, ProjectVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreManager:
+    """Resolve each project's active vector store, creating it on first use.
+
+    Lookups go through an in-process cache, then the shared Django cache (Redis when
+    ``REDIS_URL`` is set), then the database, so the upload path normally makes no
+    lookup call at all. Once a store passes ``VECTOR_STORE_MAX_FILES`` or
+    ``VECTOR_STORE_MAX_BYTES`` it is retired and the next upload creates a fresh one.
+    Other processes keep using a retired store until their in-process entry expires
+    after ``VECTOR_STORE_LOCAL_CACHE_TIMEOUT`` seconds.
+    """
+
+    _local_cache = {}  # project id -> (vector store id, monotonic expiry)
+    _local_lock = threading.Lock()
+
+    def __init__(self, openai_service=None):
+        """Use the given OpenAI service, or create one when a store has to be created."""
+        self._openai_service = openai_service
+
+    @property
+    def openai_service(self):
+        """Return the OpenAI service, creating it lazily."""
+        if self._openai_service is None:
+            self._openai_service = OpenAIService()
+        return self._openai_service
+
+    @staticmethod
+    def cache_key(project_id):
+        """Return the shared cache key for a project's active store."""
+        return f"project:{project_id}:vector_store_id"
+
+    @classmethod
+    def clear_local_cache(cls):
+        """Forget every in-process mapping."""
+        with cls._local_lock:
+            cls._local_cache.clear()
+
+    def get_vector_store_id(self, project_id):
+        """Return the id of the project's active vector store, creating it if needed."""
+        project_id = str(project_id)
+        with self._local_lock:
+            vector_store_id, expires_at = self._local_cache.get(project_id, (None, 0))
+        if vector_store_id and expires_at > time.monotonic():
+            return vector_store_id
+
+        vector_store_id = cache.get(self.cache_key(project_id))
+        if vector_store_id is None:
+            vector_store_id = self._get_or_create(project_id)
+            cache.set(self.cache_key(project_id), vector_store_id, settings.VECTOR_STORE_CACHE_TIMEOUT)
+        self._remember(project_id, vector_store_id)
+        return vector_store_id
+
+    def record_usage(self, project_id, vector_store_id, file_count, usage_bytes):
+        """Add newly attached files to a store's totals and rotate it once it is too large."""
+        store = ProjectVectorStore.objects.filter(vector_store_id=vector_store_id)
+        store.update(file_count=F("file_count") + file_count, usage_bytes=F("usage_bytes") + usage_bytes)
+        over_limits = Q(file_count__gte=settings.VECTOR_STORE_MAX_FILES) | Q(
+            usage_bytes__gte=settings.VECTOR_STORE_MAX_BYTES
+        )
+        rotated = store.filter(over_limits, is_active=True).update(is_active=False, rotated_at=timezone.now())
+        if not rotated:
+            return
+        logger.info(f"Rotating vector store {vector_store_id} of project {project_id}")
+        self.invalidate(project_id)
+        if settings.VECTOR_STORE_EXPIRES_AFTER_DAYS:
+            try:
+                self.openai_service.expire_vector_store(vector_store_id, settings.VECTOR_STORE_EXPIRES_AFTER_DAYS)
+            except Exception as e:
+                logger.error(f"Could not set expiry on vector store {vector_store_id}: {e}")
+
+    def invalidate(self, project_id):
+        """Drop cached mappings for a project in this process and in the shared cache."""
+        project_id = str(project_id)
+        with self._local_lock:
+            self._local_cache.pop(project_id, None)
+        cache.delete(self.cache_key(project_id))
+
+    def _remember(self, project_id, vector_store_id):
+        """Store a mapping in the in-process cache."""
+        expires_at = time.monotonic() + settings.VECTOR_STORE_LOCAL_CACHE_TIMEOUT
+        with self._local_lock:
+            self._local_cache[project_id] = (vector_store_id, expires_at)
+
+    def _get_or_create(self, project_id):
+        """Read the active store from the database, creating one under a row lock if missing."""
+        store = ProjectVectorStore.objects.filter(project_id=project_id, is_active=True).first()
+        if store:
+            return store.vector_store_id
+        with transaction.atomic():
+            project = Project.objects.select_for_update().get(id=project_id)  # Serialize concurrent creators
+            store = ProjectVectorStore.objects.filter(project=project, is_active=True).first()
+            if store is None:
+                store = ProjectVectorStore.objects.create(
+                    project=project,
+                    vector_store_id=self.openai_service.create_vector_store(name=f"project-{project.id}"),
+                )
+        return store.vector_store_id
@@ -0,0 +1,174 @@
+"""Store updated versions of project files, reusing the results of segments that did not change."""
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import connection, transaction
+
+from project.models import ProjectFile, TranslationSegment
+from project.services.parsing import get_or_parse_files
+from project.services.segments import load_rows, segment_rows
+from project.upload_handlers import get_content_hash
+
+logger = logging.getLogger(__name__)
+
+CARRY_OVER_BATCH_SIZE = 1000
+
+
+@dataclass
+class SegmentDiff:
+    """How a new file version's segments line up with the previous version's."""
+
+    reused: dict = field(default_factory=dict)  # New segment id -> pk of the unchanged previous segment
+    recomputed: int = 0  # New or changed segments
+    removed: int = 0  # Previous segments with no counterpart
+
+    def as_dict(self):
+        """Return the counts reported to API clients."""
+        return {"reused": len(self.reused), "recomputed": self.recomputed, "removed": self.removed}
+
+
+def diff_segments(previous, current):
+    """Align a new version's segments with the previous version's, first by id and then by content.
+
+    ``previous`` holds (pk, segment_id, source_hash, target_hash) and ``current`` holds
+    (segment_id, source_hash, target_hash). A segment is reused when the previous segment with
+    its id has the same hashes, or else when an unclaimed previous segment has the same hashes,
+    so segments that only moved or were renumbered keep their results.
+    """
+    previous = list(previous)
+    by_id = {segment_id: (pk, (source_hash, target_hash)) for pk, segment_id, source_hash, target_hash in previous}
+    diff = SegmentDiff()
+    claimed = set()
+    unmatched = []
+    for segment_id, source_hash, target_hash in current:
+        pk, hashes = by_id.get(segment_id, (None, None))
+        if hashes == (source_hash, target_hash):
+            diff.reused[segment_id] = pk
+            claimed.add(pk)
+        else:
+            unmatched.append((segment_id, (source_hash, target_hash)))
+
+    by_content = defaultdict(list)
+    for pk, _, source_hash, target_hash in reversed(previous):  # Reversed so pop() claims in document order
+        if pk not in claimed:
+            by_content[source_hash, target_hash].append(pk)
+    for segment_id, hashes in unmatched:
+        candidates = by_content.get(hashes)
+        if candidates:
+            pk = candidates.pop()
+            diff.reused[segment_id] = pk
+            claimed.add(pk)
+        else:
+            diff.recomputed += 1
+    diff.removed = len(previous) - len(claimed)
+    return diff
+
+
+def derived_fields():
+    """Return the TranslationSegment fields computed from a segment rather than parsed from its file."""
+    return [
+        model_field for model_field in TranslationSegment._meta.concrete_fields
+        if model_field.name not in TranslationSegment.CONTENT_FIELDS
+    ]
+
+
+def carry_over_results(project_file, reused, fields=None):
+    """Copy ``fields`` (by default every derived field) from previous segments to the file's reused segments.
+
+    ``reused`` maps segment ids of ``project_file`` to previous segment pks. PostgreSQL does it
+    in one ``UPDATE ... FROM unnest()`` inside the database; other databases read the values
+    and write them back with ``bulk_update``. Returns the number of segments updated.
+    """
+    fields = derived_fields() if fields is None else fields
+    if not fields or not reused:
+        return 0
+    if connection.vendor == "postgresql":
+        quote = connection.ops.quote_name
+        table = quote(TranslationSegment._meta.db_table)
+        assignments = ", ".join(
+            f"{quote(model_field.column)} = previous.{quote(model_field.column)}" for model_field in fields
+        )
+        sql = (
+            f"UPDATE {table} SET {assignments} "
+            "FROM unnest(%s::varchar[], %s::bigint[]) AS pairs (segment_id, previous_id) "
+            f"JOIN {table} AS previous ON previous.id = pairs.previous_id "
+            f"WHERE {table}.project_file_id = %s AND {table}.segment_id = pairs.segment_id"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [list(reused), list(reused.values()), project_file.pk])
+            return cursor.rowcount
+
+    names = [model_field.name for model_field in fields]
+    previous_values = {
+        values["pk"]: values
+        for values in TranslationSegment.objects.filter(pk__in=reused.values()).values("pk", *names).iterator()
+    }
+    segments = []
+    for segment in TranslationSegment.objects.filter(project_file=project_file, segment_id__in=list(reused)).iterator():
+        values = previous_values[reused[segment.segment_id]]
+        for name in names:
+            setattr(segment, name, values[name])
+        segments.append(segment)
+    TranslationSegment.objects.bulk_update(segments, names, batch_size=CARRY_OVER_BATCH_SIZE)
+    return len(segments)
+
+
+def ingest_file_version(project_file, previous, segments):
+    """Store the segments of ``project_file``, an update of ``previous``, and carry over unchanged results.
+
+    Segments are loaded like any other file's while their hashes are collected, so the diff
+    needs no extra pass over the new content. Returns the :class:`SegmentDiff`.
+    """
+    current = []
+
+    def recorded(rows):
+        """Pass rows through, remembering each segment's id and hashes."""
+        for row in rows:
+            current.append((row[1], row[6], row[7]))
+            yield row
+
+    with transaction.atomic():
+        TranslationSegment.objects.filter(project_file=project_file).delete()
+        load_rows(recorded(segment_rows(project_file.pk, segments)))
+        diff = diff_segments(
+            previous.segments.values_list("pk", "segment_id", "source_hash", "target_hash").iterator(), current
+        )
+        carry_over_results(project_file, diff.reused)
+    logger.info(
+        f"Stored version {project_file.version} of {project_file.file_name}: {len(diff.reused)} segments reused, "
+        f"{diff.recomputed} recomputed, {diff.removed} removed"
+    )
+    return diff
+
+
+def parse_file_version(previous, file):
+    """Parse an uploaded file as the type of ``previous``, through the parse cache and the parsing pool.
+
+    Parse a new version before uploading it, so a file that cannot be parsed never reaches OpenAI.
+    """
+    (segments,) = get_or_parse_files([(get_content_hash(file), previous.file_type, file)])
+    return segments
+
+
+def create_file_version(previous, file, segments, upload_result, user):
+    """Record an uploaded file as the next version of ``previous`` and store its parsed ``segments``.
+
+    ``upload_result`` is the file's successful result from ``upload_files``. Returns the new
+    ProjectFile and its :class:`SegmentDiff`.
+    """
+    with transaction.atomic():
+        project_file = ProjectFile.objects.create(
+            project=previous.project,
+            uploaded_by=user,
+            openai_file_id=upload_result["data"]["id"],
+            vector_store_id=upload_result["data"]["vector_store_id"],
+            file_name=file.name,
+            file_type=previous.file_type,
+            content_hash=upload_result["content_hash"],
+            version=previous.version + 1,
+            previous_version=previous,
+        )
+        diff = ingest_file_version(project_file, previous, segments)
+    return project_file, diff
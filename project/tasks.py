@@ -0,0 +1,123 @@
+"""Celery tasks for project app."""
+
+import logging
+
+from celery import shared_task
+from django.core.files import File
+
+from project.models import ProjectFile, UploadJob, UploadJobFile
+from project.services.embeddings import embed_project_file
+from project.services.qa import review_project_file
+from project.services.segments import ingest_project_file
+from project.services.upload_scheduler import UploadQueueFull
+from project.services.uploads import upload_files
+
+logger = logging.getLogger(__name__)
+
+
+def delete_stored_file(job_file):
+    """Delete the stored copy of a job file, which is only kept until the worker is done with it."""
+    if job_file.file:
+        job_file.file.delete(save=False)
+        job_file.save(update_fields=["file"])
+
+
+@shared_task()
+def ingest_upload_job_file(job_file_id):
+    """Parse an uploaded job file into segments; one task per file spreads parsing over prefork workers.
+
+    A file that fails to parse keeps its upload. Either way the stored copy is deleted.
+    """
+    job_file = UploadJobFile.objects.select_related("project_file").get(pk=job_file_id)
+    try:
+        with job_file.file.open("rb") as source:
+            count = ingest_project_file(job_file.project_file, source)
+    except Exception as e:
+        logger.error(f"Could not parse {job_file.file_name} into segments: {e}")
+        return
+    finally:
+        delete_stored_file(job_file)
+    if count:
+        embed_file_segments.delay(str(job_file.project_file_id))
+
+
+@shared_task(bind=True, max_retries=3)
+def embed_file_segments(self, project_file_id):
+    """Embed a project file's segments that have no embedding yet, in a few large batched calls."""
+    project_file = ProjectFile.objects.get(pk=project_file_id)
+    try:
+        embed_project_file(project_file)
+    except Exception as e:
+        logger.error(f"Could not embed segments of {project_file.file_name}: {e}")
+        raise self.retry(exc=e, countdown=60)  # Vectors written before the failure are kept
+
+
+@shared_task(bind=True, max_retries=3)
+def review_file_segments(self, project_file_id):
+    """Run LQA over a project file's segments that have no QA result yet, in a few packed requests."""
+    project_file = ProjectFile.objects.get(pk=project_file_id)
+    try:
+        review_project_file(project_file)
+    except Exception as e:
+        logger.error(f"Could not review segments of {project_file.file_name}: {e}")
+        raise self.retry(exc=e, countdown=60)  # Results written before the failure are kept
+
+
+@shared_task(bind=True)
+def process_upload_job(self, job_id):
+    """Upload a job's stored files to OpenAI, record their ProjectFile rows and queue their parsing."""
+    job = UploadJob.objects.select_related("project").get(id=job_id)
+    job_files = list(job.files.all())
+    job.status = "running"
+    job.save(update_fields=["status", "updated_at"])
+    job.files.filter(status="queued").update(status="running")
+
+    files = []
+    for job_file in job_files:
+        file = File(job_file.file.open("rb"), name=job_file.file_name)
+        file.content_hash = job_file.content_hash
+        files.append(file)
+
+    def record_result(index, result):
+        """Persist each file's outcome as soon as it is known so clients can poll progress."""
+        job_file = job_files[index]
+        if "error" in result:
+            job_file.status, job_file.error = "failed", result["error"]
+            job_file.save(update_fields=["status", "error"])
+            return
+        job_file.project_file = ProjectFile.objects.create(
+            project=job.project,
+            uploaded_by=job.created_by,
+            openai_file_id=result["data"]["id"],
+            vector_store_id=result["data"]["vector_store_id"],
+            file_name=job_file.file_name,
+            file_type=job_file.file_type,
+            content_hash=job_file.content_hash,
+        )
+        job_file.status, job_file.cached = "completed", result["cached"]
+        job_file.save(update_fields=["status", "cached", "project_file"])
+
+    try:
+        upload_files(job.created_by_id, job.project_id, files, on_result=record_result)
+    except UploadQueueFull as e:
+        raise self.retry(countdown=e.retry_after, max_retries=None)
+    except Exception as e:
+        job.files.exclude(status__in=["completed", "failed"]).update(status="failed", error=str(e))
+        job.status = "failed"
+        job.save(update_fields=["status", "updated_at"])
+        for job_file in job_files:
+            if job_file.project_file is None:
+                delete_stored_file(job_file)
+        raise
+    finally:
+        for file in files:
+            file.close()
+
+    for job_file in job_files:
+        if job_file.project_file is not None:
+            ingest_upload_job_file.delay(job_file.pk)
+        else:
+            delete_stored_file(job_file)  # A failed upload is not retried from the stored copy
+
+    job.status = "failed" if any(job_file.status == "failed" for job_file in job_files) else "completed"
+    job.save(update_fields=["status", "updated_at"])
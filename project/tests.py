@@ -1,3 +1,692 @@
-from django.test import TestCase
+"""Tests for project app."""
 
-# Create your tests here.
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from unittest.mock import patch
+
+from defusedxml import EntitiesForbidden
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.status import HTTP_201_CREATED, HTTP_202_ACCEPTED, HTTP_503_SERVICE_UNAVAILABLE
+from rest_framework.test import APITestCase
+
+from openai_app.utils.stub_server import stub_embedding
+from openai_app.utils.testing import StubOpenAIMixin
+from project.management.commands.benchmark_xliff_parser import write_sdlxliff
+from project.models import Project, ProjectFile, ProjectVectorStore, TranslationSegment, UploadedContent
+from project.parsers.batches import SegmentBatch, iter_file_segments
+from project.parsers.ooxml import extract_docx, extract_pptx, extract_xlsx
+from project.parsers.xliff import InlineTag, parse_xliff
+from project.services.embeddings import embed_project_file
+from project.services.hybrid_search import reciprocal_rank_fusion
+from project.services.parse_cache import ParseCache
+from project.services.parsing import get_or_parse_files, get_parse_pool, parse_files
+from project.services.segments import CopyReader, ingest_segments, text_hash
+from project.services.upload_scheduler import UploadQueueFull, UploadScheduler
+from project.services.vector_stores import VectorStoreManager
+from project.services.versions import ingest_file_version
+from project.tasks import process_upload_job
+from project.upload_handlers import get_content_hash
+
+User = get_user_model()
+
+
+class ContentHashUploadHandlerTest(SimpleTestCase):
+    """Test SHA-256 fingerprints computed while multipart uploads are parsed."""
+
+    def test_hash_attached_to_in_memory_file(self):
+        """Test small uploads carry the digest of their bytes."""
+        request = RequestFactory().post('/', {'file': SimpleUploadedFile('a.xliff', b'hello')})
+        file = request.FILES['file']
+        self.assertEqual(file.content_hash, hashlib.sha256(b'hello').hexdigest())
+        self.assertEqual(get_content_hash(file), file.content_hash)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_hash_attached_to_temporary_file(self):
+        """Test uploads spooled to disk carry the digest of their bytes."""
+        payload = b'x' * 100_000
+        request = RequestFactory().post('/', {'file': SimpleUploadedFile('a.docx', payload)})
+        file = request.FILES['file']
+        self.assertTrue(hasattr(file, 'temporary_file_path'))
+        self.assertEqual(file.content_hash, hashlib.sha256(payload).hexdigest())
+
+    def test_hash_computed_for_unparsed_file(self):
+        """Test files that never went through the handlers are hashed on demand."""
+        file = SimpleUploadedFile('a.xlsx', b'hello')
+        self.assertEqual(get_content_hash(file), hashlib.sha256(b'hello').hexdigest())
+
+
+class MediaUploadTest(StubOpenAIMixin, APITestCase):
+    """Test the media upload API."""
+
+    def setUp(self):
+        """Authenticate and point the OpenAI client at a stub."""
+        super().setUp()
+        self.user = User.objects.create_user(email='uploader@example.com', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.addCleanup(cache.clear)
+        self.addCleanup(VectorStoreManager.clear_local_cache)
+        self.project = Project.objects.create(name='Handoff', client_name='ACME', created_by=self.user)
+        self.url = reverse('media-media')
+
+    def test_second_upload_is_cache_hit(self):
+        """Test the same bytes are uploaded once across requests and within a request."""
+        first = self.client.post(self.url, {'project': str(self.project.id), 'file': [
+            SimpleUploadedFile('a.sdlxliff', b'same bytes'),
+            SimpleUploadedFile('b.sdlxliff', b'same bytes'),
+        ]}, format='multipart')
+        second = self.client.post(self.url, {
+            'project': str(self.project.id), 'file': SimpleUploadedFile('c.sdlxliff', b'same bytes'),
+        }, format='multipart')
+
+        self.assertEqual(first.status_code, HTTP_201_CREATED)
+        self.assertEqual(len(self.stub.file_batches), 1)
+        self.assertEqual(first.data['cache_hits'], 1)
+        self.assertEqual(second.data['cache_hits'], 1)
+        self.assertEqual(len(self.stub.files), 1)
+        self.assertEqual(second.data['data'][0]['data']['id'], first.data['data'][0]['data']['id'])
+        self.assertEqual(UploadedContent.objects.count(), 1)
+
+    def test_full_upload_queue_returns_503(self):
+        """Test saturation is reported with a Retry-After hint instead of queueing forever."""
+        with patch('project.services.uploads.get_upload_scheduler') as get_scheduler:
+            get_scheduler.return_value.submit.side_effect = UploadQueueFull(retry_after=7)
+            response = self.client.post(self.url, {
+                'project': str(self.project.id), 'file': SimpleUploadedFile('a.xliff', b'bytes'),
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '7')
+
+    def test_async_upload_job(self):
+        """Test async mode returns a job id at once and the worker records ProjectFile rows."""
+        project = self.project
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        with self.settings(MEDIA_ROOT=media_root), patch('project.api.v1.views.process_upload_job') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, {
+                    'async': 'true',
+                    'project': str(project.id),
+                    'file': [SimpleUploadedFile('a.sdlxliff', SDLXLIFF_DOCUMENT), SimpleUploadedFile('b.docx', b'two')],
+                }, format='multipart')
+            job_id = response.data['job_id']
+            task.delay.assert_called_once_with(str(job_id))
+            self.assertEqual(self.stub.files, {})
+
+            process_upload_job(str(job_id))
+
+        job = self.client.get(reverse('media-job', kwargs={'job_id': job_id})).data
+        self.assertEqual(response.status_code, HTTP_202_ACCEPTED)
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['progress'], {'total': 2, 'completed': 2, 'failed': 0})
+        self.assertEqual(len(self.stub.files), 2)
+        self.assertEqual(
+            set(ProjectFile.objects.filter(project=project).values_list('file_name', 'file_type')),
+            {('a.sdlxliff', 'sdlxliff'), ('b.docx', 'docx')},
+        )
+        segments = TranslationSegment.objects.filter(project_file__project=project)  # b.docx is not a valid zip
+        self.assertEqual(list(segments.values_list('segment_id', 'state')), [('u1:1', 'Translated'), ('u1:2', 'Draft')])
+        self.assertEqual(os.listdir(os.path.join(media_root, 'upload_jobs')), [])  # Stored copies deleted once parsed
+
+    def test_content_reused_across_projects_is_only_attached(self):
+        """Test content uploaded for one project is attached to another without re-uploading."""
+        other_project = Project.objects.create(name='Other', client_name='Globex', created_by=self.user)
+        for project in (self.project, other_project):
+            response = self.client.post(self.url, {
+                'project': str(project.id), 'file': SimpleUploadedFile('a.sdlxliff', b'same bytes'),
+            }, format='multipart')
+
+        self.assertEqual(len(self.stub.files), 1)
+        self.assertEqual(len(self.stub.vector_stores), 2)
+        self.assertTrue(response.data['data'][0]['cached'])
+        self.assertEqual(response.data['data'][0]['data']['vector_store_id'],
+                         ProjectVectorStore.objects.get(project=other_project).vector_store_id)
+
+
+class VectorStoreManagerTest(StubOpenAIMixin, TestCase):
+    """Test per-project vector store resolution, caching and rotation."""
+
+    def setUp(self):
+        """Create a project and point the OpenAI client at a stub."""
+        super().setUp()
+        self.addCleanup(cache.clear)
+        self.addCleanup(VectorStoreManager.clear_local_cache)
+        user = User.objects.create_user(email='owner@example.com', password='testpassword')
+        self.project = Project.objects.create(name='Handoff', client_name='ACME', created_by=user)
+
+    def test_store_created_once_then_served_from_cache(self):
+        """Test the first lookup creates a store and later lookups make no database or API call."""
+        vector_store_id = VectorStoreManager().get_vector_store_id(self.project.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(VectorStoreManager().get_vector_store_id(self.project.id), vector_store_id)
+        VectorStoreManager.clear_local_cache()  # A fresh process still finds it in the shared cache
+        with self.assertNumQueries(0):
+            self.assertEqual(VectorStoreManager().get_vector_store_id(self.project.id), vector_store_id)
+        self.assertEqual(list(self.stub.vector_stores), [vector_store_id])
+
+    @override_settings(VECTOR_STORE_MAX_FILES=3, VECTOR_STORE_EXPIRES_AFTER_DAYS=7)
+    def test_store_rotated_past_size_limit(self):
+        """Test a full store is retired with an expiry and the next lookup creates a new one."""
+        manager = VectorStoreManager()
+        first_id = manager.get_vector_store_id(self.project.id)
+        manager.record_usage(self.project.id, first_id, file_count=2, usage_bytes=100)
+        self.assertEqual(manager.get_vector_store_id(self.project.id), first_id)
+
+        manager.record_usage(self.project.id, first_id, file_count=1, usage_bytes=100)
+        second_id = manager.get_vector_store_id(self.project.id)
+
+        self.assertNotEqual(second_id, first_id)
+        self.assertFalse(ProjectVectorStore.objects.get(vector_store_id=first_id).is_active)
+        self.assertEqual(self.stub.vector_stores[first_id]['expires_after'], {'anchor': 'last_active_at', 'days': 7})
+
+
+class UploadSchedulerTest(SimpleTestCase):
+    """Test the shared upload scheduler's bounds and fairness."""
+
+    def run_blocking(self, scheduler, user, labels, started):
+        """Submit tasks that record their start and then wait to be released."""
+        releases = {label: threading.Event() for label in labels}
+
+        def task(label):
+            started.append(label)
+            releases[label].wait(5)
+            return label
+
+        return scheduler.submit(user, task, labels), releases
+
+    def wait_for(self, condition):
+        """Poll until ``condition`` holds or fail after a few seconds."""
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.005)
+
+    def test_concurrency_is_bounded(self):
+        """Test no more than ``max_workers`` uploads run at once."""
+        scheduler = UploadScheduler(max_workers=2, max_queue_depth=10, per_user_limit=2)
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def task(item):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return item * 2
+
+        self.assertEqual(scheduler.map('user', task, range(8)), [0, 2, 4, 6, 8, 10, 12, 14])
+        self.assertEqual(peak[0], 2)
+
+    def test_queue_depth_limit(self):
+        """Test batches that would overflow the queue are rejected whole."""
+        scheduler = UploadScheduler(max_workers=1, max_queue_depth=2, per_user_limit=1)
+        started = []
+        _, releases = self.run_blocking(scheduler, 'a', ['a1'], started)
+        self.wait_for(lambda: started == ['a1'])
+        self.run_blocking(scheduler, 'a', ['a2', 'a3'], started)
+
+        with self.assertRaises(UploadQueueFull) as raised:
+            scheduler.submit('b', str, ['b1'])
+
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(scheduler.metrics()['queue_length'], 2)
+        self.assertEqual(scheduler.metrics()['in_flight'], 1)
+        releases['a1'].set()
+
+    def test_users_share_workers_fairly(self):
+        """Test a user with a backlog cannot starve a user arriving later."""
+        scheduler = UploadScheduler(max_workers=2, max_queue_depth=10, per_user_limit=2)
+        started = []
+        _, a_releases = self.run_blocking(scheduler, 'a', ['a1', 'a2', 'a3', 'a4'], started)
+        self.wait_for(lambda: len(started) == 2)
+        b_futures, b_releases = self.run_blocking(scheduler, 'b', ['b1'], started)
+
+        a_releases['a1'].set()
+        self.wait_for(lambda: len(started) == 3)
+
+        self.assertEqual(started, ['a1', 'a2', 'b1'])
+        for release in [*a_releases.values(), *b_releases.values()]:
+            release.set()
+        self.assertEqual(b_futures[0].result(5), 'b1')
+
+
+SDLXLIFF_DOCUMENT = b"""<?xml version="1.0" encoding="utf-8"?>
+<xliff xmlns:sdl="http://sdl.com/FileTypes/SdlXliff/1.0" xmlns="urn:oasis:names:tc:xliff:document:1.2" version="1.2">
+<file original="guide.docx" source-language="en-US" target-language="de-DE"><header/><body><group>
+<trans-unit id="u1"><source>Press <g id="1">Save</g>. Done<x id="2"/></source>
+<seg-source><mrk mtype="seg" mid="1">Press <g id="1">Save</g>.</mrk>
+<mrk mtype="seg" mid="2">Done<x id="2"/></mrk></seg-source>
+<target><mrk mtype="seg" mid="1">Klicken Sie auf <g id="1">Speichern</g>.</mrk></target>
+<sdl:seg-defs><sdl:seg id="1" conf="Translated"/><sdl:seg id="2" conf="Draft"/></sdl:seg-defs></trans-unit>
+</group></body></file></xliff>"""
+
+XLIFF_DOCUMENT = b"""<?xml version="1.0"?>
+<xliff xmlns="urn:oasis:names:tc:xliff:document:1.2" version="1.2"><file original="app.json"><body>
+<trans-unit id="greeting"><source>Hello <ph id="1">{name}</ph>!</source>
+<target state="final">Hallo <ph id="1">{name}</ph>!</target></trans-unit></body></file></xliff>"""
+
+
+class XliffParserTest(SimpleTestCase):
+    """Test the streaming XLIFF/SDLXLIFF segment parser."""
+
+    def test_sdlxliff_segments(self):
+        """Test mrk segments are paired with their targets and SDL confirmation levels."""
+        first, second = parse_xliff(io.BytesIO(SDLXLIFF_DOCUMENT))
+
+        self.assertEqual((first.unit_id, first.segment_id, first.file), ('u1', '1', 'guide.docx'))
+        self.assertEqual((first.source, first.target), ('Press Save.', 'Klicken Sie auf Speichern.'))
+        self.assertEqual(first.state, 'Translated')
+        self.assertEqual(first.source_tags, [InlineTag('g', '1', 6, 10)])
+        self.assertEqual(first.target_tags, [InlineTag('g', '1', 16, 25)])
+        self.assertEqual((second.source, second.target, second.state), ('Done', None, 'Draft'))
+        self.assertEqual(second.source_tags, [InlineTag('x', '2', 4, 4)])
+
+    def test_xliff_trans_unit(self):
+        """Test an unsegmented trans-unit yields one segment with its target state, skipping code content."""
+        (segment,) = parse_xliff(io.BytesIO(XLIFF_DOCUMENT))
+
+        self.assertEqual((segment.unit_id, segment.segment_id, segment.state), ('greeting', None, 'final'))
+        self.assertEqual((segment.source, segment.target), ('Hello !', 'Hallo !'))
+        self.assertEqual(segment.target_tags, [InlineTag('ph', '1', 6, 6)])
+
+    def test_entities_refused(self):
+        """Test entity declarations are rejected instead of expanded."""
+        document = b'<!DOCTYPE x [<!ENTITY a "aaaa">]><xliff><file><body/></file></xliff>'
+
+        with self.assertRaises(EntitiesForbidden):
+            list(parse_xliff(io.BytesIO(document)))
+
+    def test_memory_stays_flat(self):
+        """Test finished trans-units are freed instead of accumulating in the tree."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'large.sdlxliff')
+            count = write_sdlxliff(path, 4 * 1024 * 1024)
+            tracemalloc.start()
+            self.addCleanup(tracemalloc.stop)
+
+            parsed = sum(1 for _ in parse_xliff(path))
+
+            peak = tracemalloc.get_traced_memory()[1]
+        self.assertEqual(parsed, count)
+        self.assertLess(peak, 1024 * 1024)
+
+
+def make_package(parts, path=None):
+    """Zip ``parts`` (member name to XML string) into an OOXML package, in memory unless ``path`` is given."""
+    target = path or io.BytesIO()
+    with zipfile.ZipFile(target, 'w') as package:
+        for name, xml in parts.items():
+            package.writestr(name, xml)
+    if path is None:
+        target.seek(0)
+    return target
+
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+A = 'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+P = 'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"'
+R = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+S = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+MC = 'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"'
+RELS = 'xmlns="http://schemas.openxmlformats.org/package/2006/relationships"'
+
+
+def relationships(targets):
+    """Return a .rels part relating rId1, rId2... to ``targets``."""
+    items = ''.join(f'<Relationship Id="rId{index}" Target="{target}"/>' for index, target in enumerate(targets, 1))
+    return f'<Relationships {RELS}>{items}</Relationships>'
+
+
+def pptx_parts(slide_texts):
+    """Return the parts of a PPTX whose slides hold ``slide_texts``, listed in reverse file order."""
+    count = len(slide_texts)
+    slide_ids = ''.join(f'<p:sldId id="{256 + index}" r:id="rId{index}"/>' for index in range(count, 0, -1))
+    parts = {
+        'ppt/presentation.xml': f'<p:presentation {P} {R}><p:sldIdLst>{slide_ids}</p:sldIdLst></p:presentation>',
+        'ppt/_rels/presentation.xml.rels': relationships(f'slides/slide{index}.xml' for index in range(1, count + 1)),
+    }
+    for index, text in enumerate(slide_texts, 1):
+        parts[f'ppt/slides/slide{index}.xml'] = (
+            f'<p:sld {P} {A}><p:cSld><p:spTree><p:sp><p:txBody><a:p><a:r><a:t>{text}</a:t></a:r><a:br/>'
+            f'<a:fld type="slidenum"><a:t>{index}</a:t></a:fld></a:p><a:p/></p:txBody></p:sp></p:spTree></p:cSld>'
+            '</p:sld>'
+        )
+    return parts
+
+
+class OOXMLExtractorTest(SimpleTestCase):
+    """Test streaming text extraction from DOCX, PPTX and XLSX packages."""
+
+    def test_docx_paragraphs_and_runs(self):
+        """Test body and table paragraphs are yielded with their runs, skipping fallback copies."""
+        document = (
+            f'<w:document {W} {MC}><w:body><w:p><w:r><w:t>Hello </w:t></w:r><w:r><w:t>world</w:t><w:tab/></w:r></w:p>'
+            '<w:p/><w:tbl><w:tr><w:tc><w:p><w:r><w:t>Cell</w:t></w:r></w:p></w:tc></w:tr></w:tbl>'
+            '<w:p><w:r><mc:AlternateContent><mc:Choice><w:txbxContent><w:p><w:r><w:t>Box</w:t></w:r></w:p>'
+            '</w:txbxContent></mc:Choice><mc:Fallback><w:p><w:r><w:t>Box</w:t></w:r></w:p></mc:Fallback>'
+            '</mc:AlternateContent></w:r></w:p></w:body></w:document>'
+        )
+
+        blocks = list(extract_docx(make_package({'word/document.xml': document})))
+
+        self.assertEqual([block.text for block in blocks], ['Hello world\t', 'Cell', 'Box'])
+        self.assertEqual(blocks[0].runs, ['Hello ', 'world\t'])
+        self.assertEqual((blocks[0].kind, blocks[0].part, blocks[0].location), ('paragraph', 'word/document.xml', '0'))
+
+    def test_pptx_slides_in_presentation_order(self):
+        """Test slides follow the presentation's slide list, not zip member names."""
+        blocks = list(extract_pptx(make_package(pptx_parts(['First', 'Second']))))
+
+        self.assertEqual([(block.part, block.text) for block in blocks],
+                         [('ppt/slides/slide2.xml', 'Second\n2'), ('ppt/slides/slide1.xml', 'First\n1')])
+        self.assertEqual(blocks[0].runs, ['Second\n', '2'])
+
+    def test_pptx_slides_in_parallel(self):
+        """Test a process pool yields the same blocks in the same order."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = make_package(pptx_parts([f'Slide {index}' for index in range(6)]), os.path.join(directory, 'a.pptx'))
+
+            self.assertEqual(list(extract_pptx(path, max_workers=3)), list(extract_pptx(path)))
+
+    def test_xlsx_text_cells(self):
+        """Test shared, rich, inline and formula strings are yielded and numbers skipped."""
+        parts = {
+            'xl/workbook.xml': f'<workbook {S} {R}><sheets><sheet name="Strings" r:id="rId1"/></sheets></workbook>',
+            'xl/_rels/workbook.xml.rels': relationships(['worksheets/sheet1.xml']),
+            'xl/sharedStrings.xml': (
+                f'<sst {S}><si><t>Plain</t></si><si><r><t>Rich </t></r><r><t>text</t></r></si></sst>'
+            ),
+            'xl/worksheets/sheet1.xml': (
+                f'<worksheet {S}><sheetData><row r="1"><c r="A1" t="s"><v>1</v></c><c r="B1"><v>42</v></c>'
+                '<c r="C1" t="inlineStr"><is><t>Inline</t></is></c></row><row r="2"><c r="A2" t="s"><v>0</v></c>'
+                '<c r="B2" t="str"><f>A2</f><v>Plain</v></c></row></sheetData></worksheet>'
+            ),
+        }
+
+        blocks = list(extract_xlsx(make_package(parts)))
+
+        self.assertEqual([(block.location, block.text) for block in blocks],
+                         [('A1', 'Rich text'), ('C1', 'Inline'), ('A2', 'Plain'), ('B2', 'Plain')])
+        self.assertEqual(blocks[0].runs, ['Rich ', 'text'])
+        self.assertEqual(blocks[0].part, 'xl/worksheets/sheet1.xml')
+
+
+class SegmentIngestTest(TestCase):
+    """Test storing parsed segments."""
+
+    def setUp(self):
+        """Create a project file to attach segments to."""
+        user = User.objects.create_user(email='segments@example.com', password='testpassword')
+        project = Project.objects.create(name='Segments', client_name='Initech', created_by=user)
+        self.project_file = ProjectFile.objects.create(
+            project=project, openai_file_id='file-1', file_name='a.xliff', file_type='xliff'
+        )
+
+    def test_segments_replaced_with_hashes_and_unique_ids(self):
+        """Test re-ingesting replaces a file's segments and repeated ids are kept apart."""
+        ingest_segments(self.project_file, [('u1', 'Old', None, None)])
+
+        count = ingest_segments(self.project_file, [('u1', 'Hello', 'Hallo', 'final'), ('u1', 'Bye', None, None)])
+
+        segments = list(self.project_file.segments.all())
+        self.assertEqual(count, 2)
+        self.assertEqual([(segment.segment_id, segment.position) for segment in segments], [('u1', 0), ('u1#1', 1)])
+        self.assertEqual((segments[0].source_hash, segments[0].target_hash), (text_hash('Hello'), text_hash('Hallo')))
+        self.assertEqual((segments[1].target, segments[1].state, segments[1].target_hash), (None, '', ''))
+
+    def test_copy_reader_escapes_text_format(self):
+        """Test COPY lines escape separators, drop NUL and mark nulls, across arbitrary read sizes."""
+        rows = [(1, 'a\tb', 'line\nbreak\\', None), (2, 'nul\x00', '', 'cr\r')]
+        expected = '1\ta\\tb\tline\\nbreak\\\\\t\\N\n2\tnul\t\tcr\\r\n'
+
+        reader = CopyReader(rows)
+        chunks = iter(lambda: reader.read(5), '')
+
+        self.assertEqual(''.join(chunks), expected)
+        self.assertEqual(reader.count, 2)
+
+
+class ParseStageTest(SimpleTestCase):
+    """Test columnar segment batches and the process-pool parsing stage."""
+
+    def test_batch_round_trips_through_pickle(self):
+        """Test a batch keeps text, missing targets and order through pickling."""
+        segments = [('u1:1', 'Grüße', '', None), ('u1:2', 'Tab\tand\nline', None, 'Draft')]
+
+        batch = pickle.loads(pickle.dumps(SegmentBatch.from_segments(segments)))
+
+        self.assertEqual(list(batch), segments)
+        self.assertEqual(len(batch), 2)
+
+    @override_settings(PARSE_MAX_WORKERS=2)
+    def test_pool_parses_files_in_order(self):
+        """Test files sent to worker processes come back as the same segments, in order."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'large.sdlxliff')
+            write_sdlxliff(path, 64 * 1024)
+
+            batches = parse_files([(path, 'sdlxliff'), (SDLXLIFF_DOCUMENT, 'sdlxliff'), (XLIFF_DOCUMENT, 'xliff')])
+
+            self.assertEqual(list(batches[0]), list(iter_file_segments(path, 'sdlxliff')))
+        self.assertEqual([segment[0] for segment in batches[1]], ['u1:1', 'u1:2'])
+        self.assertEqual(list(batches[2]), [('greeting', 'Hello !', 'Hallo !', 'final')])
+
+    @override_settings(PARSE_MAX_WORKERS=1)
+    def test_uploaded_file_parsed_by_pool_then_cached(self):
+        """Test an uploaded file is parsed by a worker rather than the calling thread, and only once."""
+        file = SimpleUploadedFile('guide.sdlxliff', SDLXLIFF_DOCUMENT)
+        content_hash = os.urandom(32).hex()
+        with patch('project.services.parsing.get_parse_pool', wraps=get_parse_pool) as pool:
+            (first,) = get_or_parse_files([(content_hash, 'sdlxliff', file)])
+            (second,) = get_or_parse_files([(content_hash, 'sdlxliff', file)])
+
+        self.assertEqual(pool.call_count, 1)
+        self.assertEqual(list(second), list(first))
+        self.assertEqual([segment[0] for segment in first], ['u1:1', 'u1:2'])
+
+
+class ParseCacheTest(SimpleTestCase):
+    """Test the on-disk cache of parsed segment batches."""
+
+    def setUp(self):
+        """Use a fresh cache directory."""
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+
+    def test_repeat_parse_is_served_from_disk(self):
+        """Test the second parse of the same content maps the cached batch instead of parsing."""
+        cache = ParseCache(self.directory, max_bytes=1024 * 1024)
+        content_hash = hashlib.sha256(SDLXLIFF_DOCUMENT).hexdigest()
+
+        parsed = cache.get_or_parse(content_hash, 'sdlxliff', SDLXLIFF_DOCUMENT)
+        with patch('project.services.parse_cache.parse_to_batch') as parse:
+            cached = cache.get_or_parse(content_hash, 'sdlxliff', SDLXLIFF_DOCUMENT)
+
+        parse.assert_not_called()
+        self.assertIsInstance(cached.buffer, memoryview)
+        self.assertEqual(list(cached), list(parsed))
+        self.assertEqual(list(pickle.loads(pickle.dumps(cached))), list(parsed))
+        self.assertIsNone(cache.get(content_hash, 'xliff'))
+
+    def test_least_recently_used_entries_evicted_by_size(self):
+        """Test writes past the size limit remove the entries read longest ago."""
+        batch = SegmentBatch.from_segments([('1', 'x' * 100, None, None)])
+        cache = ParseCache(self.directory, max_bytes=3 * (batch.nbytes + 32))
+        for index, content_hash in enumerate(['a' * 64, 'b' * 64, 'c' * 64]):
+            cache.put(content_hash, 'xliff', batch)
+            os.utime(cache.path(content_hash, 'xliff'), (index, index))
+        cache.get('a' * 64, 'xliff')  # Now the most recently used
+
+        cache.put('d' * 64, 'xliff', batch)
+
+        cached = {content_hash[0] for content_hash in 'abcd' if cache.get(content_hash * 64, 'xliff')}
+        self.assertEqual(cached, {'a', 'c', 'd'})
+
+
+class FileVersionTest(StubOpenAIMixin, APITestCase):
+    """Test uploading updated versions of a project file."""
+
+    def setUp(self):
+        """Authenticate, point the OpenAI client at a stub and store a first version."""
+        super().setUp()
+        self.user = User.objects.create_user(email='versions@example.com', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.addCleanup(cache.clear)
+        self.addCleanup(VectorStoreManager.clear_local_cache)
+        project = Project.objects.create(name='Versions', client_name='Umbrella', created_by=self.user)
+        self.previous = ProjectFile.objects.create(
+            project=project, openai_file_id='file-1', file_name='guide.sdlxliff', file_type='sdlxliff'
+        )
+
+    def test_new_version_reports_reused_and_recomputed(self):
+        """Test an updated file becomes version 2 and only its edited segment is recomputed and re-embedded."""
+        ingest_segments(self.previous, iter_file_segments(io.BytesIO(SDLXLIFF_DOCUMENT), 'sdlxliff'))
+        embed_project_file(self.previous)
+        updated = SDLXLIFF_DOCUMENT.replace(b'>Done<', b'>Finished<')
+
+        response = self.client.post(reverse('file-versions', kwargs={'pk': self.previous.id}), {
+            'file': SimpleUploadedFile('guide-v2.sdlxliff', updated),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(response.data['segments'], {'reused': 1, 'recomputed': 1, 'removed': 1})
+        self.assertEqual((response.data['file']['version'], response.data['file']['previous_version']),
+                         (2, self.previous.id))
+        self.assertEqual(len(self.stub.files), 1)
+        new_version = ProjectFile.objects.get(id=response.data['file']['id'])
+        segments = list(new_version.segments.all())
+        self.assertEqual([segment.source for segment in segments], ['Press Save.', 'Finished'])
+        self.assertEqual([list(segment.embedding) for segment in segments],
+                         [stub_embedding(segment.source, 1536) for segment in segments])
+        embedding_calls = [path for _, path, _ in self.stub.requests if path == '/v1/embeddings']
+        self.assertEqual(len(embedding_calls), 2)  # One for each version, the second with only 'Finished'
+
+    def test_results_carried_over_to_unchanged_segments(self):
+        """Test unchanged segments keep their results whether they kept their id or moved, and edits start over."""
+        ingest_segments(self.previous, [('a', 'One', None, None), ('b', 'Two', None, None), ('c', 'Three', None, None)])
+        for segment in self.previous.segments.all():  # Stand-in for a computed result
+            segment.state = f'checked {segment.segment_id}'
+            segment.save()
+        project_file = ProjectFile.objects.create(
+            project=self.previous.project, openai_file_id='file-2', file_name='guide.sdlxliff', file_type='sdlxliff',
+            version=2, previous_version=self.previous,
+        )
+
+        segments = [('b', 'Two', None, None), ('x', 'One', None, None), ('c', 'Edited', None, None)]
+        state = TranslationSegment._meta.get_field('state')
+        with patch('project.services.versions.derived_fields', return_value=[state]):
+            diff = ingest_file_version(project_file, self.previous, segments)
+
+        self.assertEqual(diff.as_dict(), {'reused': 2, 'recomputed': 1, 'removed': 1})
+        self.assertEqual(
+            list(project_file.segments.values_list('segment_id', 'state')),
+            [('b', 'checked b'), ('x', 'checked a'), ('c', '')],
+        )
+
+    def test_unparseable_version_is_not_uploaded(self):
+        """Test a file that cannot be parsed is refused before anything is uploaded to OpenAI."""
+        with self.assertLogs('project.api.v1.views', 'ERROR'):
+            response = self.client.post(reverse('file-versions', kwargs={'pk': self.previous.id}), {
+                'file': SimpleUploadedFile('guide-v2.sdlxliff', b'<xliff><file>'),
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((self.stub.files, self.stub.file_batches), ({}, {}))
+        self.assertFalse(ProjectFile.objects.filter(previous_version=self.previous).exists())
+
+    def test_qa_rerun_only_on_changed_segments(self):
+        """Test a reviewed file's new version keeps the QA results of unchanged segments and reviews the rest."""
+        def document(second_target):
+            units = [('a', 'Open 3 files.', 'Öffnen Sie 3 Dateien.'), ('b', 'Close the window.', second_target)]
+            return (
+                b'<?xml version="1.0"?><xliff xmlns="urn:oasis:names:tc:xliff:document:1.2" version="1.2">'
+                b'<file original="app.json"><body>'
+                + ''.join(f'<trans-unit id="{unit}"><source>{source}</source><target>{target}</target></trans-unit>'
+                          for unit, source, target in units).encode()
+                + b'</body></file></xliff>'
+            )
+
+        previous = ProjectFile.objects.create(
+            project=self.previous.project, openai_file_id='file-1', file_name='app.xliff', file_type='xliff'
+        )
+        ingest_segments(previous, iter_file_segments(io.BytesIO(document('Close the window.')), 'xliff'))
+        review = self.client.post(reverse('file-review', kwargs={'pk': previous.id}))
+        response = self.client.post(reverse('file-versions', kwargs={'pk': previous.id}), {
+            'file': SimpleUploadedFile('app.xliff', document('Schließen Sie das Fenster.')),
+        }, format='multipart')
+
+        self.assertEqual(review.status_code, HTTP_202_ACCEPTED)
+        self.assertEqual(list(previous.segments.values_list('segment_id', 'qa_score')), [('a', 100), ('b', 95)])
+        new_version = ProjectFile.objects.get(id=response.data['file']['id'])
+        self.assertEqual(list(new_version.segments.values_list('segment_id', 'qa_score')), [('a', 100), ('b', 100)])
+        completions = [path for _, path, _ in self.stub.requests if path == '/v1/chat/completions']
+        self.assertEqual(len(completions), 2)  # One for the first review, one for the edited segment alone
+
+
+class HybridSearchTest(StubOpenAIMixin, APITestCase):
+    """Test hybrid lexical and vector search over segments."""
+
+    def setUp(self):
+        """Authenticate, point the OpenAI client at a stub and store embedded segments in two projects."""
+        super().setUp()
+        user = User.objects.create_user(email='hybrid@example.com', password='testpassword')
+        self.client.force_authenticate(user)
+        self.project = Project.objects.create(name='Hybrid', client_name='Hybrid client', created_by=user)
+        other = Project.objects.create(name='Other', client_name='Other client', created_by=user)
+        for project, sources in [(self.project, ['Replace filter PX-2231 every month.', 'Press Save to keep changes.',
+                                                 'The filter housing is made of steel.']),
+                                 (other, ['Order PX-2231 has shipped.'])]:
+            project_file = ProjectFile.objects.create(
+                project=project, openai_file_id='file-hybrid', file_name='manual.xliff', file_type='xliff'
+            )
+            TranslationSegment.objects.bulk_create(
+                TranslationSegment(project_file=project_file, segment_id=str(position), position=position,
+                                   source=source, source_hash=text_hash(source),
+                                   embedding=stub_embedding(source, 1536))
+                for position, source in enumerate(sources)
+            )
+
+    def search(self, **data):
+        """Post a search and return the response."""
+        return self.client.post(reverse('hybrid-search'), {'project': str(self.project.id), **data}, format='json')
+
+    def test_reciprocal_rank_fusion(self):
+        """Test fused scores add each ranking's weighted reciprocal rank."""
+        scores = reciprocal_rank_fusion([[1, 2], [2, 3]], [1.0, 0.5], 60)
+
+        self.assertAlmostEqual(scores[1], 1 / 61)
+        self.assertAlmostEqual(scores[2], 1 / 62 + 0.5 / 61)
+        self.assertAlmostEqual(scores[3], 0.5 / 62)
+
+    def test_product_code_found_within_project(self):
+        """Test an exact code ranks first by words and matches from other projects are left out."""
+        response = self.search(query='PX-2231', k=5)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(results[0]['source_text'], 'Replace filter PX-2231 every month.')
+        self.assertEqual(results[0]['lexical_rank'], 1)
+        self.assertNotIn('Order PX-2231 has shipped.', [result['source_text'] for result in results])
+
+    def test_weights_per_request(self):
+        """Test a ranking given no weight contributes no rows, and both weights at zero are rejected."""
+        lexical = self.search(query='filter', vector_weight=0).json()['results']
+        semantic = self.search(query='Press Save to keep changes.', lexical_weight=0).json()['results']
+
+        self.assertEqual({result['source_text'] for result in lexical},
+                         {'Replace filter PX-2231 every month.', 'The filter housing is made of steel.'})
+        self.assertEqual(semantic[0]['source_text'], 'Press Save to keep changes.')
+        self.assertEqual(len(semantic), 3)
+        self.assertEqual([result['vector_rank'] for result in semantic], [1, 2, 3])
+        self.assertEqual(self.search(query='filter', lexical_weight=0, vector_weight=0).status_code, 400)
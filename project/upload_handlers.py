@@ -0,0 +1,50 @@
+"""Upload handlers that fingerprint files while the request body streams in."""
+
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class ContentHashMixin:
+    """Compute a SHA-256 digest of each file chunk by chunk as the handler consumes it."""
+
+    def new_file(self, *args, **kwargs):
+        """Start a fresh digest for every file in the request."""
+        self.content_hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        """Hash the chunk only when this handler is the one storing it."""
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:
+            self.content_hasher.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        """Attach the hex digest to the file produced by this handler."""
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.content_hasher.hexdigest()
+        return file
+
+
+class ContentHashMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    """In-memory upload handler that records ``content_hash`` on small files."""
+
+
+class ContentHashTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    """Temporary-file upload handler that records ``content_hash`` on large files."""
+
+
+def get_content_hash(file):
+    """Return the SHA-256 hex digest of an uploaded file.
+
+    Files parsed by the handlers above already carry it; anything else is hashed here.
+    """
+    content_hash = getattr(file, 'content_hash', None)
+    if content_hash is None:
+        hasher = hashlib.sha256()
+        for chunk in file.chunks():
+            hasher.update(chunk)
+        content_hash = file.content_hash = hasher.hexdigest()
+    return content_hash
@@ -1,18 +1,14 @@
-import openai
-# Set your OpenAI API key
-openai.api_key = "your-openai-api-key"  # Replace with your actual API key
+import logging
+
+from openai_app.services.embeddings import EmbeddingService
+
+logger = logging.getLogger(__name__)
+
 
 def extract_file_embedding(file_content: str):
-    """Extracts vector embeddings from file content using OpenAI's API."""
+    """Extracts a vector embedding from file content; use EmbeddingService.embed for many texts."""
     try:
-        # Generate embedding using OpenAI's text-embedding-ada-002 model
-        response = openai.Embedding.create(
-            input=file_content,
-            model="text-embedding-ada-002"
-        )
-        # Extract the embedding from the response
-        embedding = response['data'][0]['embedding']
-        return embedding  # Return the embedding as a list
+        return list(EmbeddingService().embed_one(file_content))
     except Exception as e:
-        print(f"Error generating embedding: {e}")
-        return None
\ No newline at end of file
+        logger.error(f"Error generating embedding: {e}")
+        return None